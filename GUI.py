@@ -2,10 +2,17 @@ import json
 import tkinter as tk
 from tkinter import ttk, Message
 from Types import Predictor, ROI
+from objs_Report import PredictionRunner, RunMessage
+
+# how often the tk loop checks the background run for messages
+POLL_MS: int = 100
 
 with open('./config.json', mode='r', encoding='utf-8') as f:
     config = json.loads(f.read())
 
+# runs reports on a background thread, keeps finished ones per (predictor, roi)
+runner = PredictionRunner()
+
 def update_roi_description(_=None):
     """Update ROI description when combobox selection changes"""
     selected_roi = roi_combo_box.get()
@@ -17,10 +24,63 @@ def update_model_description(_=None):
     model_desc.config(text=config_predictor['descriptions'][selected_model])
 
 def run_prediction():
-    """Function to execute when Run button is clicked"""
+    """Function to execute when Run button is clicked, the run happens off the tk thread"""
+    predictor = Predictor[model_combo_box.get()]
+    roi = ROI.__members__.get(roi_combo_box.get().upper(), ROI.NONE)
+    # no region to extract features from
+    if roi is ROI.NONE:
+        result_label.config(text="Select a region to run the prediction on", fg='red')
+        return
+
+    if not runner.submit(predictor, roi):
+        result_label.config(text="A prediction is already running", fg='orange')
+        return
+
+    progress_bar.config(value=0)
     result_label.config(text="Running prediction for " +
                         model_combo_box.get() + " on " +
-                        roi_combo_box.get() + " region")
+                        roi_combo_box.get() + " region", fg='green')
+    if runner.is_running:
+        run_button.state(['disabled'])
+        cancel_button.state(['!disabled'])
+    root.after(POLL_MS, poll_runner)
+
+def cancel_prediction():
+    """stop the running prediction after the participant being loaded"""
+    runner.cancel()
+    cancel_button.state(['disabled'])
+    result_label.config(text="Cancelling...", fg='orange')
+
+def show_message(message: RunMessage):
+    """update the widgets with a message from the background run"""
+    match message.kind:
+        case 'progress':
+            progress_bar.config(maximum=message.n_total, value=message.n_done)
+            result_label.config(text=f"Loaded {message.n_done} / {message.n_total} participants", fg='green')
+        case 'done':
+            validation = getattr(message.model, 'validation', None)
+            text = "Done" if validation is None else \
+                f"Validation MAE {validation.best_mae:.2f}, R\u00b2 {validation.best_r2:.2f}"
+            result_label.config(text=text + (" (cached)" if message.cached else ""), fg='green')
+        case 'cancelled':
+            result_label.config(text="Prediction cancelled", fg='orange')
+        case 'error':
+            result_label.config(text=f"Prediction failed: {message.error}", fg='red')
+
+def poll_runner():
+    """drain the runner's messages, keep polling while it runs"""
+    for message in runner.poll():
+        show_message(message)
+
+    if runner.is_running:
+        root.after(POLL_MS, poll_runner)
+        return
+
+    # the last messages can land between poll() and the thread ending
+    for message in runner.poll():
+        show_message(message)
+    run_button.state(['!disabled'])
+    cancel_button.state(['disabled'])
 
 root = tk.Tk()
 root.title("Demographic Predictive Models")
@@ -84,6 +144,17 @@ run_button = ttk.Button(
 )
 run_button.pack(pady=10, ipadx=10, ipady=5)
 
+cancel_button = ttk.Button(
+    root,
+    text="Cancel",
+    command=cancel_prediction
+)
+cancel_button.pack(pady=5)
+cancel_button.state(['disabled'])
+
+progress_bar = ttk.Progressbar(root, orient='horizontal', length=300, mode='determinate')
+progress_bar.pack(pady=5)
+
 result_label = tk.Label(root, text="", fg='green')
 result_label.pack()
 
@@ -0,0 +1,6 @@
+from enum import Enum
+
+class Feature(Enum):
+    VOXELS = 'ROI voxel time series'
+    PARCELS = 'Atlas parcel time series'
+    CONNECTIVITY = 'Region x region functional connectivity'
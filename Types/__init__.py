@@ -1,3 +1,4 @@
 from Types.ROI import ROI
 from Types.Dimension import Dimension
-from Types.Predictor import Predictor
\ No newline at end of file
+from Types.Predictor import Predictor
+from Types.Feature import Feature
\ No newline at end of file
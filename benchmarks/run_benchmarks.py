@@ -0,0 +1,201 @@
+'''
+Times and memory profiles the MRI / model hot paths on synthetic cohorts and saves the results as JSON.
+
+    python -m benchmarks.run_benchmarks --scales small medium
+    python -m benchmarks.run_benchmarks compare old.json new.json
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+import numpy as np
+import nibabel as nib
+
+from benchmarks.synthetic_cohort import SCALES, make_atlas_data, make_cohort, func_grid
+from objs_MRI import Atlas, MaskCache, MRIFunc
+from objs_Model import BrainAgePredictorDataset
+from Types import ROI
+
+RESULTS_PATH: str = os.path.join('Data', 'benchmarks')
+REPEAT: int = 3
+
+def max_rss_mb() -> float | None:
+    '''process lifetime high water mark, None where resource is missing (windows)'''
+    try:
+        import resource # unix only
+    except ImportError:
+        return None
+
+    # linux reports kB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(fn: Callable[[], object], repeat: int = REPEAT) -> dict:
+    '''wall / cpu time of repeat runs, then one run under tracemalloc for the peak allocation'''
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        fn()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+
+    # separate run, tracing slows allocation heavy code down
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'repeat': repeat,
+        'wall_s_min': min(walls),
+        'wall_s_median': float(np.median(walls)),
+        'cpu_s_median': float(np.median(cpus)),
+        'peak_alloc_mb': peak / 1024 ** 2,
+        'max_rss_mb': max_rss_mb(),
+    }
+
+def run_scale(scale: str, work_dir: str, repeat: int = REPEAT, n_workers: int = 1) -> dict:
+    '''benchmarks of one cohort size'''
+    cohort_path = os.path.join(work_dir, scale)
+    participants_df = make_cohort(cohort_path, scale)
+    first_path = os.path.join(cohort_path, f'{participants_df.participant_id.iloc[0]}.nii.gz')
+
+    def load() -> MRIFunc:
+        img = nib.load(first_path)
+        return MRIFunc(img.dataobj, img.affine, img.header)
+
+    # resample onto a grid shifted by half a voxel (a realistic non trivial resample)
+    fMRI = load()
+    voxel_size = SCALES[scale][1]
+    shape, affine = func_grid(voxel_size)
+    affine[:3, 3] += voxel_size / 2
+    reference = nib.Nifti1Image(np.zeros(shape, dtype=np.float32), affine)
+
+    def get_data() -> np.ndarray:
+        dataset = BrainAgePredictorDataset(
+            participants_df,
+            func_data_path=cohort_path,
+            feature_cache_path=None,
+            memmap_dir=work_dir,
+            n_workers=n_workers,
+            n_components=None
+        )
+        return dataset.get_data()
+
+    benchmarks = {
+        'Atlas.get_roi_mask_fdata': lambda: Atlas.instance().get_roi_mask_fdata(ROI.PFC),
+        # fresh img each run, includes decompressing the run (the roi mask stays cached per grid)
+        'MRI.get_roi_fdata': lambda: load().get_roi_fdata(ROI.PFC),
+        'MRI4D.resample': lambda: fMRI.resample(reference),
+        'MRI4D.get_tsnr': lambda: load().get_tsnr(),
+        'ModelDataset.get_data': get_data,
+    }
+
+    n_participants, _, nt = SCALES[scale]
+    results = {
+        'n_participants': n_participants,
+        'func_shape': list(fMRI.shape),
+        'nt': nt,
+        'benchmarks': {}
+    }
+    for name, fn in benchmarks.items():
+        print(f'[{scale}] {name}', flush=True)
+        results['benchmarks'][name] = measure(fn, repeat)
+
+    return results
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(scales: list[str], out_path: str | None = None, repeat: int = REPEAT, n_workers: int = 1) -> str:
+    '''run every scale and write the results, returns the results path'''
+    Atlas.set_instance(Atlas(MaskCache(path=None), make_atlas_data()))
+    commit = git_commit()
+
+    results = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'n_workers': n_workers,
+        'scales': {}
+    }
+
+    work_dir = tempfile.mkdtemp(prefix='benchmarks-')
+    try:
+        for scale in scales:
+            results['scales'][scale] = run_scale(scale, work_dir, repeat, n_workers)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if out_path is None:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        out_path = os.path.join(RESULTS_PATH, f'{stamp}-{(commit or "nocommit")[:10]}.json')
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(results, indent=2))
+
+    return out_path
+
+def compare(old_path: str, new_path: str) -> None:
+    '''print the new / old ratio of every benchmark both results have'''
+    with open(old_path, mode='r', encoding='utf-8') as f:
+        old = json.loads(f.read())
+    with open(new_path, mode='r', encoding='utf-8') as f:
+        new = json.loads(f.read())
+
+    print(f"{str(old['commit'])[:10]} -> {str(new['commit'])[:10]}")
+    print(f"{'scale':<8} {'benchmark':<28} {'wall (s)':>21} {'ratio':>7} {'peak (MB)':>23} {'ratio':>7}")
+    for scale, new_scale in new['scales'].items():
+        old_scale = old['scales'].get(scale)
+        if old_scale is None:
+            continue
+
+        for name, new_result in new_scale['benchmarks'].items():
+            old_result = old_scale['benchmarks'].get(name)
+            if old_result is None:
+                continue
+
+            old_wall, new_wall = old_result['wall_s_min'], new_result['wall_s_min']
+            old_peak, new_peak = old_result['peak_alloc_mb'], new_result['peak_alloc_mb']
+            print(
+                f'{scale:<8} {name:<28} {old_wall:>9.3f} -> {new_wall:<8.3f} {new_wall / old_wall:>7.2f}'
+                f' {old_peak:>10.1f} -> {new_peak:<9.1f} {new_peak / max(old_peak, 1e-9):>7.2f}'
+            )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='run', choices=('run', 'compare'))
+    parser.add_argument('paths', nargs='*', help='old and new results (compare)')
+    parser.add_argument('--scales', nargs='+', default=['small'], choices=list(SCALES))
+    parser.add_argument('--out', default=None, help=f'results path (default: {RESULTS_PATH}/<time>-<commit>.json)')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--n-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        if len(args.paths) != 2:
+            parser.error('compare needs the old and new results paths')
+        compare(*args.paths)
+        return
+
+    print(run(args.scales, args.out, args.repeat, args.n_workers))
+
+if __name__ == '__main__':
+    main()
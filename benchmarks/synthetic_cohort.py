@@ -0,0 +1,143 @@
+'''
+Synthetic Harvard-Oxford style atlas and fMRI cohorts, so the pipeline can be benchmarked (and tested) offline
+'''
+
+import os
+from types import SimpleNamespace
+import numpy as np
+import nibabel as nib
+import pandas as pd
+from scipy.ndimage import gaussian_filter
+
+# cortical labels of the harvard-oxford atlas (Atlas builds its composite rois out of these names)
+HARVARD_OXFORD_LABELS: tuple[str, ...] = (
+    'Frontal Pole', 'Insular Cortex', 'Superior Frontal Gyrus', 'Middle Frontal Gyrus',
+    'Inferior Frontal Gyrus, pars triangularis', 'Inferior Frontal Gyrus, pars opercularis', 'Precentral Gyrus',
+    'Temporal Pole', 'Superior Temporal Gyrus, anterior division', 'Superior Temporal Gyrus, posterior division',
+    'Middle Temporal Gyrus, anterior division', 'Middle Temporal Gyrus, posterior division',
+    'Middle Temporal Gyrus, temporooccipital part', 'Inferior Temporal Gyrus, anterior division',
+    'Inferior Temporal Gyrus, posterior division', 'Inferior Temporal Gyrus, temporooccipital part',
+    'Postcentral Gyrus', 'Superior Parietal Lobule', 'Supramarginal Gyrus, anterior division',
+    'Supramarginal Gyrus, posterior division', 'Angular Gyrus', 'Lateral Occipital Cortex, superior division',
+    'Lateral Occipital Cortex, inferior division', 'Intracalcarine Cortex', 'Frontal Medial Cortex',
+    'Juxtapositional Lobule Cortex (formerly Supplementary Motor Cortex)', 'Subcallosal Cortex',
+    'Paracingulate Gyrus', 'Cingulate Gyrus, anterior division', 'Cingulate Gyrus, posterior division',
+    'Precuneous Cortex', 'Cuneal Cortex', 'Frontal Orbital Cortex', 'Parahippocampal Gyrus, anterior division',
+    'Parahippocampal Gyrus, posterior division', 'Lingual Gyrus', 'Temporal Fusiform Cortex, anterior division',
+    'Temporal Fusiform Cortex, posterior division', 'Temporal Occipital Fusiform Cortex',
+    'Occipital Fusiform Gyrus', 'Frontal Operculum Cortex', 'Central Opercular Cortex',
+    'Parietal Operculum Cortex', 'Planum Polare', "Heschl's Gyrus (includes H1 and H2)", 'Planum Temporale',
+    'Supracalcarine Cortex', 'Occipital Pole'
+)
+
+# MNI152 2mm grid, what the real atlas comes on
+ATLAS_SHAPE: tuple[int, int, int] = (91, 109, 91)
+ATLAS_AFFINE: np.ndarray = np.array([
+    [-2., 0., 0., 90.],
+    [0., 2., 0., -126.],
+    [0., 0., 2., -72.],
+    [0., 0., 0., 1.]
+])
+
+# name -> (participants, fMRI voxel size (mm), time points)
+SCALES: dict[str, tuple[int, float, int]] = {
+    'small': (4, 4.0, 40),
+    'medium': (12, 3.0, 100),
+    'large': (32, 3.0, 200),
+}
+
+def _brain_mask(shape: tuple[int, ...], affine: np.ndarray) -> np.ndarray:
+    '''ellipsoid "brain" in MNI space'''
+    world = affine[:3, :3] @ np.indices(shape).reshape(3, -1) + affine[:3, 3:]
+    radii = np.array([68., 85., 60.])[:, np.newaxis]
+    centre = np.array([0., -18., 12.])[:, np.newaxis]
+    return (np.sum(((world - centre) / radii) ** 2, axis=0) <= 1).reshape(shape)
+
+def make_atlas_data(
+        shape: tuple[int, int, int] = ATLAS_SHAPE,
+        affine: np.ndarray = ATLAS_AFFINE,
+        random_state: int = 0
+    ) -> SimpleNamespace:
+    '''probabilistic atlas (0-100, one volume per label) with .maps and .labels like nilearn's fetcher returns'''
+    rng = np.random.default_rng(random_state)
+    brain = _brain_mask(shape, affine)
+    n_regions = len(HARVARD_OXFORD_LABELS)
+
+    # voronoi parcellation of the brain around random centres, then blurred so neighbours overlap
+    brain_idx = np.argwhere(brain)
+    centres = brain_idx[rng.choice(len(brain_idx), size=n_regions, replace=False)]
+    nearest = np.empty(len(brain_idx), dtype=np.intp)
+    for start in range(0, len(brain_idx), 2 ** 16):
+        chunk = brain_idx[start:start + 2 ** 16]
+        nearest[start:start + 2 ** 16] = np.argmin(
+            np.sum((chunk[:, np.newaxis, :] - centres[np.newaxis]) ** 2, axis=-1),
+            axis=1
+        )
+
+    prob = np.zeros(shape + (n_regions,), dtype=np.uint8)
+    for region in range(n_regions):
+        region_mask = np.zeros(shape, dtype=np.float32)
+        region_mask[tuple(brain_idx[nearest == region].T)] = 100
+        prob[..., region] = np.clip(gaussian_filter(region_mask, sigma=1.5), 0, 100).astype(np.uint8) * brain
+
+    return SimpleNamespace(
+        maps=nib.Nifti1Image(prob, affine),
+        labels=['Background', *HARVARD_OXFORD_LABELS]
+    )
+
+def func_grid(voxel_size: float) -> tuple[tuple[int, int, int], np.ndarray]:
+    '''(shape, affine) of an fMRI grid covering the atlas' field of view'''
+    extent = np.abs(np.diag(ATLAS_AFFINE)[:3]) * np.asarray(ATLAS_SHAPE)
+    shape = tuple(int(n) for n in np.ceil(extent / voxel_size))
+
+    affine = np.diag([voxel_size, voxel_size, voxel_size, 1.])
+    affine[:3, 3] = [-90., -126., -72.]
+    return shape, affine
+
+def make_func_data(
+        shape: tuple[int, int, int],
+        affine: np.ndarray,
+        nt: int,
+        rng: np.random.Generator
+    ) -> np.ndarray:
+    '''int16 BOLD like run: brain ~1000 with noise, a slow drift and a few shared fluctuations'''
+    brain = _brain_mask(shape, affine)
+    n_brain = int(brain.sum())
+
+    time = np.linspace(0, 1, nt, dtype=np.float32)
+    networks = rng.normal(size=(4, nt)).astype(np.float32)
+    loadings = rng.normal(scale=8, size=(n_brain, 4)).astype(np.float32)
+    signal = 1000 + 20 * time + loadings @ networks + rng.normal(scale=15, size=(n_brain, nt)).astype(np.float32)
+
+    data = np.zeros(shape + (nt,), dtype=np.int16)
+    data[brain] = np.round(signal).astype(np.int16)
+    return data
+
+def make_cohort(path: str, scale: str = 'small', random_state: int = 0) -> pd.DataFrame:
+    """Write a synthetic cohort ({pid}.nii.gz runs and participants.tsv) to path
+
+    Args:
+        path (str): directory to write the cohort to (used as a ModelDataset's func_data_path)
+        scale (str, optional): one of SCALES. Defaults to 'small'.
+        random_state (int, optional): seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: participants df (participant_id, Age)
+    """
+    n_participants, voxel_size, nt = SCALES[scale]
+    shape, affine = func_grid(voxel_size)
+    rng = np.random.default_rng(random_state)
+    os.makedirs(path, exist_ok=True)
+
+    participant_ids = [f'sub-{i + 1:03d}' for i in range(n_participants)]
+    for pid in participant_ids:
+        img = nib.Nifti1Image(make_func_data(shape, affine, nt, rng), affine)
+        img.header.set_xyzt_units('mm', 'sec')
+        nib.save(img, os.path.join(path, f'{pid}.nii.gz'))
+
+    participants_df = pd.DataFrame({
+        'participant_id': participant_ids,
+        'Age': rng.integers(18, 80, size=n_participants),
+    })
+    participants_df.to_csv(os.path.join(path, 'participants.tsv'), sep='\t', index=False)
+    return participants_df
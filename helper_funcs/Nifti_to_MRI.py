@@ -1,6 +1,30 @@
-
+import numpy as np
+import nibabel as nib
 from nibabel import Nifti1Image
 from objs_MRI import MRIFunc
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy
+from objs_Profiler import stage
+
+def nifti_to_MRIFunc(img: Nifti1Image | str) -> MRIFunc:
+    '''MRIFunc of a loaded img, or of a path to a nifti or a chunked store (opened lazily)'''
+    with stage('load'):
+        if isinstance(img, str):
+            if ChunkedArrayProxy.is_store(img):
+                return chunked_to_MRIFunc(img)
+            # header only, the data is decompressed when it's first sliced (the read stage)
+            img = nib.load(img)
+
+        return MRIFunc(img.dataobj, img.affine, img.header)
+
+def chunked_to_MRIFunc(path: str) -> MRIFunc:
+    '''MRIFunc backed by a chunked store, nothing is read until the data is sliced'''
+    proxy = ChunkedArrayProxy(path)
+
+    header_bytes = proxy.header_bytes
+    header = None if header_bytes is None else nib.Nifti1Header(binaryblock=header_bytes)
+    if header is not None:
+        # the proxy already scales, the in memory header describes what it returns
+        header.set_data_dtype(proxy.dtype)
+        header.set_slope_inter(np.nan, np.nan)
 
-def nifti_to_MRIFunc(img: Nifti1Image) -> MRIFunc:
-    return MRIFunc(img.dataobj, img.affine, img.header)
+    return MRIFunc(proxy, proxy.affine, header)
@@ -1,4 +1,6 @@
 from .client import *
-from .download_data import download_data
+from .download_data import download_data, download_objects, TransferResult
+from .object_store import ObjectStore, ObjectInfo, S3ObjectStore, LocalObjectStore
 from .Nifti_to_MRI import *
-from .get_participants_df import get_participants_df
\ No newline at end of file
+from .get_participants_df import get_participants_df
+from .transcode import transcode_nifti, transcode_func_data, chunked_path
@@ -6,9 +6,7 @@ Python 3.11.9
 """
 
 import os
-import boto3
-from botocore import UNSIGNED
-from botocore.client import Config
+import threading
 
 ########################## Constants and Helper Functions
 # Info on the data set
@@ -29,14 +27,28 @@ EXAMPLE_FILE_NAME = 'sub-pixar001_T1w.nii.gz'
 
 ################# Downloading Data
 
-# Set up s3 client
-__s3_client = boto3.client(
-    's3',
-    endpoint_url='https://s3.amazonaws.com',
-    config=Config(
-        signature_version=UNSIGNED
-        )
-)
+# s3 client, made on first use so importing the package never touches boto3
+__s3_client = None
+__s3_client_lock = threading.Lock()
+
+def s3_client():
+    '''the shared (anonymous) s3 client, boto3 clients are thread safe'''
+    global __s3_client
+    with __s3_client_lock:
+        if __s3_client is None:
+            import boto3
+            from botocore import UNSIGNED
+            from botocore.client import Config
+
+            __s3_client = boto3.client(
+                's3',
+                endpoint_url='https://s3.amazonaws.com',
+                config=Config(
+                    signature_version=UNSIGNED
+                    )
+            )
+
+    return __s3_client
 
 def download_file(key: str, the_file_name_you_want: str, path: str = '.') -> str:
     '''
@@ -45,7 +57,7 @@ def download_file(key: str, the_file_name_you_want: str, path: str = '.') -> str
     '''
     os.makedirs(path, exist_ok=True)
     output_path = f'{path}/{the_file_name_you_want}'
-    __s3_client.download_file(
+    s3_client().download_file(
         Bucket= __BUCKET,
         Key=key,  # Use the exact path from list_objects_v2
         Filename= output_path
@@ -6,9 +6,13 @@ Python 3.11.9
 
 """
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
 import pandas as pd
 from tqdm import tqdm
-import Util.client as Client
+from helper_funcs.object_store import ObjectStore, S3ObjectStore, file_md5, is_md5_etag
 
 __DATA_PATH= './Data'
 
@@ -17,44 +21,189 @@ def data_path() -> str:
     '''read only'''
     return __DATA_PATH
 
-def download_data():
+DATA_SET_NAME: str = 'ds000228'
+MANIFEST_FILE_NAME: str = 'manifest.json'
+# downloads are latency bound, not cpu bound, so more threads than cores is fine
+MAX_WORKERS: int = 16
+MAX_ATTEMPTS: int = 4
+BACKOFF_SECONDS: float = 0.5
+
+class TransferResult(NamedTuple):
+    '''what happened to one object'''
+    key: str
+    file_path: str
+    status: str # 'downloaded', 'skipped' or 'failed'
+    size: int | None
+    etag: str | None
+    attempts: int
+    seconds: float
+    error: str | None
+
+def load_manifest(manifest_path: str) -> dict[str, dict]:
+    '''previous transfer results by key'''
+    try:
+        with open(manifest_path, mode='r', encoding='utf-8') as f:
+            return json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def write_manifest(manifest_path: str, manifest: dict[str, dict]) -> None:
+    '''atomically write the manifest'''
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, indent=1))
+    os.replace(tmp_path, manifest_path)
+
+def is_complete(file_path: str, info, manifest_entry: dict | None, verify: bool = True) -> bool:
+    '''the local file already matches the object (size, and md5 when the etag is one)'''
+    if not os.path.isfile(file_path):
+        return False
+
+    stat = os.stat(file_path)
+    if stat.st_size != info.size:
+        return False
+
+    # the manifest says we already verified this exact file, no need to hash it again
+    if manifest_entry is not None \
+            and manifest_entry.get('etag') == info.etag \
+            and manifest_entry.get('size') == stat.st_size \
+            and manifest_entry.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+
+    if verify and is_md5_etag(info.etag):
+        return file_md5(file_path) == info.etag
+
+    return True
+
+def transfer(
+        store: ObjectStore,
+        key: str,
+        file_path: str,
+        manifest_entry: dict | None = None,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_seconds: float = BACKOFF_SECONDS,
+        verify: bool = True
+    ) -> TransferResult:
+    '''download one object unless its already there, retrying with exponential backoff'''
+    start = time.perf_counter()
+    error: str = None
+    info = None
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            info = store.head(key)
+            if is_complete(file_path, info, manifest_entry, verify):
+                return TransferResult(key, file_path, 'skipped', info.size, info.etag, attempt, time.perf_counter() - start, None)
+
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            # never leave a half written file under the real name
+            part_path = f'{file_path}.part'
+            store.download(key, part_path)
+
+            if os.path.getsize(part_path) != info.size:
+                raise IOError(f'Expected {info.size} bytes, got {os.path.getsize(part_path)}')
+            if verify and is_md5_etag(info.etag) and file_md5(part_path) != info.etag:
+                raise IOError(f'Checksum mismatch for {key}')
+
+            os.replace(part_path, file_path)
+            return TransferResult(key, file_path, 'downloaded', info.size, info.etag, attempt, time.perf_counter() - start, None)
+        except FileNotFoundError as e:
+            # missing keys wont show up by retrying
+            error = repr(e)
+            break
+        except Exception as e: # network errors come in many flavours (botocore, socket, ...)
+            error = repr(e)
+            if attempt < max_attempts:
+                time.sleep(backoff_seconds * 2 ** (attempt - 1))
+
+    size = None if info is None else info.size
+    etag = None if info is None else info.etag
+    return TransferResult(key, file_path, 'failed', size, etag, attempt, time.perf_counter() - start, error)
+
+def download_objects(
+        store: ObjectStore,
+        jobs: list[tuple[str, str]],
+        manifest_path: str | None = None,
+        max_workers: int = MAX_WORKERS,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_seconds: float = BACKOFF_SECONDS,
+        verify: bool = True,
+        progress: bool = True
+    ) -> list[TransferResult]:
+    """Download (key, file_path) jobs concurrently
+
+    Args:
+        store (ObjectStore): where to download from
+        jobs (list[tuple[str, str]]): (key, local file path) pairs
+        manifest_path (str, optional): json record of every transfer, also used to skip verified files. Defaults to None.
+        max_workers (int, optional): max concurrent transfers. Defaults to MAX_WORKERS.
+        max_attempts (int, optional): attempts per object. Defaults to MAX_ATTEMPTS.
+        backoff_seconds (float, optional): wait before the first retry, doubled each retry. Defaults to BACKOFF_SECONDS.
+        verify (bool, optional): check md5 etags. Defaults to True.
+        progress (bool, optional): show a progress bar. Defaults to True.
+
+    Returns:
+        list[TransferResult]: one result per job, in job order
+    """
+    manifest = {} if manifest_path is None else load_manifest(manifest_path)
+    results: list[TransferResult] = [None] * len(jobs)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(
+                transfer, store, key, file_path, manifest.get(key), max_attempts, backoff_seconds, verify
+            ): i
+            for i, (key, file_path) in enumerate(jobs)
+        }
+
+        for future in tqdm(as_completed(futures), total=len(futures), desc='Collecting Data', disable=not progress):
+            results[futures[future]] = future.result()
+
+    if manifest_path is not None:
+        for result in results:
+            entry = result._asdict()
+            if result.status != 'failed':
+                entry['mtime_ns'] = os.stat(result.file_path).st_mtime_ns
+            manifest[result.key] = entry
+
+        write_manifest(manifest_path, manifest)
+
+    return results
+
+def download_data(store: ObjectStore | None = None, path: str = __DATA_PATH, max_workers: int = MAX_WORKERS) -> list[TransferResult]:
     """
     Iterates through each patient id to get func and anat data
     """
-    # Create data folder
-    os.makedirs(__DATA_PATH, exist_ok=True)
-
-    # Add anat data folder. this is where the patient's base brain state goes
-    anat_path = f'{__DATA_PATH}/anat'
-    os.makedirs(anat_path, exist_ok=True)
+    store = S3ObjectStore() if store is None else store
+    manifest_path = f'{path}/{MANIFEST_FILE_NAME}'
 
-    # add func data folder. this is where the patients's brain activity during task goes
-    func_path = f'{__DATA_PATH}/func'
-    os.makedirs(func_path, exist_ok=True)
+    # this is where the patient's base brain state goes
+    anat_path = f'{path}/anat'
+    # this is where the patients's brain activity during task goes
+    func_path = f'{path}/func'
 
     # get the particpants data frame
-    participants_df_key = 'ds000228/participants.tsv'
-    participants_df_path = f'{__DATA_PATH}/participants.tsv'
-    Client.download_file(
-        key = participants_df_key,
-        the_file_name_you_want = participants_df_path
-    )
+    participants_df_key = f'{DATA_SET_NAME}/participants.tsv'
+    participants_df_path = f'{path}/participants.tsv'
+    results = download_objects(store, [(participants_df_key, participants_df_path)], manifest_path, progress=False)
 
     try:
         participants_df = pd.read_csv(participants_df_path, sep='\t')
     except FileNotFoundError as e:
-        raise FileNotFoundError(f'Could not download file: {participants_df_key}') from e
-
+        raise FileNotFoundError(f'Could not download file: {participants_df_key} ({results[0].error})') from e
 
-    for participant_id in tqdm(participants_df['participant_id'], desc='Collecting Data'):
+    jobs = []
+    for participant_id in participants_df['participant_id']:
+        anat_key = f'{DATA_SET_NAME}/{participant_id}/anat/{participant_id}_T1w.nii.gz'
+        jobs.append((anat_key, f'{anat_path}/{participant_id}.nii.gz'))
 
-        anat_key = f'ds000228/{participant_id}/anat/{participant_id}_T1w.nii.gz'
-        anat_name = f'{anat_path}/{participant_id}.nii.gz'
-        Client.download_file(anat_key, anat_name)
+        func_key = f'{DATA_SET_NAME}/{participant_id}/func/{participant_id}_task-pixar_bold.nii.gz'
+        jobs.append((func_key, f'{func_path}/{participant_id}.nii.gz'))
 
-        func_key = f'ds000228/{participant_id}/func/{participant_id}_task-pixar_bold.nii.gz'
-        func_name = f'{func_path}/{participant_id}.nii.gz'
-        Client.download_file(func_key, func_name)
+    return results + download_objects(store, jobs, manifest_path, max_workers=max_workers)
 
 if __name__ == '__main__':
-    download_data()
\ No newline at end of file
+    failed = [result for result in download_data() if result.status == 'failed']
+    for result in failed:
+        print(f'Failed to download {result.key}: {result.error}')
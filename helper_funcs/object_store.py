@@ -0,0 +1,87 @@
+"""
+object_store.py = where dataset files get downloaded from.
+S3 for openneuro, a local directory for tests or mirrors
+"""
+
+import os
+import shutil
+import hashlib
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+MD5_CHUNK_BYTES: int = 8 * 1024 ** 2
+
+class ObjectInfo(NamedTuple):
+    '''what the store knows about an object'''
+    size: int
+    # md5 hex digest for single part uploads, None (or a '-' multipart tag) otherwise
+    etag: str | None
+
+class ObjectStore(ABC):
+    '''somewhere objects can be looked up and downloaded by key'''
+
+    @abstractmethod
+    def head(self, key: str) -> ObjectInfo:
+        '''size and etag of an object, raises FileNotFoundError if there is no such key'''
+
+    @abstractmethod
+    def download(self, key: str, file_path: str) -> None:
+        '''download an object to file_path'''
+
+class S3ObjectStore(ObjectStore):
+    '''objects in an s3 bucket (anonymous access by default)'''
+    def __init__(self, client=None, bucket: str = 'openneuro.org'):
+        if client is None:
+            from helper_funcs.client import s3_client
+            client = s3_client()
+
+        self._client = client
+        self._bucket = bucket
+
+    def head(self, key: str) -> ObjectInfo:
+        from botocore.exceptions import ClientError
+        try:
+            response = self._client.head_object(Bucket=self._bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(f'No such key: s3://{self._bucket}/{key}') from e
+            raise
+
+        return ObjectInfo(
+            size=int(response['ContentLength']),
+            etag=response.get('ETag', '').strip('"') or None
+        )
+
+    def download(self, key: str, file_path: str) -> None:
+        self._client.download_file(Bucket=self._bucket, Key=key, Filename=file_path)
+
+class LocalObjectStore(ObjectStore):
+    '''objects are files under a root directory, keys are relative paths'''
+    def __init__(self, root: str):
+        self._root = root
+
+    def head(self, key: str) -> ObjectInfo:
+        path = self.__path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'No such key: {key}')
+
+        return ObjectInfo(size=os.path.getsize(path), etag=file_md5(path))
+
+    def download(self, key: str, file_path: str) -> None:
+        shutil.copyfile(self.__path(key), file_path)
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self._root, *key.split('/'))
+
+def file_md5(path: str) -> str:
+    '''md5 hex digest of a file (what s3 uses as the etag of single part uploads)'''
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(MD5_CHUNK_BYTES), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def is_md5_etag(etag: str | None) -> bool:
+    '''multipart uploads have etags like "<md5 of md5s>-<n parts>", those cant be checked against the file'''
+    return etag is not None and len(etag) == 32 and '-' not in etag
@@ -0,0 +1,82 @@
+"""
+transcode.py = one time conversion of the Data/func .nii.gz runs into chunked, uncompressed stores.
+gzip cant seek so every read of a .nii.gz decompresses from the start,
+a chunked store only reads the chunks a slice touches
+"""
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import nibabel as nib
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy, CHUNK_SHAPE
+
+# {pid}.nii.gz -> {pid}.chunks
+CHUNKED_SUFFIX: str = '.chunks'
+NIFTI_SUFFIXES: tuple[str, ...] = ('.nii.gz', '.nii')
+HASH_CHUNK_BYTES: int = 8 * 1024 ** 2
+
+def chunked_path(path: str) -> str:
+    '''where the chunked store of a nifti lives (next to it)'''
+    for suffix in NIFTI_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)] + CHUNKED_SUFFIX
+
+    return path + CHUNKED_SUFFIX
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def transcode_nifti(
+        path: str,
+        out_path: str | None = None,
+        chunks: tuple[int, ...] = CHUNK_SHAPE,
+        overwrite: bool = False
+    ) -> str:
+    '''decompress a nifti once and write it as a chunked store, returns the store's path'''
+    out_path = chunked_path(path) if out_path is None else out_path
+    if not overwrite and ChunkedArrayProxy.is_store(out_path):
+        return out_path
+
+    img = nib.load(path)
+    slope, inter = img.dataobj.slope, img.dataobj.inter
+    ChunkedArrayProxy.write(
+        img.dataobj.get_unscaled(), # stored dtype, scaling is applied when reading
+        out_path,
+        img.affine,
+        header_bytes=img.header.binaryblock,
+        chunks=chunks,
+        slope=slope,
+        inter=inter,
+        source_sha256=_file_sha256(path)
+    )
+    return out_path
+
+def transcode_func_data(
+        func_data_path: str,
+        n_workers: int = 1,
+        chunks: tuple[int, ...] = CHUNK_SHAPE,
+        overwrite: bool = False
+    ) -> list[str]:
+    '''transcode every nifti in a directory (one per process), returns the store paths'''
+    paths = sorted(
+        os.path.join(func_data_path, name) for name in os.listdir(func_data_path)
+        if name.endswith(NIFTI_SUFFIXES)
+    )
+
+    if n_workers <= 1:
+        return [transcode_nifti(path, None, chunks, overwrite) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(
+            transcode_nifti,
+            paths,
+            [None] * len(paths),
+            [chunks] * len(paths),
+            [overwrite] * len(paths)
+        ))
@@ -0,0 +1,102 @@
+'''
+Brain age inference from the command line
+
+    python infer.py fit --participants ../Data/participants.tsv --func-data ../Data/func --out models/brain-age
+    python infer.py score models/brain-age sub-01.nii.gz sub-02.nii.gz
+    python infer.py serve models/brain-age --port 8765
+    python infer.py request sub-01.nii.gz --port 8765
+'''
+
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import pandas as pd
+
+from Types import ROI, Feature
+from objs_Model import BrainAgePredictor, BrainAgeScorer, InferenceServer, request_scores
+from objs_Model.InferenceServer import MAX_BATCH_SIZE, MAX_WAIT_MS, DEFAULT_HOST, DEFAULT_PORT
+from objs_Model.abstract.ModelDataset import FUNC_DATA_PATH
+from objs_Model.abstract.Model import MIN_PROCESSOR_CORES
+from objs_Model.PCAReducer import N_COMPONENTS
+from objs_Report.Report import PARTICIPANTS_DATA_PATH
+
+def fit(args: argparse.Namespace) -> None:
+    participants_df = pd.read_csv(args.participants, sep='\t')
+    predictor = BrainAgePredictor(
+        participants_df,
+        roi=ROI[args.roi],
+        n_workers=args.n_workers,
+        dataset_kwargs={
+            'feature': Feature[args.feature],
+            # 0 turns PCA off
+            'n_components': args.n_components or None,
+            'func_data_path': args.func_data,
+        }
+    )
+    predictor.run()
+    BrainAgeScorer.from_predictor(predictor).save(args.out)
+
+    validation = predictor.validation
+    print(json.dumps({'model': args.out, 'alpha': validation.best_alpha, 'mae': validation.best_mae, 'r2': validation.best_r2}))
+
+def print_results(results) -> None:
+    for result in results:
+        print(json.dumps(result._asdict()), flush=True)
+
+def score(args: argparse.Namespace) -> None:
+    scorer = BrainAgeScorer.load(args.model, n_workers=args.n_workers).warm_up()
+    for start in range(0, len(args.scans), args.batch_size):
+        print_results(scorer.score(args.scans[start:start + args.batch_size]))
+
+def serve(args: argparse.Namespace) -> None:
+    scorer = BrainAgeScorer.load(args.model, n_workers=args.n_workers).warm_up()
+    server = InferenceServer(scorer, args.batch_size, args.max_wait_ms)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+def request(args: argparse.Namespace) -> None:
+    print_results(asyncio.run(request_scores(args.scans, args.host, args.port)))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = commands.add_parser('fit', help='fit a model on a cohort and save its scorer')
+    fit_parser.add_argument('--participants', default=PARTICIPANTS_DATA_PATH)
+    fit_parser.add_argument('--func-data', default=FUNC_DATA_PATH)
+    fit_parser.add_argument('--roi', default=ROI.PFC.name, choices=[roi.name for roi in ROI if roi is not ROI.NONE])
+    fit_parser.add_argument('--feature', default=Feature.VOXELS.name, choices=[feature.name for feature in Feature])
+    fit_parser.add_argument('--n-components', type=int, default=N_COMPONENTS, help='principal components kept, 0 for no PCA')
+    fit_parser.add_argument('--n-workers', type=int, default=MIN_PROCESSOR_CORES)
+    fit_parser.add_argument('--out', required=True)
+    fit_parser.set_defaults(run=fit)
+
+    for name, run, help_text in (('score', score, 'score scans in this process'), ('serve', serve, 'serve scores on a socket')):
+        sub_parser = commands.add_parser(name, help=help_text)
+        sub_parser.add_argument('model')
+        if name == 'score':
+            sub_parser.add_argument('scans', nargs='+')
+        else:
+            sub_parser.add_argument('--host', default=DEFAULT_HOST)
+            sub_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+            sub_parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+        sub_parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE)
+        sub_parser.add_argument('--n-workers', type=int, default=MIN_PROCESSOR_CORES)
+        sub_parser.set_defaults(run=run)
+
+    request_parser = commands.add_parser('request', help='score scans with a running server')
+    request_parser.add_argument('scans', nargs='+')
+    request_parser.add_argument('--host', default=DEFAULT_HOST)
+    request_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    request_parser.set_defaults(run=request)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
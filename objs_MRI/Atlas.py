@@ -1,20 +1,59 @@
 from itertools import chain
+from typing import Iterable
 import numpy as np
 from nibabel import Nifti1Image
-from nilearn import datasets
-from nilearn.image import resample_to_img, index_img
-from Util.ROIType import ROIType
+from Types import ROI
+from objs_MRI.MaskCache import MaskCache
+from objs_MRI.VoxelMask import VoxelMask
+from objs_Profiler import stage
 
-from nibabel import Nifti1Image
+ATLAS_NAME: str = 'cort-prob-2mm'
+# a voxel belongs to a region if the region's probability (0-100) at that voxel is at least this
+ROI_PROBABILITY_THRESHOLD: int = 50
+# parcellation: a voxel gets the label of its most likely region if that region's probability is at least this
+PARCEL_PROBABILITY_THRESHOLD: int = 25
+# key of the parcellation in the mask cache
+PARCELS_NAME: str = 'parcels'
+# key of the region membership bitset in the mask cache
+MEMBERSHIP_NAME: str = 'membership'
+# regions per word of the membership bitset
+REGIONS_PER_WORD: int = 64
 
 class Atlas:
 
-    def __init__(self):
-        self.__data = datasets.fetch_atlas_harvard_oxford('cort-prob-2mm')
+    __instance: 'Atlas' = None
+
+    def __init__(self, mask_cache: MaskCache | None = None, atlas_data=None):
+        '''atlas_data (with .maps and .labels like nilearn's) replaces the fetched atlas, e.g. a synthetic one'''
+        # fetched on first use, not when every MRI grabs the process wide instance
+        self.__data = atlas_data
         self.__roi_to_idxs_dict: dict[str, list[int]] = None
+        self.__prob_data: np.ndarray = None
+        if mask_cache is None:
+            # masks of an injected atlas must not land in the on disk cache of the real one
+            mask_cache = MaskCache() if atlas_data is None else MaskCache(path=None)
+        self.__mask_cache = mask_cache
+
+    @classmethod
+    def instance(cls) -> 'Atlas':
+        '''process wide atlas so the atlas is only fetched and read once'''
+        if cls.__instance is None:
+            cls.__instance = cls()
+
+        return cls.__instance
+
+    @classmethod
+    def set_instance(cls, atlas: 'Atlas | None') -> None:
+        '''replace the process wide atlas (None goes back to fetching it)'''
+        cls.__instance = atlas
 
     @property
     def data(self):
+        if self.__data is None:
+            # nilearn (and sklearn under it) takes most of a second to import, only pay for it here
+            from nilearn import datasets
+            self.__data = datasets.fetch_atlas_harvard_oxford(ATLAS_NAME)
+
         return self.__data
 
     @property
@@ -26,34 +65,160 @@ class Atlas:
 
     @property
     def img(self) -> Nifti1Image:
-        return self.__data.maps
+        return self.data.maps
 
-    def get_roi_mask_fdata(self, roi: ROIType) -> np.ndarray:
-        roi_indicies = self.roi_to_idxs_dict.get(roi)
+    @property
+    def mask_cache(self) -> MaskCache:
+        '''resampled masks shared by every MRI in this process'''
+        return self.__mask_cache
 
-        if roi_indicies is None:
-            raise KeyError(f'Unrecognized region of interest: {roi}')
+    @property
+    def prob_data(self) -> np.ndarray:
+        '''4D probabilistic atlas (0-100) in its stored dtype, read once'''
+        if self.__prob_data is None:
+            # no get_fdata, the probabilities are small ints and float64 would be 8x the size
+            self.__prob_data = np.asanyarray(self.img.dataobj)
 
-        atlas_img_data = self.img.get_fdata()
+        return self.__prob_data
 
-        # Set a mask of all 0s with the same 3D shape
-        mask_fdata = np.zeros(
-            shape = self.img.shape[:3],
-            dtype=np.uint8
-        )
+    @property
+    def region_names(self) -> list[str]:
+        '''name of each region, label i is region_names[i - 1]'''
+        return list(self.data.labels[1:]) # skip i=0 (background)
+
+    @property
+    def n_regions(self) -> int:
+        # from the header, the probabilities dont have to be read for this
+        return self.img.shape[-1]
+
+    def get_label_fdata(self, threshold: float = PARCEL_PROBABILITY_THRESHOLD) -> np.ndarray:
+        '''3D max probability parcellation of the atlas: 1..n_regions, 0 for background. cached on disk'''
+        return self.get_resampled_label_fdata(self.img.shape[:3], self.img.affine, threshold)
+
+    def get_membership(self, threshold: float = ROI_PROBABILITY_THRESHOLD) -> np.ndarray:
+        """Which regions every voxel belongs to, as a bitset. built once per threshold and cached on disk
+
+        Args:
+            threshold (float, optional): probability (0-100) a region needs at a voxel. Defaults to ROI_PROBABILITY_THRESHOLD.
+
+        Returns:
+            np.ndarray: (x, y, z, n_words) uint64, bit r % 64 of word r // 64 is set if region r passes the threshold
+        """
+        key = MaskCache.key(MEMBERSHIP_NAME, self.img.shape[:3], self.img.affine, threshold, ATLAS_NAME)
+
+        def create() -> np.ndarray:
+            n_words = -(-self.n_regions // REGIONS_PER_WORD)
+            # one comparison of the whole atlas, bit r of the packed bytes is region r
+            packed = np.packbits(self.prob_data >= threshold, axis=-1, bitorder='little')
+            membership = np.zeros(packed.shape[:3] + (n_words * 8,), dtype=np.uint8)
+            membership[..., :packed.shape[-1]] = packed
+            return membership.view('<u8').astype(np.uint64, copy=False)
+
+        return self.mask_cache.get_or_create(key, create, dtype=np.uint64)
+
+    def get_region_bits(self, regions: Iterable[int | str]) -> np.ndarray:
+        '''(n_words,) bitset of regions given by index or label'''
+        names = self.region_names
+        bits = np.zeros(-(-self.n_regions // REGIONS_PER_WORD), dtype=np.uint64)
+        for region in regions:
+            word, bit = divmod(self.__region_idx(region, names), REGIONS_PER_WORD)
+            bits[word] |= np.uint64(1) << np.uint64(bit)
+
+        return bits
 
-        # For each brain region, use a logical 'or' opperator to update the mask
-        # update the mask at coord (x,y,z) to true if the current ROI at coord(x, y, z) > 50% probability
-        # The current ROI at coord (x,y,z) i.e the voxel has a value of 0–100.
-        # the value indicates the likelihood (%) that the voxel belongs to a given ROI.
-        for roi_idx in roi_indicies:
-            roi_prob = atlas_img_data[..., roi_idx]
-            mask_fdata |= (roi_prob >= 50)
+    def get_regions_voxel_mask(
+            self,
+            regions: Iterable[int | str],
+            threshold: float = ROI_PROBABILITY_THRESHOLD
+        ) -> VoxelMask:
+        '''voxels where any of the regions (index or label) passes threshold, on the atlas grid'''
+        membership = self.get_membership(threshold)
+        bits = self.get_region_bits(regions)
 
-        return mask_fdata
+        # a bitwise and over a few MB of ints instead of reading and thresholding every region's volume
+        in_regions = np.bitwise_and(membership, bits).any(axis=-1)
+        return VoxelMask.from_dense(in_regions, self.img.affine)
 
-    def get_roi_mask(self, roi: str) -> Nifti1Image:
-        mask_fdata = self.get_roi_mask_fdata(roi)
+    def define_roi(self, name: str, regions: Iterable[int | str]) -> None:
+        '''
+        a custom roi from atlas regions (index or label), usable anywhere an roi name is.
+        the on disk caches are keyed by the name and its regions, so redefining a name in a later run only misses them.
+        within a run a name keeps its regions
+        '''
+        names = self.region_names
+        roi_indicies = sorted({self.__region_idx(r, names) for r in regions})
+        known = self.roi_to_idxs_dict.get(name)
+        if known is not None and sorted(known) != roi_indicies:
+            raise ValueError(f'Region of interest {name} is already defined with other regions')
+
+        self.roi_to_idxs_dict[name] = roi_indicies
+
+    def __region_idx(self, region: int | str, names: list[str]) -> int:
+        '''index of a region given by index or label (one of names)'''
+        if isinstance(region, str):
+            if region not in names:
+                raise KeyError(f'Unrecognized region: {region}')
+            return names.index(region)
+
+        if not 0 <= int(region) < len(names):
+            raise KeyError(f'Unrecognized region: {region}')
+        return int(region)
+
+    def get_resampled_label_fdata(
+            self,
+            shape: tuple[int, ...],
+            affine: np.ndarray,
+            threshold: float = PARCEL_PROBABILITY_THRESHOLD
+        ) -> np.ndarray:
+        '''parcellation on the grid (shape, affine), resampled at most once per grid'''
+        shape = tuple(shape[:3])
+        key = MaskCache.key(PARCELS_NAME, shape, affine, threshold, ATLAS_NAME)
+
+        def create() -> np.ndarray:
+            if self.img.shape[:3] == shape and np.allclose(self.img.affine, affine):
+                prob_data = self.prob_data
+                max_prob = prob_data.max(axis=-1)
+                label_fdata = prob_data.argmax(axis=-1).astype(np.int16) + 1
+                label_fdata[(max_prob < threshold) | (max_prob == 0)] = 0
+                return label_fdata
+
+            from nilearn.image import resample_img
+            # nearest so labels never get averaged into other labels
+            label_img = resample_img(
+                Nifti1Image(self.get_label_fdata(threshold), affine=self.img.affine),
+                target_affine=affine,
+                target_shape=shape,
+                interpolation='nearest'
+            )
+            return np.asanyarray(label_img.dataobj)
+
+        return self.mask_cache.get_or_create(key, create, dtype=np.int16)
+
+    def get_region_voxel_mask(self, region_idx: int, threshold: float = ROI_PROBABILITY_THRESHOLD) -> VoxelMask:
+        '''voxels where a single region's probability (0-100) is at least threshold, on the atlas grid'''
+        return self.get_regions_voxel_mask([region_idx], threshold)
+
+    def get_roi_voxel_mask(self, roi: ROI | str, threshold: float = ROI_PROBABILITY_THRESHOLD) -> VoxelMask:
+        '''voxels of an roi on the atlas grid, the union of its regions'''
+        # a voxel is in the roi if any of its regions has at least threshold % probability there
+        return self.get_regions_voxel_mask(self.get_roi_regions(roi), threshold)
+
+    def get_roi_regions(self, roi: ROI | str) -> tuple[int, ...]:
+        '''sorted indices of the regions an roi is the union of, part of every cache key of the roi'''
+        roi_name = roi.value if isinstance(roi, ROI) else roi
+        roi_indicies = self.roi_to_idxs_dict.get(roi_name)
+
+        if roi_indicies is None:
+            raise KeyError(f'Unrecognized region of interest: {roi}')
+
+        return tuple(sorted(roi_indicies))
+
+    def get_roi_mask_fdata(self, roi: ROI | str, threshold: float = ROI_PROBABILITY_THRESHOLD) -> np.ndarray:
+        '''uint8 roi mask volume on the atlas grid'''
+        return self.get_roi_voxel_mask(roi, threshold).to_dense(np.uint8)
+
+    def get_roi_mask(self, roi: ROI | str, threshold: float = ROI_PROBABILITY_THRESHOLD) -> Nifti1Image:
+        mask_fdata = self.get_roi_mask_fdata(roi, threshold)
         # Return as NIfTI image with same affine and header as the atlas
         return Nifti1Image(
             mask_fdata.astype(np.uint8),
@@ -61,15 +226,54 @@ class Atlas:
             header=self.img.header
         )
 
+    def get_resampled_roi_voxel_mask(
+            self,
+            roi: ROI | str,
+            shape: tuple[int, ...],
+            affine: np.ndarray,
+            threshold: float = ROI_PROBABILITY_THRESHOLD
+        ) -> VoxelMask:
+        '''roi voxels on the grid (shape, affine), resampled at most once per grid'''
+        shape = tuple(shape[:3])
+        key = MaskCache.key(roi, shape, affine, threshold, ATLAS_NAME, regions=self.get_roi_regions(roi))
+
+        def create() -> VoxelMask:
+            if self.img.shape[:3] == shape and np.allclose(self.img.affine, affine):
+                return self.get_roi_voxel_mask(roi, threshold)
+
+            # error happens when applying a 2mm resolution mask to a 1mm resolution image
+            from nilearn.image import resample_img
+            with stage('mask resample'):
+                roi_mask_img = resample_img(
+                    self.get_roi_mask(roi, threshold),
+                    target_affine=affine,
+                    target_shape=shape,
+                    interpolation='nearest'
+                )
+
+            return VoxelMask.from_dense(np.asanyarray(roi_mask_img.dataobj), affine)
+
+        return self.mask_cache.get_or_create_voxel_mask(key, create)
+
+    def get_resampled_roi_mask_fdata(
+            self,
+            roi: ROI | str,
+            shape: tuple[int, ...],
+            affine: np.ndarray,
+            threshold: float = ROI_PROBABILITY_THRESHOLD
+        ) -> np.ndarray:
+        '''boolean roi mask volume on the grid (shape, affine)'''
+        return self.get_resampled_roi_voxel_mask(roi, shape, affine, threshold).to_dense()
+
     # TODO instead of making a whole dict make an init and dynamically create more key/value pairs
     # when we dont have ROI idxs but we know we can make/find one
     def __make_roi_dict(self) -> None:
-        labels = self.__data.labels[1:] # skip i=0 (background)
+        labels = self.data.labels[1:] # skip i=0 (background)
         # init roi -> index with labels
         roi_to_idxs_dict = {label : [i] for i, label in enumerate(labels)}
 
         # define other brain regions
-        roi_to_idxs_dict[ROIType.PFC.value] = list(chain(
+        roi_to_idxs_dict[ROI.PFC.value] = list(chain(
             roi_to_idxs_dict['Frontal Pole'],
             roi_to_idxs_dict['Superior Frontal Gyrus'],
             roi_to_idxs_dict['Middle Frontal Gyrus'],
@@ -81,7 +285,7 @@ class Atlas:
             roi_to_idxs_dict['Frontal Orbital Cortex']
         ))
 
-        roi_to_idxs_dict[ROIType.TEMPORAL_LOBE.value] = list(chain(
+        roi_to_idxs_dict[ROI.TEMPORAL_LOBE.value] = list(chain(
             roi_to_idxs_dict['Temporal Pole'],
             roi_to_idxs_dict['Superior Temporal Gyrus, anterior division'],
             roi_to_idxs_dict['Superior Temporal Gyrus, posterior division'],
@@ -0,0 +1,211 @@
+'''
+Lazy array proxy over a directory of uncompressed chunks.
+Unlike a .nii.gz, slicing only reads the chunks the slice touches
+'''
+
+import os
+import json
+import itertools
+import tempfile
+import numpy as np
+
+META_FILE_NAME: str = 'meta.json'
+HEADER_FILE_NAME: str = 'header.bin'
+# (x, y, z, t) voxels per chunk
+CHUNK_SHAPE: tuple[int, ...] = (16, 16, 16, 32)
+STORE_VERSION: int = 1
+
+class ChunkedArrayProxy:
+    '''
+    Array like (nibabel proxy style) view of a chunked store.
+    Holds no data, each slice memory maps the chunk files it needs
+    '''
+    is_proxy: bool = True
+
+    def __init__(self, path: str):
+        self._path = path
+        with open(os.path.join(path, META_FILE_NAME), mode='r', encoding='utf-8') as f:
+            self._meta = json.loads(f.read())
+
+        self._shape = tuple(self._meta['shape'])
+        self._chunks = tuple(self._meta['chunks'])
+        self._raw_dtype = np.dtype(self._meta['dtype'])
+
+        # nifti scl_slope / scl_inter, applied on read like nibabel's ArrayProxy
+        self._slope = float(self._meta.get('slope', 1.0))
+        self._inter = float(self._meta.get('inter', 0.0))
+        self._is_scaled = (self._slope, self._inter) != (1.0, 0.0)
+        self._dtype = np.promote_types(self._raw_dtype, np.float32) if self._is_scaled else self._raw_dtype
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        '''path is a chunked store'''
+        return os.path.isfile(os.path.join(path, META_FILE_NAME))
+
+    @staticmethod
+    def write(
+            data,
+            path: str,
+            affine: np.ndarray,
+            header_bytes: bytes | None = None,
+            chunks: tuple[int, ...] = CHUNK_SHAPE,
+            slope: float = 1.0,
+            inter: float = 0.0,
+            source_sha256: str | None = None
+        ) -> 'ChunkedArrayProxy':
+        '''write an array (unscaled, scaling is applied on read) to a chunked store at path'''
+        data = np.asanyarray(data)
+        chunks = tuple(int(c) for c in chunks[:data.ndim]) + tuple(data.shape[len(chunks):])
+
+        # build in a tmp dir next to the store then rename, readers never see half a store
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+
+        for chunk_idx in itertools.product(*(range(-(-n // c)) for n, c in zip(data.shape, chunks))):
+            region = tuple(slice(i * c, min((i + 1) * c, n)) for i, c, n in zip(chunk_idx, chunks, data.shape))
+            np.save(os.path.join(tmp_path, _chunk_file_name(chunk_idx)), np.ascontiguousarray(data[region]))
+
+        if header_bytes is not None:
+            with open(os.path.join(tmp_path, HEADER_FILE_NAME), 'wb') as f:
+                f.write(header_bytes)
+
+        meta = {
+            'version': STORE_VERSION,
+            'shape': list(data.shape),
+            'chunks': list(chunks),
+            'dtype': data.dtype.str,
+            'slope': float(slope),
+            'inter': float(inter),
+            'affine': np.asarray(affine, dtype=np.float64).tolist(),
+            # content hash of the file this store was made from, lets caches treat them as the same input
+            'source_sha256': source_sha256
+        }
+        with open(os.path.join(tmp_path, META_FILE_NAME), mode='w', encoding='utf-8') as f:
+            f.write(json.dumps(meta))
+
+        if os.path.isdir(path):
+            _remove_store(path)
+        os.replace(tmp_path, path)
+
+        return ChunkedArrayProxy(path)
+
+    @property
+    def path(self) -> str:
+        '''read only'''
+        return self._path
+
+    @property
+    def meta(self) -> dict:
+        '''read only'''
+        return dict(self._meta)
+
+    @property
+    def affine(self) -> np.ndarray:
+        return np.asarray(self._meta['affine'], dtype=np.float64)
+
+    @property
+    def header_bytes(self) -> bytes | None:
+        '''binary nifti header of the source img'''
+        try:
+            with open(os.path.join(self._path, HEADER_FILE_NAME), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._shape
+
+    @property
+    def ndim(self) -> int:
+        return len(self._shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        '''dtype of what slicing returns (after scaling)'''
+        return self._dtype
+
+    @property
+    def chunks(self) -> tuple[int, ...]:
+        return self._chunks
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, slicer) -> np.ndarray:
+        '''basic (int, slice, Ellipsis) indexing, reads only the chunks that overlap the slice'''
+        ranges, keep_axes = self.__parse_slicer(slicer)
+
+        # covering box of the request on each axis
+        bounds = [(min(r), max(r) + 1) if len(r) else (0, 0) for r in ranges]
+        out = np.empty(tuple(hi - lo for lo, hi in bounds), dtype=self._raw_dtype)
+
+        if out.size:
+            chunk_ranges = [range(lo // c, (hi - 1) // c + 1) for (lo, hi), c in zip(bounds, self._chunks)]
+            for chunk_idx in itertools.product(*chunk_ranges):
+                chunk = np.load(os.path.join(self._path, _chunk_file_name(chunk_idx)), mmap_mode='r')
+
+                src, dst = [], []
+                for i, c, (lo, hi) in zip(chunk_idx, self._chunks, bounds):
+                    start, stop = max(lo, i * c), min(hi, (i + 1) * c)
+                    src.append(slice(start - i * c, stop - i * c))
+                    dst.append(slice(start - lo, stop - lo))
+
+                out[tuple(dst)] = chunk[tuple(src)]
+
+        # steps (and reversed slices) are applied to the covering box
+        if any(len(r) > 1 and r.step != 1 for r in ranges):
+            out = out[np.ix_(*(np.asarray(r) - lo for r, (lo, _) in zip(ranges, bounds)))]
+
+        if self._is_scaled:
+            out = out.astype(self._dtype) * self._dtype.type(self._slope) + self._dtype.type(self._inter)
+
+        # integer indices drop their axis
+        return out.reshape(tuple(len(r) for r, keep in zip(ranges, keep_axes) if keep))
+
+    def __reduce__(self):
+        # only the path goes to worker processes
+        return (ChunkedArrayProxy, (self._path,))
+
+    ###### helpers
+    def __parse_slicer(self, slicer) -> tuple[list[range], list[bool]]:
+        '''range of indices and whether the axis is kept, for every axis'''
+        if not isinstance(slicer, tuple):
+            slicer = (slicer,)
+
+        n_ellipsis = sum(s is Ellipsis for s in slicer)
+        if n_ellipsis > 1:
+            raise IndexError('an index can only have a single ellipsis')
+        if n_ellipsis == 1:
+            at = next(i for i, s in enumerate(slicer) if s is Ellipsis)
+            slicer = slicer[:at] + (slice(None),) * (self.ndim - len(slicer) + 1) + slicer[at + 1:]
+
+        if len(slicer) > self.ndim:
+            raise IndexError(f'too many indices for array of shape {self._shape}')
+        slicer = slicer + (slice(None),) * (self.ndim - len(slicer))
+
+        ranges, keep_axes = [], []
+        for s, n in zip(slicer, self._shape):
+            if isinstance(s, slice):
+                ranges.append(range(*s.indices(n)))
+                keep_axes.append(True)
+            elif isinstance(s, (int, np.integer)):
+                i = int(s) + n if s < 0 else int(s)
+                if not 0 <= i < n:
+                    raise IndexError(f'index {s} is out of bounds for axis with size {n}')
+                ranges.append(range(i, i + 1))
+                keep_axes.append(False)
+            else:
+                raise IndexError(f'Unsupported index for a chunked store: {s!r}')
+
+        return ranges, keep_axes
+
+def _chunk_file_name(chunk_idx: tuple[int, ...]) -> str:
+    return 'c' + '_'.join(str(i) for i in chunk_idx) + '.npy'
+
+def _remove_store(path: str) -> None:
+    for file_name in os.listdir(path):
+        os.remove(os.path.join(path, file_name))
+    os.rmdir(path)
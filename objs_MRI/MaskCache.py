@@ -0,0 +1,149 @@
+'''
+Cache of roi masks that have been resampled onto a subject's grid
+'''
+
+import os
+import re
+import hashlib
+import tempfile
+from typing import Callable
+import numpy as np
+from Types import ROI
+from objs_MRI.VoxelMask import VoxelMask
+
+MASK_CACHE_PATH: str = './Data/cache/masks'
+# file extension of sparse masks, next to the dense .npy volumes
+VOXEL_MASK_EXT: str = '.mask.npz'
+
+class MaskCache:
+    '''
+    Holds resampled roi masks in memory and persists them to disk.
+    Subjects share only a few grid shapes/affines, so each distinct mask only has to be resampled once
+    '''
+    def __init__(self, path: str | None = MASK_CACHE_PATH):
+        self._path = path # None -> memory only
+        self._masks: dict[str, np.ndarray] = {}
+        self._voxel_masks: dict[str, VoxelMask] = {}
+
+    @property
+    def path(self) -> str | None:
+        '''read only'''
+        return self._path
+
+    @staticmethod
+    def key(
+            roi: ROI | str,
+            shape: tuple[int, ...],
+            affine: np.ndarray,
+            threshold: float,
+            atlas_name: str = '',
+            regions: tuple[int, ...] = ()
+        ) -> str:
+        '''unique name of a mask given the roi (and the atlas regions it is made of), target grid and probability threshold'''
+        roi_name = roi.name if isinstance(roi, ROI) else str(roi)
+        # round the affine so float noise from different headers still hits the same entry,
+        # + 0.0 turns the -0.0 that noise just below zero rounds to into 0.0 (they have different bytes)
+        affine_bytes = (np.round(np.asarray(affine, dtype=np.float64), 6) + 0.0).tobytes()
+
+        digest = hashlib.sha1()
+        # the regions too, a custom roi name redefined in a later run must not hit the old mask
+        regions = tuple(sorted(int(r) for r in regions))
+        digest.update(repr((atlas_name, roi_name, regions, tuple(int(n) for n in shape[:3]), float(threshold))).encode())
+        digest.update(affine_bytes)
+
+        # keep the roi readable in the file name
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', roi_name).strip('_')
+        return f'{slug}-{digest.hexdigest()[:20]}'
+
+    def get(self, key: str) -> np.ndarray | None:
+        '''get a mask from memory, falling back to disk'''
+        mask = self._masks.get(key)
+        if mask is not None or self._path is None:
+            return mask
+
+        try:
+            mask = np.load(self.__file_path(key), allow_pickle=False)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+        mask.flags.writeable = False
+        self._masks[key] = mask
+        return mask
+
+    def put(self, key: str, mask: np.ndarray, dtype: np.dtype = np.bool_) -> np.ndarray:
+        '''store a mask (or label volume with an int dtype) in memory and on disk'''
+        mask = np.asarray(mask, dtype=dtype)
+        # masks are shared between every MRI on the same grid, dont let anyone edit them in place
+        mask.flags.writeable = False
+        self._masks[key] = mask
+
+        if self._path is not None:
+            self.__write(key, lambda f: np.save(f, mask, allow_pickle=False))
+
+        return mask
+
+    def get_or_create(self, key: str, create: Callable[[], np.ndarray], dtype: np.dtype = np.bool_) -> np.ndarray:
+        '''get a cached mask or create (and cache) it'''
+        mask = self.get(key)
+        if mask is None:
+            mask = self.put(key, create(), dtype)
+
+        return mask
+
+    def get_voxel_mask(self, key: str) -> VoxelMask | None:
+        '''get a sparse mask from memory, falling back to disk'''
+        mask = self._voxel_masks.get(key)
+        if mask is not None or self._path is None:
+            return mask
+
+        try:
+            mask = VoxelMask.load(self.__file_path(key, VOXEL_MASK_EXT))
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+
+        self._voxel_masks[key] = mask
+        return mask
+
+    def put_voxel_mask(self, key: str, mask: VoxelMask) -> VoxelMask:
+        '''store a sparse mask in memory and on disk'''
+        self._voxel_masks[key] = mask
+        if self._path is not None:
+            self.__write(key, mask.save, VOXEL_MASK_EXT)
+
+        return mask
+
+    def get_or_create_voxel_mask(self, key: str, create: Callable[[], VoxelMask]) -> VoxelMask:
+        '''get a cached sparse mask or create (and cache) it'''
+        mask = self.get_voxel_mask(key)
+        if mask is None:
+            mask = self.put_voxel_mask(key, create())
+
+        return mask
+
+    def clear(self, disk: bool = False) -> None:
+        '''forget every mask in memory (and optionally on disk)'''
+        self._masks.clear()
+        self._voxel_masks.clear()
+        if not disk or self._path is None or not os.path.isdir(self._path):
+            return
+
+        for file_name in os.listdir(self._path):
+            if file_name.endswith(('.npy', VOXEL_MASK_EXT)):
+                os.remove(os.path.join(self._path, file_name))
+
+    ###### helpers
+    def __file_path(self, key: str, ext: str = '.npy') -> str:
+        return os.path.join(self._path, f'{key}{ext}')
+
+    def __write(self, key: str, save: Callable, ext: str = '.npy') -> None:
+        '''save to a temp file then rename so other processes never read half a mask'''
+        os.makedirs(self._path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                save(f)
+            os.replace(tmp_path, self.__file_path(key, ext))
+        except OSError:
+            # the disk cache is an optimisation, memory still has the mask
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,264 @@
+'''
+Rigid body (6 DOF) realignment of fMRI volumes to a reference volume
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
+import nibabel as nib
+from scipy.ndimage import affine_transform, gaussian_filter
+
+# voxel stride of the sample points at each level of the pyramid (coarse -> fine)
+PYRAMID_STRIDES: tuple[int, ...] = (4, 2)
+MAX_ITERATIONS: int = 30
+# stop once no parameter moves by more than this (mm or rad)
+TOLERANCE: float = 1e-4
+# voxels dimmer than this fraction of the bright end of the reference are not sampled (background)
+BACKGROUND_FRACTION: float = 0.125
+
+PARAM_NAMES: tuple[str, ...] = ('tx', 'ty', 'tz', 'rx', 'ry', 'rz')
+
+class MotionCorrectionResult(NamedTuple):
+    '''output of realigning a run'''
+    data: np.ndarray
+    # (nt, 6) translations (mm) then rotations (rad) of each volume relative to the reference volume
+    params: np.ndarray
+
+def rigid_matrix(params: np.ndarray) -> np.ndarray:
+    '''4x4 rigid body transform, rotations applied x then y then z, then the translation'''
+    tx, ty, tz, rx, ry, rz = params
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+
+    rot_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rot_y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rot_z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = rot_z @ rot_y @ rot_x
+    matrix[:3, 3] = (tx, ty, tz)
+    return matrix
+
+def rigid_params(matrix: np.ndarray) -> np.ndarray:
+    '''inverse of rigid_matrix'''
+    rotation = matrix[:3, :3]
+    ry = np.arcsin(np.clip(-rotation[2, 0], -1.0, 1.0))
+    rx = np.arctan2(rotation[2, 1], rotation[2, 2])
+    rz = np.arctan2(rotation[1, 0], rotation[0, 0])
+    return np.array([*matrix[:3, 3], rx, ry, rz])
+
+class MotionCorrector:
+    '''
+    Realigns every volume of a run to a reference volume.
+
+    Gauss-Newton on the sum of squared differences in the inverse compositional form:
+    the jacobian only depends on the (smoothed) reference, so it and the 6x6 hessian are
+    computed once per pyramid level and each iteration is just one vectorized trilinear
+    sample of the moving volume plus a 6x6 solve
+    '''
+    def __init__(
+            self,
+            strides: tuple[int, ...] = PYRAMID_STRIDES,
+            max_iterations: int = MAX_ITERATIONS,
+            tolerance: float = TOLERANCE,
+            reference_volume: int = 0,
+            interpolation_order: int = 3
+        ):
+        self._strides = tuple(strides)
+        self._max_iterations = max_iterations
+        self._tolerance = tolerance
+        self._reference_volume = reference_volume
+        self._interpolation_order = interpolation_order
+
+    def realign(self, data, affine: np.ndarray, dtype: np.dtype = np.float32) -> MotionCorrectionResult:
+        '''estimate the motion of each volume and reslice the run onto the reference volume'''
+        data = np.asanyarray(data)
+        params = self.estimate(data, affine)
+        return MotionCorrectionResult(self.reslice(data, affine, params, dtype), params)
+
+    def estimate(self, data, affine: np.ndarray) -> np.ndarray:
+        '''(nt, 6) rigid body parameters mapping the reference volume onto each volume'''
+        data = np.asanyarray(data)
+        if data.ndim != 4:
+            raise ValueError(f'Cannot realign data with shape {data.shape}')
+
+        nt = data.shape[-1]
+        # centred world coordinates so rotations are about the middle of the field of view
+        centred_affine = self.__centred_affine(data.shape, affine)
+        matrices = [np.eye(4) for _ in range(nt)]
+
+        for stride in self._strides:
+            # one float copy of the run per level, smoothed to the scale of the level
+            sigma = stride / 2 if stride > 1 else 0
+            level = np.asarray(data, dtype=np.float32)
+            if sigma:
+                level = gaussian_filter(level, sigma=(sigma, sigma, sigma, 0))
+
+            reference = level[..., self._reference_volume]
+            points, jacobian, target = self.__precompute(reference, centred_affine, stride)
+
+            estimate = np.eye(4)
+            for t in range(nt):
+                if t == self._reference_volume:
+                    continue
+
+                # motion is slow, the previous volume is a better start than no motion
+                start = matrices[t] if stride != self._strides[0] else estimate
+                estimate = self.__register(level[..., t], points, jacobian, target, centred_affine, start)
+                matrices[t] = estimate
+
+        return np.stack([rigid_params(matrix) for matrix in matrices])
+
+    def reslice(self, data, affine: np.ndarray, params: np.ndarray, dtype: np.dtype = np.float32) -> np.ndarray:
+        '''resample each volume onto the reference volume given its motion parameters'''
+        data = np.asanyarray(data)
+        centred_affine = self.__centred_affine(data.shape, affine)
+        inverse = np.linalg.inv(centred_affine)
+
+        resliced = np.zeros(data.shape, dtype=dtype)
+        for t in range(data.shape[-1]):
+            # reference voxel -> centred world -> moved world -> moving voxel
+            voxel_map = inverse @ rigid_matrix(params[t]) @ centred_affine
+            affine_transform(
+                np.asarray(data[..., t], dtype=np.float32),
+                voxel_map[:3, :3],
+                offset=voxel_map[:3, 3],
+                output=resliced[..., t],
+                order=self._interpolation_order,
+                mode='constant',
+                cval=0.0
+            )
+
+        return resliced
+
+    ###### helpers
+    @staticmethod
+    def __centred_affine(shape: tuple[int, ...], affine: np.ndarray) -> np.ndarray:
+        '''voxel -> world coordinates with the centre of the volume at 0'''
+        affine = np.asarray(affine, dtype=np.float64)
+        centre = affine @ np.append((np.asarray(shape[:3]) - 1) / 2, 1)
+        centred = affine.copy()
+        centred[:3, 3] -= centre[:3]
+        return centred
+
+    def __precompute(self, reference: np.ndarray, centred_affine: np.ndarray, stride: int):
+        '''sample points (centred world coords), their jacobian wrt the 6 params and the reference values'''
+        # foreground voxels on a stride x stride x stride lattice
+        lattice = reference[::stride, ::stride, ::stride]
+        bright = np.percentile(reference, 98)
+        voxels = np.argwhere(lattice > bright * BACKGROUND_FRACTION).T * stride
+
+        # gradient of the reference in world coordinates (chain rule through the affine)
+        voxel_gradient = np.stack([g[tuple(voxels)] for g in np.gradient(reference)])
+        gradient = np.linalg.inv(centred_affine[:3, :3]).T @ voxel_gradient
+
+        points = centred_affine[:3, :3] @ voxels + centred_affine[:3, 3:]
+        x, y, z = points
+        gx, gy, gz = gradient
+        # d(R p + t)/d(params) at params = 0, dotted with the gradient
+        jacobian = np.stack([
+            gx, gy, gz,
+            gz * y - gy * z, # rx: e_x cross p = (0, -z, y)
+            gx * z - gz * x, # ry: e_y cross p = (z, 0, -x)
+            gy * x - gx * y  # rz: e_z cross p = (-y, x, 0)
+        ], axis=1)
+
+        target = reference[tuple(voxels)]
+        return points, jacobian, target
+
+    def __register(
+            self,
+            volume: np.ndarray,
+            points: np.ndarray,
+            jacobian: np.ndarray,
+            target: np.ndarray,
+            centred_affine: np.ndarray,
+            matrix: np.ndarray
+        ) -> np.ndarray:
+        '''gauss newton iterations (inverse compositional), returns the reference -> volume transform'''
+        inverse = np.linalg.inv(centred_affine)
+        full_hessian = jacobian.T @ jacobian
+
+        # levenberg-marquardt style damping, only kicks in when a full step makes things worse
+        damping = 0.0
+        best_cost, best_matrix = np.inf, matrix
+        hessian, gradient = full_hessian, np.zeros(jacobian.shape[1])
+
+        for _ in range(self._max_iterations):
+            voxel_map = inverse @ matrix
+            values, inside = _sample_trilinear(volume, voxel_map[:3, :3] @ points + voxel_map[:3, 3:])
+            error = values - target
+            cost = np.mean(error[inside] ** 2) if inside.any() else np.inf
+
+            if cost <= best_cost:
+                best_cost, best_matrix = cost, matrix
+                damping /= 10
+                if inside.all():
+                    hessian, gradient = full_hessian, jacobian.T @ error
+                else:
+                    # points that moved off the volume dont count
+                    hessian, gradient = jacobian[inside].T @ jacobian[inside], jacobian[inside].T @ error[inside]
+            else:
+                # overshot, go back and take a shorter step
+                damping = max(damping * 10, 1e-4)
+
+            step = np.linalg.solve(hessian + damping * np.diag(np.diag(hessian)), gradient)
+            matrix = best_matrix @ np.linalg.inv(rigid_matrix(step))
+            if np.abs(step).max() < self._tolerance:
+                break
+
+        return best_matrix
+
+def _sample_trilinear(volume: np.ndarray, coords: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''values of a volume at (3, n) voxel coordinates and which coordinates were inside the volume'''
+    shape = np.asarray(volume.shape)[:, np.newaxis]
+    inside = np.all((coords >= 0) & (coords <= shape - 1), axis=0)
+
+    lower = np.clip(np.floor(coords), 0, np.maximum(shape - 2, 0)).astype(np.intp)
+    frac = np.clip(coords - lower, 0, 1)
+    flat = volume.ravel()
+    strides = np.array([volume.shape[1] * volume.shape[2], volume.shape[2], 1])[:, np.newaxis]
+
+    values = np.zeros(coords.shape[1], dtype=np.float64)
+    for corner in np.ndindex(2, 2, 2):
+        corner = np.asarray(corner)[:, np.newaxis]
+        weight = np.prod(np.where(corner == 1, frac, 1 - frac), axis=0)
+        values += weight * flat[np.sum((lower + corner) * strides, axis=0)]
+
+    return values, inside
+
+def _realign_file(path: str, out_dir: str, corrector: MotionCorrector) -> tuple[str, np.ndarray]:
+    '''realign one nifti and write the corrected run (and its params) to out_dir (runs in a worker process)'''
+    img = nib.load(path)
+    result = corrector.realign(img.dataobj, img.affine)
+
+    name = os.path.basename(path)
+    out_path = os.path.join(out_dir, name)
+    nib.save(nib.Nifti1Image(result.data, img.affine, img.header), out_path)
+
+    stem = name.split('.')[0]
+    np.savetxt(os.path.join(out_dir, f'{stem}_motion.txt'), result.params, header=' '.join(PARAM_NAMES))
+    return out_path, result.params
+
+def realign_files(
+        paths: list[str],
+        out_dir: str,
+        n_workers: int = 1,
+        corrector: MotionCorrector | None = None
+    ) -> list[tuple[str, np.ndarray]]:
+    '''realign many runs (one per process), returns the corrected path and motion params of each'''
+    os.makedirs(out_dir, exist_ok=True)
+    corrector = MotionCorrector() if corrector is None else corrector
+
+    if n_workers <= 1:
+        return [_realign_file(path, out_dir, corrector) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(
+            _realign_file,
+            paths,
+            [out_dir] * len(paths),
+            [corrector] * len(paths)
+        ))
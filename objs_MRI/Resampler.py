@@ -0,0 +1,220 @@
+'''
+Resample every volume of a 3D/4D img onto another grid in one pass
+'''
+
+import numpy as np
+from scipy.ndimage import map_coordinates, spline_filter1d
+
+INTERPOLATIONS: tuple[str, ...] = ('continuous', 'linear', 'nearest')
+# number of volumes converted and interpolated together
+VOLUMES_PER_CHUNK: int = 16
+# voxel coordinates this close to the edge of the source grid are snapped onto it
+EDGE_TOLERANCE: float = 1e-5
+
+class Resampler:
+    '''
+    Maps a source grid (shape, affine) onto a target grid.
+    The target -> source voxel mapping (and the interpolation weights) are computed once
+    and then applied to every volume, chunk by chunk.
+    Matches nilearn's resample_to_img (scipy ndimage, 0 outside of the source)
+    '''
+    def __init__(
+            self,
+            source_shape: tuple[int, ...],
+            source_affine: np.ndarray,
+            target_shape: tuple[int, ...],
+            target_affine: np.ndarray,
+            interpolation: str = 'continuous'
+        ):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f'Unrecognized interpolation: {interpolation}. Expected one of {INTERPOLATIONS}')
+
+        self._source_shape = tuple(int(n) for n in source_shape[:3])
+        self._target_shape = tuple(int(n) for n in target_shape[:3])
+        self._interpolation = interpolation
+
+        # target voxel -> world -> source voxel
+        source_affine = np.asarray(source_affine, dtype=np.float64)
+        target_affine = np.asarray(target_affine, dtype=np.float64)
+        if np.array_equal(source_affine, target_affine):
+            transform = np.eye(4) # same trick as nilearn, numerically stable
+        else:
+            transform = np.linalg.inv(source_affine) @ target_affine
+
+        target_idx = np.indices(self._target_shape, dtype=np.float64).reshape(3, -1)
+        # (3, n_target_voxels) coordinates into the source grid
+        coords = transform[:3, :3] @ target_idx + transform[:3, 3:]
+        self._coords = _snap_to_grid(coords, np.asarray(self._source_shape)[:, np.newaxis])
+
+        self._idx: np.ndarray = None
+        self._weights: np.ndarray = None
+        # (n_target, n_source) spline weights per axis when the mapping is axis aligned
+        self._axis_weights: list[np.ndarray] = None
+        if interpolation != 'continuous':
+            self.__make_gather()
+        elif _is_axis_aligned(transform, self._target_shape):
+            self._axis_weights = [
+                _cubic_spline_weights(
+                    transform[axis, axis] * np.arange(self._target_shape[axis]) + transform[axis, 3],
+                    self._source_shape[axis]
+                )
+                for axis in range(3)
+            ]
+
+    @property
+    def target_shape(self) -> tuple[int, int, int]:
+        '''read only'''
+        return self._target_shape
+
+    @property
+    def interpolation(self) -> str:
+        '''read only'''
+        return self._interpolation
+
+    def resample(self, data, dtype: np.dtype = np.float32, out: np.ndarray | None = None) -> np.ndarray:
+        """Resample a 3D/4D array (or nibabel array proxy)
+
+        Args:
+            data (array like): source data on the source grid
+            dtype (np.dtype, optional): dtype of the output. Defaults to np.float32.
+            out (np.ndarray, optional): C contiguous array of shape target_shape (+ (nt,)) to write into.
+
+        Returns:
+            np.ndarray: data on the target grid
+        """
+        # one read of the data in its stored dtype, floats are only made one chunk at a time
+        data = np.asanyarray(data)
+        if data.shape[:3] != self._source_shape:
+            raise ValueError(f'Expected data on a {self._source_shape} grid, got {data.shape}')
+
+        is_3d = data.ndim == 3
+        if is_3d:
+            data = data[..., np.newaxis]
+
+        nt = data.shape[3]
+        if out is None:
+            out = np.zeros(self._target_shape + (nt,), dtype=dtype)
+
+        out_matrix = out.reshape(-1, nt) # view, (n_target_voxels, nt)
+        for t0 in range(0, nt, VOLUMES_PER_CHUNK):
+            t1 = min(t0 + VOLUMES_PER_CHUNK, nt)
+            out_matrix[:, t0:t1] = self.__resample_chunk(data[..., t0:t1])
+
+        return out[..., 0] if is_3d else out
+
+    ###### helpers
+    def __resample_chunk(self, chunk: np.ndarray) -> np.ndarray:
+        '''(n_target_voxels, n_volumes) interpolated values of a chunk of volumes'''
+        if self._interpolation == 'continuous':
+            return self.__resample_chunk_spline(chunk)
+
+        # (n_source_voxels, n_volumes), one gather per neighbour for the whole chunk
+        source = np.ascontiguousarray(chunk, dtype=np.float64).reshape(-1, chunk.shape[-1])
+
+        resampled = self._weights[0][:, np.newaxis] * source[self._idx[0]]
+        for idx, weights in zip(self._idx[1:], self._weights[1:]):
+            resampled += weights[:, np.newaxis] * source[idx]
+
+        return resampled
+
+    def __resample_chunk_spline(self, chunk: np.ndarray) -> np.ndarray:
+        '''cubic b-spline, prefiltered for the whole chunk at once'''
+        # same prefilter scipy applies per volume (mode='constant' needs no padding)
+        filtered = np.array(chunk, dtype=np.float64)
+        for axis in range(3):
+            spline_filter1d(filtered, order=3, axis=axis, mode='constant', output=filtered)
+
+        if self._axis_weights is not None:
+            # separable, 3 small matrix products instead of 64 taps per voxel per volume
+            x_weights, y_weights, z_weights = self._axis_weights
+            resampled = np.tensordot(x_weights, filtered, axes=(1, 0))
+            resampled = np.moveaxis(np.tensordot(y_weights, resampled, axes=(1, 1)), 0, 1)
+            resampled = np.moveaxis(np.tensordot(z_weights, resampled, axes=(1, 2)), 0, 2)
+            return resampled.reshape(-1, chunk.shape[-1])
+
+        resampled = np.empty((self._coords.shape[1], chunk.shape[-1]), dtype=np.float64)
+        for t in range(chunk.shape[-1]):
+            map_coordinates(
+                filtered[..., t],
+                self._coords,
+                output=resampled[:, t],
+                order=3,
+                mode='constant',
+                cval=0.0,
+                prefilter=False
+            )
+
+        return resampled
+
+    def __make_gather(self) -> None:
+        '''flat source indices and weights of the neighbours of each target voxel'''
+        shape = np.asarray(self._source_shape)[:, np.newaxis]
+        # like scipy's mode='constant', anything outside of the source grid is 0
+        inside = np.all((self._coords >= 0) & (self._coords <= shape - 1), axis=0)
+
+        if self._interpolation == 'nearest':
+            nearest = np.clip(np.floor(self._coords + 0.5), 0, shape - 1).astype(np.intp)
+            self._idx = np.ravel_multi_index(nearest, self._source_shape)[np.newaxis]
+            self._weights = inside.astype(np.float64)[np.newaxis]
+            return
+
+        # trilinear, 8 neighbours
+        lower = np.clip(np.floor(self._coords), 0, np.maximum(shape - 2, 0)).astype(np.intp)
+        frac = self._coords - lower
+        upper = np.minimum(lower + 1, shape - 1)
+
+        idxs, weights = [], []
+        for corner in np.ndindex(2, 2, 2):
+            corner_idx = np.where(np.asarray(corner)[:, np.newaxis] == 1, upper, lower)
+            corner_weight = np.prod(
+                np.where(np.asarray(corner)[:, np.newaxis] == 1, frac, 1 - frac),
+                axis=0
+            )
+            idxs.append(np.ravel_multi_index(corner_idx, self._source_shape))
+            weights.append(np.where(inside, corner_weight, 0.0))
+
+        self._idx = np.stack(idxs)
+        self._weights = np.stack(weights)
+
+def _is_axis_aligned(transform: np.ndarray, target_shape: tuple[int, ...]) -> bool:
+    '''off diagonal terms move no target voxel by more than the edge tolerance'''
+    linear = transform[:3, :3]
+    off_diagonal = np.abs(linear - np.diag(np.diag(linear))).max()
+    return off_diagonal * max(target_shape) < EDGE_TOLERANCE
+
+def _snap_to_grid(coords: np.ndarray, n: np.ndarray) -> np.ndarray:
+    '''float noise in the affines (e.g. float32 headers) shouldnt push edge voxels off of a grid of n voxels'''
+    upper = np.asarray(n, dtype=np.float64) - 1
+    coords = np.where((coords < 0) & (coords > -EDGE_TOLERANCE), 0.0, coords)
+    return np.where((coords > upper) & (coords < upper + EDGE_TOLERANCE), upper, coords)
+
+def _mirror(idx: np.ndarray, n: int) -> np.ndarray:
+    '''reflect indices that fall off a grid of n voxels, how scipy extends spline coefficients'''
+    if n == 1:
+        return np.zeros_like(idx)
+
+    period = 2 * (n - 1)
+    idx = np.abs(idx) % period
+    return np.where(idx >= n, period - idx, idx)
+
+def _cubic_spline_weights(coords: np.ndarray, n: int) -> np.ndarray:
+    '''(len(coords), n) cubic b-spline weights on prefiltered coefficients along one axis'''
+    coords = _snap_to_grid(coords, n)
+    inside = (coords >= 0) & (coords <= n - 1)
+    floor = np.floor(coords)
+    t = coords - floor
+
+    taps = (
+        (1 - t) ** 3 / 6,
+        (4 - 6 * t ** 2 + 3 * t ** 3) / 6,
+        (1 + 3 * t + 3 * t ** 2 - 3 * t ** 3) / 6,
+        t ** 3 / 6
+    )
+
+    weights = np.zeros((coords.size, n), dtype=np.float64)
+    rows = np.arange(coords.size)
+    for tap, tap_weights in enumerate(taps):
+        # mirrored taps can land on the same coefficient, so accumulate
+        np.add.at(weights, (rows, _mirror(floor.astype(np.intp) - 1 + tap, n)), np.where(inside, tap_weights, 0.0))
+
+    return weights
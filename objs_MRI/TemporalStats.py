@@ -0,0 +1,202 @@
+'''
+Single pass, streaming temporal statistics (mean, variance, tSNR) of 4D imgs
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
+import nibabel as nib
+from Types import ROI
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy
+
+# number of volumes read and merged at a time, nifti stores time slowest so these are contiguous reads
+VOLUMES_PER_CHUNK: int = 16
+# a slice of a proxy of these files decompresses the file from the start
+COMPRESSED_EXTS: tuple[str, ...] = ('.gz', '.bz2', '.zst')
+
+class TemporalStatsResult(NamedTuple):
+    '''per voxel temporal statistics, volumes for a whole img or (n_roi_voxels,) vectors for a mask'''
+    mean: np.ndarray
+    var: np.ndarray
+    # mean / std, 0 where the voxel has no variance
+    tsnr: np.ndarray
+    # variance left after removing a linear trend over time (None unless asked for)
+    detrended_var: np.ndarray | None
+    nt: int
+
+class TemporalStatsSummary(NamedTuple):
+    '''one participant's qc numbers, what the cohort mode returns'''
+    path: str
+    n_voxels: int
+    nt: int
+    mean_tsnr: float
+    median_tsnr: float
+    mean_signal: float
+    mean_var: float
+    mean_detrended_var: float | None
+    error: str | None
+
+class TemporalStats:
+    '''
+    Streams an img over time in chunks of volumes and merges each chunk's moments
+    into running ones (Welford / Chan et al. pairwise update), so the img is read once,
+    in its stored dtype, and only one chunk is ever held as float64
+    '''
+    def __init__(self, volumes_per_chunk: int = VOLUMES_PER_CHUNK, detrend: bool = False):
+        self._volumes_per_chunk = volumes_per_chunk
+        self._detrend = detrend
+
+    def compute(self, data, mask: np.ndarray | None = None, bbox: tuple[slice, ...] | None = None) -> TemporalStatsResult:
+        """Temporal statistics of every voxel (or only the masked ones)
+
+        Args:
+            data (array like): 4D array or nibabel style proxy, only sliced one chunk at a time
+            mask (np.ndarray, optional): boolean spatial mask, of the bbox if one is given. Defaults to None.
+            bbox (tuple[slice, ...], optional): (x, y, z) slices read from data. Defaults to the whole volume.
+
+        Returns:
+            TemporalStatsResult: volumes (of the bbox) without a mask, (n_masked_voxels,) vectors with one
+        """
+        if len(data.shape) != 4:
+            raise ValueError(f'Cannot compute temporal statistics of data with shape {data.shape}')
+
+        bbox = tuple(bbox) if bbox is not None else (slice(None),) * 3
+        nt = data.shape[-1]
+        if not _is_seekable(data):
+            # every chunk would decompress the whole file again, read the bbox once and chunk in memory
+            data, bbox = np.asanyarray(data[bbox]), (slice(None),) * 3
+
+        n = 0
+        mean = m2 = comoment = None
+        for t0 in range(0, nt, self._volumes_per_chunk):
+            t1 = min(t0 + self._volumes_per_chunk, nt)
+            chunk = np.asanyarray(data[bbox + (slice(t0, t1),)])
+            chunk = chunk[mask] if mask is not None else chunk
+            chunk = chunk.astype(np.float64, copy=False)
+
+            # moments of the chunk on its own
+            chunk_n = t1 - t0
+            chunk_mean = chunk.mean(axis=-1)
+            centred = chunk - chunk_mean[..., np.newaxis]
+            chunk_m2 = np.einsum('...t,...t->...', centred, centred)
+
+            chunk_comoment = None
+            if self._detrend:
+                # co-moment with time, the trend's slope is comoment / m2 of time
+                time = np.arange(t0, t1, dtype=np.float64)
+                chunk_comoment = centred @ (time - time.mean())
+
+            if n == 0:
+                n, mean, m2, comoment = chunk_n, chunk_mean, chunk_m2, chunk_comoment
+                continue
+
+            # merge the running and chunk moments
+            total = n + chunk_n
+            delta = chunk_mean - mean
+            mean = mean + delta * (chunk_n / total)
+            m2 = m2 + chunk_m2 + delta ** 2 * (n * chunk_n / total)
+            if self._detrend:
+                time_delta = (t0 + t1 - 1) / 2 - (n - 1) / 2
+                comoment = comoment + chunk_comoment + delta * time_delta * (n * chunk_n / total)
+
+            n = total
+
+        var = m2 / n
+        std = np.sqrt(var)
+        tsnr = np.divide(mean, std, out=np.zeros_like(mean), where=std > 0)
+
+        detrended_var = None
+        if self._detrend:
+            time_m2 = n * (n ** 2 - 1) / 12 # m2 of 0..n-1
+            explained = comoment ** 2 / time_m2 if time_m2 > 0 else np.zeros_like(m2)
+            # float error can take a flat voxel just below 0
+            detrended_var = np.maximum(m2 - explained, 0.0) / n
+
+        return TemporalStatsResult(mean, var, tsnr, detrended_var, nt)
+
+def _is_seekable(data) -> bool:
+    '''whether slicing data reads only the slice (arrays, chunked stores, proxies of uncompressed files)'''
+    if isinstance(data, ChunkedArrayProxy) or not nib.is_proxy(data):
+        return True
+
+    file_like = getattr(data, 'file_like', None)
+    return isinstance(file_like, (str, os.PathLike)) and not str(file_like).endswith(COMPRESSED_EXTS)
+
+def _summarize(path: str, result: TemporalStatsResult, mask: np.ndarray | None) -> TemporalStatsSummary:
+    '''reduce a participant's maps to a few qc numbers'''
+    def masked(values: np.ndarray) -> np.ndarray:
+        return values[mask] if mask is not None and values.ndim == mask.ndim else values.ravel()
+
+    tsnr = masked(result.tsnr)
+    return TemporalStatsSummary(
+        path=path,
+        n_voxels=int(tsnr.size),
+        nt=result.nt,
+        mean_tsnr=float(tsnr.mean()) if tsnr.size else np.nan,
+        median_tsnr=float(np.median(tsnr)) if tsnr.size else np.nan,
+        mean_signal=float(masked(result.mean).mean()) if tsnr.size else np.nan,
+        mean_var=float(masked(result.var).mean()) if tsnr.size else np.nan,
+        mean_detrended_var=(
+            float(masked(result.detrended_var).mean()) if result.detrended_var is not None and tsnr.size else None
+        ),
+        error=None
+    )
+
+def _participant_temporal_stats(
+        path: str,
+        roi: ROI | None,
+        stats: TemporalStats,
+        foreground_only: bool
+    ) -> TemporalStatsSummary:
+    '''temporal statistics of one run (runs in a worker process)'''
+    try:
+        if ChunkedArrayProxy.is_store(path):
+            dataobj = ChunkedArrayProxy(path)
+            affine, header = dataobj.affine, None
+        else:
+            img = nib.load(path)
+            dataobj, affine, header = img.dataobj, img.affine, img.header
+
+        if roi is not None:
+            # in here, objs_MRI imports this module
+            from objs_MRI.MRIFunc import MRIFunc
+            fMRI = MRIFunc(dataobj, affine, header)
+            return _summarize(path, fMRI.get_temporal_stats(roi, stats=stats), None)
+
+        result = stats.compute(dataobj)
+        # background voxels (mean 0) would drag the whole brain numbers down
+        mask = result.mean > 0 if foreground_only else None
+        return _summarize(path, result, mask)
+    except (FileNotFoundError, ValueError, TypeError, KeyError, OSError) as e:
+        return TemporalStatsSummary(path, 0, 0, np.nan, np.nan, np.nan, np.nan, None, repr(e))
+
+def cohort_temporal_stats(
+        paths: list[str],
+        roi: ROI | None = None,
+        n_workers: int = 1,
+        detrend: bool = False,
+        foreground_only: bool = True,
+        volumes_per_chunk: int = VOLUMES_PER_CHUNK
+    ) -> list[TemporalStatsSummary]:
+    """QC of many runs, one per process. Each worker only holds one chunk of one run at a time
+
+    Args:
+        paths (list[str]): niftis (or chunked stores) of each participant
+        roi (ROI, optional): restrict to the roi's voxels. Defaults to the whole volume.
+        n_workers (int, optional): number of processes. Defaults to 1.
+        detrend (bool, optional): also compute the linearly detrended variance. Defaults to False.
+        foreground_only (bool, optional): whole volume summaries skip voxels with a mean of 0. Defaults to True.
+        volumes_per_chunk (int, optional): volumes read at a time. Defaults to VOLUMES_PER_CHUNK.
+
+    Returns:
+        list[TemporalStatsSummary]: one summary per path, in order (failed runs have an error)
+    """
+    stats = TemporalStats(volumes_per_chunk, detrend)
+    tasks = (paths, [roi] * len(paths), [stats] * len(paths), [foreground_only] * len(paths))
+
+    if n_workers <= 1:
+        return list(map(_participant_temporal_stats, *tasks))
+
+    with ProcessPoolExecutor(max_workers=min(n_workers, os.cpu_count() or 1)) as executor:
+        return list(executor.map(_participant_temporal_stats, *tasks))
@@ -0,0 +1,208 @@
+'''
+Sparse mask: the sorted flat voxel indices of a grid, so mask work scales with the roi and not the grid
+'''
+
+import hashlib
+import numpy as np
+
+# dtype of the flat (C order) indices
+INDEX_DTYPE: np.dtype = np.int64
+
+class VoxelMask:
+    '''
+    Sorted, unique flat (C order) voxel indices on a grid (shape, affine).
+    Immutable, set operations return new masks and only work between masks on the same grid
+    '''
+    def __init__(self, indices: np.ndarray, shape: tuple[int, ...], affine: np.ndarray, is_sorted: bool = False):
+        '''is_sorted skips sorting / deduplicating indices that already are (e.g. from np.flatnonzero)'''
+        indices = np.asarray(indices, dtype=INDEX_DTYPE).reshape(-1)
+        if not is_sorted:
+            indices = np.unique(indices)
+
+        self._shape = tuple(int(n) for n in shape[:3])
+        if indices.size and (indices[0] < 0 or indices[-1] >= np.prod(self._shape)):
+            raise ValueError(f'Voxel indices out of bounds of the grid {self._shape}')
+
+        # a view, the caller's array stays writeable
+        indices = indices.view()
+        indices.flags.writeable = False
+        self._indices = indices
+        self._affine = np.array(affine, dtype=np.float64)
+        self._affine.flags.writeable = False
+        self._digest: str = None
+        self._bbox: tuple[slice, ...] = None
+        # indices into the mask's own bounding box, reused by every gather from a cropped read
+        self._box_indices: np.ndarray = None
+
+    @classmethod
+    def from_dense(cls, mask: np.ndarray, affine: np.ndarray) -> 'VoxelMask':
+        '''mask of the non zero voxels of a 3D volume'''
+        mask = np.asanyarray(mask)
+        return cls(np.flatnonzero(mask), mask.shape, affine, is_sorted=True)
+
+    @classmethod
+    def union_all(cls, masks: list['VoxelMask']) -> 'VoxelMask':
+        '''union of several masks, one sort of every index instead of pairwise merges'''
+        if not masks:
+            raise ValueError('Need at least one mask')
+
+        first = masks[0]
+        for mask in masks[1:]:
+            first.__check_grid(mask)
+
+        return cls(np.concatenate([mask.indices for mask in masks]), first.shape, first.affine)
+
+    @property
+    def indices(self) -> np.ndarray:
+        '''read only'''
+        return self._indices
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self._shape
+
+    @property
+    def affine(self) -> np.ndarray:
+        return self._affine
+
+    @property
+    def size(self) -> int:
+        return self._indices.size
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def bbox(self) -> tuple[slice, slice, slice]:
+        '''slices of the smallest box holding the mask (empty slices for an empty mask)'''
+        if self._bbox is None:
+            if not self.size:
+                self._bbox = (slice(0, 0),) * 3
+            else:
+                coords = np.unravel_index(self._indices, self._shape)
+                self._bbox = tuple(slice(int(axis.min()), int(axis.max()) + 1) for axis in coords)
+
+        return self._bbox
+
+    @property
+    def name(self) -> str:
+        '''content hash, names the mask in caches like an ROI's name does'''
+        if self._digest is None:
+            digest = hashlib.sha1()
+            digest.update(repr(self._shape).encode())
+            digest.update(np.round(self._affine, 6).tobytes())
+            digest.update(self._indices.tobytes())
+            self._digest = f'mask-{digest.hexdigest()[:20]}'
+
+        return self._digest
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return f'VoxelMask({self.size} voxels on {self._shape}, {self.name})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, VoxelMask):
+            return NotImplemented
+
+        return self.same_grid(other) and np.array_equal(self._indices, other._indices)
+
+    def __hash__(self) -> int:
+        return hash(self.name)
+
+    def same_grid(self, other: 'VoxelMask') -> bool:
+        return self._shape == other._shape and np.allclose(self._affine, other._affine, atol=1e-4)
+
+    ###### set operations
+    def union(self, other: 'VoxelMask') -> 'VoxelMask':
+        self.__check_grid(other)
+        return VoxelMask(np.union1d(self._indices, other._indices), self._shape, self._affine, is_sorted=True)
+
+    def intersection(self, other: 'VoxelMask') -> 'VoxelMask':
+        self.__check_grid(other)
+        indices = np.intersect1d(self._indices, other._indices, assume_unique=True)
+        return VoxelMask(indices, self._shape, self._affine, is_sorted=True)
+
+    def difference(self, other: 'VoxelMask') -> 'VoxelMask':
+        self.__check_grid(other)
+        indices = np.setdiff1d(self._indices, other._indices, assume_unique=True)
+        return VoxelMask(indices, self._shape, self._affine, is_sorted=True)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    ###### array access
+    def box_indices(self, bbox: tuple[slice, ...] | None = None) -> np.ndarray:
+        '''flat (C order) indices of the mask's voxels inside bbox (defaults to the mask's own bounding box)'''
+        own_bbox = bbox is None or tuple(bbox) == self.bbox
+        if own_bbox and self._box_indices is not None:
+            return self._box_indices
+
+        bbox = self.bbox if bbox is None else tuple(bbox)
+        coords = np.unravel_index(self._indices, self._shape)
+        box_shape = tuple(s.stop - s.start for s in bbox)
+        # the box is a sub grid, C order is kept so the indices stay sorted
+        box_coords = tuple(axis - s.start for axis, s in zip(coords, bbox))
+        box_indices = np.ravel_multi_index(box_coords, box_shape).astype(INDEX_DTYPE, copy=False)
+
+        if own_bbox:
+            box_indices.flags.writeable = False
+            self._box_indices = box_indices
+
+        return box_indices
+
+    def gather(self, data: np.ndarray, bbox: tuple[slice, ...] | None = None) -> np.ndarray:
+        """Values of the mask's voxels
+
+        Args:
+            data (np.ndarray): 3D volume or 4D series on the mask's grid, or only its bbox if one is given
+            bbox (tuple[slice, ...], optional): box of the grid data was cropped to. Defaults to None.
+
+        Returns:
+            np.ndarray: (n_voxels,) or (n_voxels, nt), rows in the order of indices
+        """
+        data = np.asanyarray(data)
+        indices = self._indices if bbox is None else self.box_indices(bbox)
+        n_voxels = int(np.prod(data.shape[:3]))
+        return data.reshape((n_voxels,) + data.shape[3:])[indices]
+
+    def scatter(self, values: np.ndarray, fill=0, dtype: np.dtype | None = None) -> np.ndarray:
+        '''(n_voxels,) or (n_voxels, nt) values back onto the full grid, fill everywhere else'''
+        values = np.asanyarray(values)
+        dtype = values.dtype if dtype is None else dtype
+        volume = np.full(self._shape + values.shape[1:], fill, dtype=dtype)
+        volume.reshape((-1,) + values.shape[1:])[self._indices] = values
+        return volume
+
+    def to_dense(self, dtype: np.dtype = np.bool_, bbox: tuple[slice, ...] | None = None) -> np.ndarray:
+        '''3D mask volume, of only the bbox if one is given'''
+        if bbox is None:
+            volume = np.zeros(self._shape, dtype=dtype)
+            volume.reshape(-1)[self._indices] = 1
+            return volume
+
+        volume = np.zeros(tuple(s.stop - s.start for s in bbox), dtype=dtype)
+        volume.reshape(-1)[self.box_indices(bbox)] = 1
+        return volume
+
+    ###### serialization
+    def save(self, file) -> None:
+        '''write to a .npz (path or open binary file)'''
+        np.savez(
+            file,
+            indices=self._indices,
+            shape=np.asarray(self._shape, dtype=np.int64),
+            affine=self._affine
+        )
+
+    @classmethod
+    def load(cls, file) -> 'VoxelMask':
+        with np.load(file, allow_pickle=False) as npz:
+            return cls(npz['indices'], tuple(npz['shape']), npz['affine'], is_sorted=True)
+
+    ###### helpers
+    def __check_grid(self, other: 'VoxelMask') -> None:
+        if not self.same_grid(other):
+            raise ValueError(f'Masks are on different grids: {self._shape} and {other._shape}')
@@ -1,5 +1,11 @@
+from objs_MRI.VoxelMask import VoxelMask
+from objs_MRI.MaskCache import MaskCache
+from objs_MRI.Atlas import Atlas
+from objs_MRI.Resampler import Resampler
+from objs_MRI.MotionCorrector import MotionCorrector
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy
+from objs_MRI.TemporalStats import TemporalStats, TemporalStatsResult, cohort_temporal_stats
 from objs_MRI.abstract import *
 from objs_MRI.errors import *
-from objs_MRI.Atlas import Atlas
 from objs_MRI.MRIFunc import MRIFunc
 from objs_MRI.MRIStruct import MRIStruct
\ No newline at end of file
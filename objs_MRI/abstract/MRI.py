@@ -3,19 +3,45 @@ Represent MRI data as a Nifti1Image obj
 '''
 
 from abc import ABC, abstractmethod
+from typing import NamedTuple
 import numpy as np
 from nibabel import Nifti1Image
-from nilearn.image import resample_to_img, index_img
-import matplotlib.pyplot as plt
 from Types import ROI, Dimension
 from objs_MRI import Atlas
+from objs_MRI.VoxelMask import VoxelMask
+from objs_MRI.Atlas import ROI_PROBABILITY_THRESHOLD, PARCEL_PROBABILITY_THRESHOLD
+from objs_Profiler import stage
+
+# time points of the parcel variance computed at a time (bounds the float64 copy)
+PARCEL_VAR_CHUNK: int = 32
+
+class ParcelFdata(NamedTuple):
+    '''(n_regions, nt) time series of every atlas region, 0 for regions with no voxels on the img's grid'''
+    mean: np.ndarray
+    # variance over each region's voxels, None unless asked for
+    var: np.ndarray | None
+    # (n_regions,) voxels of each region on the img's grid
+    n_voxels: np.ndarray
+
+class _ParcelIndex(NamedTuple):
+    '''labelled voxels of a grid grouped by label, computed once per img'''
+    threshold: float
+    bbox: tuple[slice, ...]
+    # flat indices into the bbox, sorted by label
+    order: np.ndarray
+    # labels present, and where each one's run starts in order
+    labels: np.ndarray
+    starts: np.ndarray
+    counts: np.ndarray
 
 class MRI(Nifti1Image, ABC):
     def __init__(self, dataobj, affine, header=None, extra=None, file_map=None, dtype=None):
         super().__init__(dataobj, affine, header, extra, file_map, dtype)
-        self.__atlas = Atlas()
-        self._current_roi_mask_fdata: np.ndarray = None
-        self._current_roi: ROI = None
+        # one atlas (and mask cache) per process, not per MRI
+        self.__atlas = Atlas.instance()
+        self._current_roi: ROI | VoxelMask = None
+        self._current_roi_mask: VoxelMask = None
+        self._parcel_index: _ParcelIndex = None
 
     ####### Abstract functionality
     @property
@@ -30,82 +56,167 @@ class MRI(Nifti1Image, ABC):
         pass
 
     @abstractmethod
-    def correct_for_motion(self) -> None:
+    def correct_for_motion(self) -> 'MRI':
+        '''returns the img with head motion removed'''
         pass
 
     ###### Shared functionality
     @property
-    def current_roi(self) -> str:
+    def current_roi(self) -> ROI | VoxelMask:
         return self._current_roi
 
     @property
-    def current_roi_mask_fdata(self) -> np.ndarray:
-        return self._current_roi_mask_fdata
+    def current_roi_mask(self) -> VoxelMask | None:
+        return self._current_roi_mask
+
+    @property
+    def current_roi_mask_fdata(self) -> np.ndarray | None:
+        return None if self._current_roi_mask is None else self._current_roi_mask.to_dense()
 
     def get_roi_mask(self, roi: str) -> Nifti1Image:
         return self.__atlas.get_roi_mask(roi)
 
-    def resample_mask(self, roi_mask: 'MRIMask') -> Nifti1Image:
-        return resample_to_img(
-            source_img=roi_mask,
-            target_img=index_img(self, index=0),
-            interpolation='nearest'
+    def get_roi_voxel_mask(self, roi: ROI | VoxelMask, threshold: float = ROI_PROBABILITY_THRESHOLD) -> VoxelMask:
+        '''roi voxels on this img's grid, shared with every img on the same grid. a VoxelMask is its own roi'''
+        if isinstance(roi, VoxelMask):
+            if roi.shape != tuple(self.shape[:3]) or not np.allclose(roi.affine, self.affine, atol=1e-4):
+                raise ValueError(f'{roi!r} is not on the grid of the img {self.shape[:3]}')
+            return roi
+
+        # the atlas resamples (2mm -> this img's resolution) once per grid and caches the result
+        return self.__atlas.get_resampled_roi_voxel_mask(
+            roi,
+            shape=self.shape[:3],
+            affine=self.affine,
+            threshold=threshold
         )
 
-    def get_roi_mask_fdata(self, roi: ROI) -> np.ndarray:
-        roi_mask_img = self.get_roi_mask(roi)
-        # error happens when applying a 2mm resolution mask to a 1mm resolution image
-        if self.shape != roi_mask_img.shape:
-            roi_mask_img = self.resample_mask(roi_mask_img)
-
-        # load as float 32 first before converting to bool
-        # avoids memory errors
-        roi_mask_fdata = roi_mask_img.get_fdata(dtype=np.float32)
-        roi_mask_fdata = roi_mask_fdata.astype(np.bool_)
-
-        return roi_mask_fdata
+    def get_roi_mask_fdata(self, roi: ROI | VoxelMask, threshold: float = ROI_PROBABILITY_THRESHOLD) -> np.ndarray:
+        '''boolean roi mask volume on this img's grid'''
+        return self.get_roi_voxel_mask(roi, threshold).to_dense()
 
-    def get_roi_fdata(self, roi: ROI) -> np.ndarray:
-        if self.current_roi != roi:
-            self._current_roi_mask_fdata = self.get_roi_mask_fdata(roi)
-            self._current_roi = roi
+    def get_roi_voxel_idx(self, roi: ROI | VoxelMask) -> np.ndarray:
+        '''flat (C order) indices of the roi voxels on this img's grid'''
+        self.__update_current_roi(roi)
+        return self._current_roi_mask.indices
 
-        # float32 since apparently were still tight on memory in this day and age
-        img_data = self.get_fdata(dtype=np.float32)
+    def get_roi_bounding_box(self, roi: ROI | VoxelMask) -> tuple[slice, slice, slice]:
+        '''(x, y, z) slices of the smallest box on this img's grid holding the roi'''
+        self.__update_current_roi(roi)
+        return self._current_roi_mask.bbox
 
-        if self.dimension is Dimension.THREE_D:
-            return img_data * self.current_roi_mask_fdata
+    def get_roi_matrix(self, roi: ROI | VoxelMask, dtype: np.dtype = np.float32) -> tuple[np.ndarray, np.ndarray]:
+        """Gathers only the roi voxels of the img in one vectorized pass
 
-        img_data_dimension = len(img_data.shape)
-        assert img_data_dimension == Dimension.FOUR_D.value
-
-        # determine the shape of the img_data after applying an roi mask
-        nt = img_data.shape[-1]
-        t0 = 0
-        masked_img_data_init = img_data[..., t0] * self.current_roi_mask_fdata
-        masked_img_data_shape = masked_img_data_init.shape + (nt,)
-
-        # use that to initialize an NxD array
-        masked_img_data = np.zeros(masked_img_data_shape, np.float64)
-        masked_img_data[..., t0] = masked_img_data_init
+        Args:
+            roi (ROI | VoxelMask): region of interest
+            dtype (np.dtype, optional): dtype of the returned matrix. Defaults to np.float32.
 
-        for t in range(1, nt):
-            # Apply the binary PFC mask
-            masked_img_data[..., t] = img_data[..., t] * self.current_roi_mask_fdata
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (n_roi_voxels, nt) matrix ((n_roi_voxels,) for a 3D img)
+                and the flat voxel index each row came from
+        """
+        with stage('mask'):
+            self.__update_current_roi(roi)
+
+        # only the roi's bounding box is read from the proxy, in its stored dtype (e.g. int16).
+        # the box keeps the C order of the full grid so rows still line up with the mask's indices
+        mask = self._current_roi_mask
+        with stage('read'):
+            cropped_data = np.asanyarray(self.dataobj[mask.bbox])
+        with stage('masking'):
+            roi_matrix = mask.gather(cropped_data, mask.bbox).astype(dtype, copy=False)
+
+        return roi_matrix, mask.indices
+
+    def get_roi_matrices(
+            self,
+            rois: tuple[ROI | VoxelMask, ...],
+            dtype: np.dtype = np.float32
+        ) -> dict[ROI | VoxelMask, tuple[np.ndarray, np.ndarray]]:
+        '''get_roi_matrix of every roi from a single read of the img (the box holding all of them)'''
+        with stage('mask', n_rois=len(rois)):
+            masks = {roi: self.get_roi_voxel_mask(roi) for roi in rois}
+            bbox = _union_bounding_box([mask.bbox for mask in masks.values()])
+
+        with stage('read'):
+            cropped_data = np.asanyarray(self.dataobj[bbox])
+
+        matrices = {}
+        with stage('masking'):
+            for roi, mask in masks.items():
+                roi_matrix = mask.gather(cropped_data, bbox).astype(dtype, copy=False)
+                matrices[roi] = (roi_matrix, mask.indices)
+
+        return matrices
+
+    def get_roi_fdata(self, roi: ROI | VoxelMask, dtype: np.dtype = np.float32) -> np.ndarray:
+        '''img data with everything outside of the roi set to 0'''
+        roi_matrix, _ = self.get_roi_matrix(roi, dtype)
+
+        # scatter the roi back into a full volume
+        return self._current_roi_mask.scatter(roi_matrix, dtype=dtype)
+
+    def get_parcel_fdata(
+            self,
+            threshold: float = PARCEL_PROBABILITY_THRESHOLD,
+            with_var: bool = False,
+            dtype: np.dtype = np.float32,
+            n_regions: int | None = None
+        ) -> ParcelFdata:
+        """Mean (and variance) time series of every atlas region in one vectorized reduction
 
-        return masked_img_data
+        Args:
+            threshold (float, optional): probability a voxel's most likely region needs to get its label.
+                Defaults to PARCEL_PROBABILITY_THRESHOLD.
+            with_var (bool, optional): also compute the variance over each region's voxels. Defaults to False.
+            dtype (np.dtype, optional): dtype of the time series. Defaults to np.float32.
+            n_regions (int, optional): number of atlas regions, when known it saves reading the atlas img
+                (which fetches the atlas). Defaults to the atlas's n_regions.
 
-    def get_roi_img(self, roi: ROI) -> Nifti1Image:
+        Returns:
+            ParcelFdata: (n_regions, nt) blocks ((n_regions, 1) for a 3D img)
+        """
+        index = self.__get_parcel_index(threshold)
+        n_regions = self.__atlas.n_regions if n_regions is None else n_regions
+
+        nt = self.shape[3] if len(self.shape) > 3 else 1
+        n_voxels = np.zeros(n_regions, dtype=np.intp)
+        n_voxels[index.labels - 1] = index.counts
+        mean = np.zeros((n_regions, nt), dtype=dtype)
+        var = np.zeros((n_regions, nt), dtype=dtype) if with_var else None
+        if index.order.size == 0:
+            return ParcelFdata(mean, var, n_voxels)
+
+        # only the labelled bounding box is read, in its stored dtype, then grouped by label with one gather
+        cropped_data = np.asanyarray(self.dataobj[index.bbox])
+        grouped = cropped_data.reshape(int(np.prod(cropped_data.shape[:3])), nt)[index.order]
+
+        # float64 sums without a float copy of the voxels
+        region_mean = np.add.reduceat(grouped, index.starts, axis=0, dtype=np.float64) / index.counts[:, np.newaxis]
+        mean[index.labels - 1] = region_mean
+
+        if with_var:
+            region_var = np.empty_like(region_mean)
+            for t0 in range(0, nt, PARCEL_VAR_CHUNK):
+                t1 = min(t0 + PARCEL_VAR_CHUNK, nt)
+                deviation = grouped[:, t0:t1] - np.repeat(region_mean[:, t0:t1], index.counts, axis=0)
+                region_var[:, t0:t1] = np.add.reduceat(deviation ** 2, index.starts, axis=0)
+            var[index.labels - 1] = region_var / index.counts[:, np.newaxis]
+
+        return ParcelFdata(mean, var, n_voxels)
+
+    def get_roi_img(self, roi: ROI | VoxelMask) -> Nifti1Image:
         """Returns the region of interest of the current img
 
         Args:
-            roi (str): _description_
+            roi (ROI | VoxelMask): region of interest
 
         Returns:
-            _type_: _description_
+            Nifti1Image: img with everything outside of the roi set to 0
         """
 
-        img_data = self.get_roi_fdata(roi, preserve_shape=True)
+        img_data = self.get_roi_fdata(roi)
 
         return Nifti1Image(
             img_data,
@@ -113,6 +224,30 @@ class MRI(Nifti1Image, ABC):
             header=self.header
         )
 
+    def __get_parcel_index(self, threshold: float) -> _ParcelIndex:
+        '''group this grid's labelled voxels by label (once per threshold)'''
+        if self._parcel_index is not None and self._parcel_index.threshold == threshold:
+            return self._parcel_index
+
+        label_fdata = self.__atlas.get_resampled_label_fdata(self.shape[:3], self.affine, threshold)
+        bbox = _bounding_box(label_fdata > 0)
+        cropped_labels = label_fdata[bbox].ravel()
+
+        labelled = np.flatnonzero(cropped_labels)
+        order = labelled[np.argsort(cropped_labels[labelled], kind='stable')]
+        labels, starts, counts = np.unique(cropped_labels[order], return_index=True, return_counts=True)
+
+        self._parcel_index = _ParcelIndex(threshold, bbox, order, labels.astype(np.intp), starts, counts)
+        return self._parcel_index
+
+    def __update_current_roi(self, roi: ROI | VoxelMask) -> None:
+        '''cache the mask of the last roi used'''
+        if self._current_roi_mask is not None and self.current_roi == roi:
+            return
+
+        self._current_roi_mask = self.get_roi_voxel_mask(roi)
+        self._current_roi = roi
+
 
     def show(self, nrows: int = 5, ncols: int = 5, at_time: int = 0) -> None:
         '''show a plot of the current img'''
@@ -122,36 +257,37 @@ class MRI(Nifti1Image, ABC):
         if ncols < n_limit:
             raise ValueError(f'ncols must be greater than {n_limit}')
 
+        # plotting only, keeps matplotlib out of every import of objs_MRI
+        import matplotlib.pyplot as plt
         fig, axis = plt.subplots(
             nrows = nrows,
             ncols = ncols,
             figsize = (10, 10)
         )
 
-        img_data = self.get_fdata()
-        if self.dimension is Dimension.THREE_D:
-            img_data = img_data[..., np.newaxis]
-
-        img_data_dimension = len(img_data.shape)
-        if img_data_dimension != Dimension.FOUR_D.value:
+        img_data_dimension = len(self.shape)
+        if img_data_dimension not in (Dimension.THREE_D.value, Dimension.FOUR_D.value):
             raise RuntimeError(f'Cannot show img where {img_data_dimension = }')
 
+        nt = self.shape[3] if img_data_dimension == Dimension.FOUR_D.value else 1
+        if at_time > (nt-1):
+            raise ValueError(f'Cannot show MRI {at_time = } (out of bounds)')
+
+        # only read the volume being shown
+        volume = np.asanyarray(self.dataobj[..., at_time] if img_data_dimension == Dimension.FOUR_D.value else self.dataobj)
+
         num_slices = nrows * ncols
 
-        nz = img_data.shape[2]
+        nz = volume.shape[2]
         zstep = nz // num_slices
 
-        nt = img_data.shape[3]
-        if at_time > (nt-1):
-            raise ValueError(f'Cannot show MRI {at_time = } (out of bounds)')
-
         current_slice = 0 # index of current slice from the MRI scan
         # for each axis ...
         for i in range(nrows):
             for j in range(ncols):
 
                 axis[i][j].imshow(
-                    img_data[:, :, current_slice, at_time],
+                    volume[:, :, current_slice],
                     cmap = 'gray',
                 )
 
@@ -159,9 +295,23 @@ class MRI(Nifti1Image, ABC):
 
                 current_slice += zstep
 
-
-
-
-
-
-
+def _bounding_box(mask: np.ndarray) -> tuple[slice, ...]:
+    '''slices of the smallest box holding every True voxel of a mask (empty slices for an empty mask)'''
+    bbox = []
+    for axis in range(mask.ndim):
+        other_axes = tuple(a for a in range(mask.ndim) if a != axis)
+        hits = np.flatnonzero(mask.any(axis=other_axes))
+        bbox.append(slice(int(hits[0]), int(hits[-1]) + 1) if hits.size else slice(0, 0))
+
+    return tuple(bbox)
+
+def _union_bounding_box(bboxes: list[tuple[slice, ...]]) -> tuple[slice, ...]:
+    '''smallest box holding every (non empty) box'''
+    bboxes = [bbox for bbox in bboxes if all(s.stop > s.start for s in bbox)]
+    if not bboxes:
+        return (slice(0, 0),) * 3
+
+    return tuple(
+        slice(min(s.start for s in axis_slices), max(s.stop for s in axis_slices))
+        for axis_slices in zip(*bboxes)
+    )
@@ -1,12 +1,15 @@
 
 import numpy as np
-from nilearn.image import resample_to_img, index_img
-from objs_MRI import MRI
-from Types import Dimension
+from objs_MRI.abstract.MRI import MRI
+from objs_MRI.Resampler import Resampler
+from objs_MRI.MotionCorrector import MotionCorrector
+from objs_MRI.TemporalStats import TemporalStats, TemporalStatsResult
+from Types import ROI, Dimension
 
 class MRI4D(MRI):
     def __init__(self, dataobj, affine, header=None, extra=None, file_map=None, dtype=None):
         super().__init__(dataobj, affine, header, extra, file_map, dtype)
+        self._motion_params: np.ndarray = None
 
 #        if len(self.shape) != Dimension.FOUR_D.value:
 #            raise ValueError(f'Cannot inititalize MRI 4D non 4D data shape: {self.shape}')
@@ -16,55 +19,84 @@ class MRI4D(MRI):
     def dimension(self) -> Dimension:
         return Dimension.FOUR_D
 
-    def resample(self, refrence: 'MRI3D') -> 'MRI4D':
-        """Updates fdata cache with resampled fdata
+    def resample(self, refrence: 'MRI3D', interpolation: str = 'continuous', dtype: np.dtype = np.float32) -> 'MRI4D':
+        """Resamples every volume onto the refrence's grid
 
         Args:
             refrence (MRI): img to resample to
-            interpolation (str, optional): Interpolaiton type. Defaults to 'continuous'.
+            interpolation (str, optional): Interpolaiton type ('continuous', 'linear' or 'nearest'). Defaults to 'continuous'.
+            dtype (np.dtype, optional): dtype of the resampled data. Defaults to np.float32.
         """
         refrence_dimension = len(refrence.shape)
         assert refrence_dimension == Dimension.THREE_D.value
 
-        resampled_shape = refrence.shape + (self.nt,)
-        resampled = np.zeros(resampled_shape, dtype=self.get_data_dtype())
-        # Align all other MRIs @ t = t to MRI @ t = 0
-        for t in range(self.nt):
-            curr_img = index_img(self, t)
-            curr_img_corrected = resample_to_img(curr_img, refrence)
-
-            resampled[..., t] = curr_img_corrected.get_fdata()
+        # the voxel mapping is computed once and applied to all volumes in chunks
+        resampler = Resampler(
+            source_shape=self.shape,
+            source_affine=self.affine,
+            target_shape=refrence.shape,
+            target_affine=refrence.affine,
+            interpolation=interpolation
+        )
+        resampled = resampler.resample(self.dataobj, dtype=dtype)
 
-        return MRI4D(
+        return type(self)(
             resampled,
-            affine=self.affine,
+            affine=refrence.affine,
             header=self.header
         )
 
-    def correct_for_motion(self) -> None:
-        """Functional MRI data needs to account for head motion
+    def correct_for_motion(self, corrector: MotionCorrector | None = None) -> 'MRI4D':
+        """Functional MRI data needs to account for head motion.
+        Rigid body realignment of every volume to the first volume
+
+        Args:
+            corrector (MotionCorrector, optional): realignment settings. Defaults to MotionCorrector().
 
         Returns:
-            Self: 4D MRI
+            Self: 4D MRI with the motion removed, its motion_params are the (nt, 6) params of each volume
         """
-        self.resample(
-            refrence = index_img(self, index=0)
+        corrector = MotionCorrector() if corrector is None else corrector
+        result = corrector.realign(self.dataobj, self.affine)
+
+        corrected = type(self)(
+            result.data,
+            affine=self.affine,
+            header=self.header
         )
+        corrected._motion_params = result.params
+
+        return corrected
 
     ##### Unique methods to a 4D MRI
     @property
     def nt(self) -> int:
         return self.shape[-1]
 
-    def get_tsnr(self):
-        '''temporal signal-to-noise ratio'''
-        data = self.get_fdata()
+    @property
+    def motion_params(self) -> np.ndarray | None:
+        '''(nt, 6) translations (mm) and rotations (rad) removed by correct_for_motion'''
+        return self._motion_params
+
+    def get_temporal_stats(self, roi: ROI | None = None, detrend: bool = False, stats: TemporalStats | None = None) -> TemporalStatsResult:
+        """Mean, variance and tSNR of every voxel over time, in one streaming pass over the img
+
+        Args:
+            roi (ROI, optional): only the roi's voxels (only its bounding box is read). Defaults to the whole img.
+            detrend (bool, optional): also compute the variance left after removing a linear trend. Defaults to False.
+            stats (TemporalStats, optional): chunking settings, overrides detrend. Defaults to TemporalStats(detrend=detrend).
+
+        Returns:
+            TemporalStatsResult: volumes, or (n_roi_voxels,) vectors in the same order as get_roi_matrix's rows
+        """
+        stats = TemporalStats(detrend=detrend) if stats is None else stats
+        if roi is None:
+            return stats.compute(self.dataobj)
 
-        tsnr: float = None
-        try:
-            tsnr = np.mean(data, -1) / np.std(data, -1)
-        except ZeroDivisionError:
-            # todo log?
-            pass # return as none
+        roi_mask = self.get_roi_voxel_mask(roi)
+        # only the box around the roi is ever dense
+        return stats.compute(self.dataobj, mask=roi_mask.to_dense(bbox=roi_mask.bbox), bbox=roi_mask.bbox)
 
-        return tsnr
+    def get_tsnr(self, roi: ROI | None = None) -> np.ndarray:
+        '''temporal signal-to-noise ratio (0 where a voxel doesnt vary)'''
+        return self.get_temporal_stats(roi).tsnr
@@ -1,11 +1,14 @@
 import numpy as np
 
 from objs_Model import LinearRegressionModel, LinearRegressionModelDataset
+from objs_Model.RidgeSolver import RidgeSolver, RidgePathResult, ALPHAS
+from objs_Model.CrossValidator import CrossValidator, CrossValidationResult, N_SPLITS
+from objs_Profiler import stage
 from Types import ROI
 
 class BrainAgePredictorDataset(LinearRegressionModelDataset):
-    def __init__(self, participants_df, roi=ROI.PFC):
-        super().__init__(participants_df, roi)
+    def __init__(self, participants_df, roi=ROI.PFC, **kwargs):
+        super().__init__(participants_df, roi, **kwargs)
 
     ########## implement abstract methods
     def get_prediction(self) -> np.array:
@@ -13,15 +16,69 @@ class BrainAgePredictorDataset(LinearRegressionModelDataset):
 
 class BrainAgePredictor(LinearRegressionModel):
 
-    def __init__(self, participants_df):
-        super().__init__(participants_df)
+    def __init__(
+            self,
+            participants_df,
+            alphas: tuple[float, ...] = ALPHAS,
+            roi: ROI = ROI.PFC,
+            dataset_kwargs: dict | None = None,
+            **kwargs
+        ):
+        super().__init__(participants_df, **kwargs)
+        self._alphas = alphas
+        self._roi = roi
+        # passed on to BrainAgePredictorDataset (feature, n_components, func_data_path, ...)
+        self._dataset_kwargs = {} if dataset_kwargs is None else dict(dataset_kwargs)
+        self._solver: RidgeSolver = None
+        self._validation: RidgePathResult = None
+
+    @property
+    def solver(self) -> RidgeSolver | None:
+        '''fitted ridge solver (after run)'''
+        return self._solver
+
+    @property
+    def validation(self) -> RidgePathResult | None:
+        '''validation mae / r2 of every ridge penalty (after run)'''
+        return self._validation
+
+    def cross_validate(
+            self,
+            n_splits: int = N_SPLITS,
+            n_repeats: int = 1,
+            groups_column: str | None = None
+        ) -> CrossValidationResult:
+        '''
+        k-fold estimate of every ridge penalty over all loaded participants, folds run in parallel.
+        Runs on the rows before PCA: X was projected with components fit on the training split, which
+        overlaps every fold's test rows, so each fold fits its own PCA (same n_components) instead
+        '''
+        dataset = self.dataset
+        folds = dataset.get_folds(n_splits, n_repeats, groups_column)
+
+        validator = CrossValidator(
+            n_splits, n_repeats, self._alphas, n_workers=self._n_workers, n_components=dataset.n_components
+        )
+        with stage('cross validate', n_folds=len(folds)):
+            return validator.run(dataset.unreduced_X, dataset.y, folds=folds)
 
     ########## implement abstract methods
     def run(self) -> None:
         '''runs model'''
-        return
+        dataset = self.dataset
+        # one decomposition of the training data, the whole alpha path is scored on the validation set
+        Xtr, ytr = dataset.Xtr, dataset.ytr
+        with stage('fit'):
+            self._solver = RidgeSolver(self._alphas).fit(Xtr, ytr)
+        with stage('evaluate'):
+            self._validation = self._solver.evaluate(dataset.Xv, dataset.yv)
 
 
     def _create_dataset(self) -> BrainAgePredictorDataset:
         '''loads the Model's dataset'''
-        return BrainAgePredictorDataset(self._particpants_df)
+        return BrainAgePredictorDataset(
+            self._particpants_df,
+            self._roi,
+            n_workers=self._n_workers,
+            **self._dataset_kwargs
+        )
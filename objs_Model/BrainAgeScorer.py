@@ -0,0 +1,272 @@
+'''
+Scores new scans with a fitted brain age model, everything that doesn't depend on the scan is set up once
+'''
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+
+from Types import ROI, Feature
+from objs_MRI import Atlas, MaskCache, VoxelMask
+from objs_MRI.Atlas import ATLAS_NAME, PARCELS_NAME, ROI_PROBABILITY_THRESHOLD, PARCEL_PROBABILITY_THRESHOLD
+from helper_funcs import nifti_to_MRIFunc
+from objs_Model.Connectivity import ConnectivityExtractor
+from objs_Model.ModelArtifact import ModelArtifact
+from objs_Model.abstract.ModelDataset import extract_fdata, load_roi_expected_errors
+from objs_Profiler import stage
+
+class ScoreResult(NamedTuple):
+    '''predicted age of one scan, or why it could not be scored'''
+    path: str
+    age: float | None
+    error: str | None
+
+def roi_to_str(roi: ROI | str) -> str:
+    '''ROI member name, or the atlas label itself for single regions'''
+    return roi.name if isinstance(roi, ROI) else str(roi)
+
+def str_to_roi(roi: str) -> ROI | str:
+    return ROI[roi] if roi in ROI.__members__ else roi
+
+class BrainAgeScorer:
+    '''
+    A fitted BrainAgePredictor reduced to what scoring needs: the roi / atlas features on the training grid,
+    the columns that survived the activity filter, connectivity, and one weight vector.
+
+    PCA and ridge are both linear so they are folded into the weights (components^T coef),
+    scoring a scan is a dot product after its features are read.
+    The atlas masks on the grid (roi voxels, or parcel labels) travel with the scorer, so scoring never fetches
+    or resamples the atlas
+    '''
+    def __init__(
+            self,
+            roi: ROI | str,
+            feature: Feature,
+            grid_shape: tuple[int, int, int],
+            grid_affine: np.ndarray,
+            feature_shape: tuple[int, ...],
+            active_features: np.ndarray,
+            weights: np.ndarray,
+            intercept: float,
+            connectivity: str | None = None,
+            fisher_z: bool = True,
+            roi_voxel_idx: np.ndarray | None = None,
+            label_fdata: np.ndarray | None = None,
+            reduction: dict[str, np.ndarray] | None = None,
+            n_workers: int = 1
+        ):
+        self._roi = roi
+        self._feature = feature
+        self._grid_shape = tuple(int(n) for n in grid_shape[:3])
+        self._grid_affine = np.asarray(grid_affine, dtype=np.float64)
+        self._feature_shape = tuple(int(n) for n in feature_shape)
+        self._active_features = np.asarray(active_features, dtype=np.intp)
+        self._weights = np.asarray(weights, dtype=np.float64)
+        self._intercept = float(intercept)
+        # None unless feature is Feature.CONNECTIVITY
+        self._connectivity = None if connectivity is None else ConnectivityExtractor(connectivity, fisher_z)
+        # flat indices of the roi on the grid (voxels), or the parcellation on the grid (parcels / connectivity)
+        self._roi_voxel_idx = roi_voxel_idx
+        self._label_fdata = label_fdata
+        # roi_voxel_idx as a mask scans are extracted with, the atlas roi is never looked up
+        self._roi_mask: VoxelMask = None
+        # pca mean / components and the ridge coef in component space, kept for reference (weights already fold them)
+        self._reduction = {} if reduction is None else dict(reduction)
+        # scans of a batch are read by this many threads (gzip and the proxies release the GIL)
+        self._n_workers = max(1, int(n_workers))
+
+    @staticmethod
+    def from_predictor(predictor, n_workers: int = 1) -> 'BrainAgeScorer':
+        '''scorer of a BrainAgePredictor after run()'''
+        solver = predictor.solver
+        if solver is None:
+            raise ValueError('The predictor has to be run (fit) before it can score')
+
+        dataset = predictor.dataset
+        weights, intercept = solver.coef, solver.intercept
+        reduction = None
+        if dataset.reducer is not None:
+            reducer = dataset.reducer
+            reduction = {'pca_mean': reducer.mean, 'pca_components': reducer.components, 'ridge_coef': weights}
+            # x -> (x - mean) C^T -> . coef + b  ==  x . (C^T coef) + (b - mean . C^T coef)
+            weights = reducer.components.T.astype(np.float64) @ weights
+            intercept = intercept - float(reducer.mean @ weights)
+
+        # every participant was extracted on the same grid, new scans have to be too
+        fMRI = nifti_to_MRIFunc(dataset.get_participant_path(dataset.participant_ids[0]))
+        connectivity = dataset.connectivity if dataset.feature is Feature.CONNECTIVITY else None
+        roi_voxel_idx, label_fdata = None, None
+        if dataset.feature is Feature.VOXELS:
+            roi_voxel_idx = fMRI.get_roi_voxel_idx(dataset.roi)
+        else:
+            label_fdata = Atlas.instance().get_resampled_label_fdata(fMRI.shape[:3], fMRI.affine)
+
+        return BrainAgeScorer(
+            roi=dataset.roi,
+            feature=dataset.feature,
+            grid_shape=fMRI.shape[:3],
+            grid_affine=fMRI.affine,
+            feature_shape=dataset.feature_shape,
+            active_features=dataset.active_features,
+            weights=weights,
+            intercept=intercept,
+            connectivity=None if connectivity is None else connectivity.kind,
+            fisher_z=True if connectivity is None else connectivity.fisher_z,
+            roi_voxel_idx=roi_voxel_idx,
+            label_fdata=label_fdata,
+            reduction=reduction,
+            n_workers=n_workers
+        )
+
+    @property
+    def roi(self) -> ROI | str:
+        return self._roi
+
+    @property
+    def feature(self) -> Feature:
+        return self._feature
+
+    @property
+    def grid(self) -> tuple[tuple[int, int, int], np.ndarray]:
+        '''(shape, affine) scans have to be on'''
+        return self._grid_shape, self._grid_affine
+
+    @property
+    def weights(self) -> np.ndarray:
+        return self._weights
+
+    @property
+    def intercept(self) -> float:
+        return self._intercept
+
+    @property
+    def reduction(self) -> dict[str, np.ndarray]:
+        return dict(self._reduction)
+
+    def warm_up(self) -> 'BrainAgeScorer':
+        '''set up the scorer's masks (or resample them now), not during the first request'''
+        atlas = Atlas.instance()
+        with stage('warm up'):
+            if self._feature is Feature.VOXELS:
+                if self._roi_voxel_idx is None:
+                    atlas.get_resampled_roi_voxel_mask(self._roi, self._grid_shape, self._grid_affine)
+                    return self
+
+                self.__get_roi()
+            else:
+                if self._label_fdata is None:
+                    atlas.get_resampled_label_fdata(self._grid_shape, self._grid_affine)
+                    return self
+
+                key = MaskCache.key(
+                    PARCELS_NAME, self._grid_shape, self._grid_affine, PARCEL_PROBABILITY_THRESHOLD, ATLAS_NAME
+                )
+                atlas.mask_cache.put(key, self._label_fdata, dtype=np.int16)
+
+        return self
+
+    def extract(self, path: str) -> np.ndarray:
+        '''(n_columns,) row of a scan (before connectivity), raises if it doesn't match the training data'''
+        fMRI = nifti_to_MRIFunc(path)
+        if fMRI.shape[:3] != self._grid_shape or not np.allclose(fMRI.affine, self._grid_affine, atol=1e-4):
+            raise ValueError(f'{path} is not on the grid the model was fit on ({self._grid_shape})')
+
+        # parcels: the number of regions is the rows of the features, reading it off the atlas would fetch it
+        n_regions = None if self._feature is Feature.VOXELS else self._feature_shape[0]
+        fdata = extract_fdata(fMRI, self.__get_roi(), self._feature, n_regions)
+        if fdata.shape != self._feature_shape:
+            raise ValueError(f'{path} has features of shape {fdata.shape}, the model expects {self._feature_shape}')
+
+        return fdata.reshape(-1)[self._active_features]
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        '''(n_scans,) ages of (n_scans, n_columns) rows'''
+        rows = np.asarray(rows)
+        if self._connectivity is not None:
+            rows = self._connectivity.transform(rows.reshape((rows.shape[0],) + self._feature_shape))
+
+        return rows.astype(np.float64, copy=False) @ self._weights + self._intercept
+
+    def score(self, paths: list[str]) -> list[ScoreResult]:
+        '''predicted age of every scan, the reads are threaded and the batch is predicted at once'''
+        def read(path: str) -> tuple[np.ndarray | None, str | None]:
+            try:
+                with stage('extract', subject=os.path.basename(path)):
+                    return self.extract(path), None
+            except load_roi_expected_errors + (OSError,) as e:
+                return None, repr(e)
+
+        if self._n_workers == 1 or len(paths) <= 1:
+            extracted = [read(path) for path in paths]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self._n_workers, len(paths))) as executor:
+                extracted = list(executor.map(read, paths))
+
+        read_idxs = [i for i, (row, _) in enumerate(extracted) if row is not None]
+        ages = np.empty(0)
+        if read_idxs:
+            with stage('predict', n_scans=len(read_idxs)):
+                ages = self.predict(np.stack([extracted[i][0] for i in read_idxs]))
+
+        results = [ScoreResult(path, None, error) for path, (_, error) in zip(paths, extracted)]
+        for i, age in zip(read_idxs, ages):
+            results[i] = ScoreResult(paths[i], float(age), None)
+
+        return results
+
+    def __get_roi(self) -> ROI | str | VoxelMask:
+        '''the stored roi voxels the model was fit on, or the atlas roi when there are none'''
+        if self._roi_voxel_idx is None:
+            return self._roi
+
+        if self._roi_mask is None:
+            self._roi_mask = VoxelMask(self._roi_voxel_idx, self._grid_shape, self._grid_affine, is_sorted=True)
+
+        return self._roi_mask
+
+    ###### persistence
+    def save(self, path: str) -> ModelArtifact:
+        '''write the scorer as a ModelArtifact directory, a service can load it without the training data'''
+        settings = {
+            'roi': roi_to_str(self._roi),
+            'feature': self._feature.name,
+            'grid_shape': list(self._grid_shape),
+            'grid_affine': self._grid_affine.tolist(),
+            'feature_shape': list(self._feature_shape),
+            'intercept': self._intercept,
+            'connectivity': None if self._connectivity is None else self._connectivity.kind,
+            'fisher_z': True if self._connectivity is None else self._connectivity.fisher_z,
+            'roi_threshold': ROI_PROBABILITY_THRESHOLD,
+            'parcel_threshold': PARCEL_PROBABILITY_THRESHOLD,
+        }
+        arrays = {
+            'weights': self._weights,
+            'active_features': self._active_features.astype(np.int64, copy=False),
+            'roi_voxel_idx': None if self._roi_voxel_idx is None else np.asarray(self._roi_voxel_idx, dtype=np.int64),
+            'label_fdata': self._label_fdata,
+            **self._reduction
+        }
+        return ModelArtifact.write(path, settings, arrays)
+
+    @staticmethod
+    def load(path: str, n_workers: int = 1, mmap: bool = True) -> 'BrainAgeScorer':
+        '''a scorer saved with save, its arrays stay memory mapped (shared between processes) unless mmap=False'''
+        artifact = ModelArtifact(path, mmap)
+        manifest = artifact.manifest
+        return BrainAgeScorer(
+            roi=str_to_roi(manifest['roi']),
+            feature=Feature[manifest['feature']],
+            grid_shape=tuple(manifest['grid_shape']),
+            grid_affine=np.asarray(manifest['grid_affine']),
+            feature_shape=tuple(manifest['feature_shape']),
+            active_features=artifact['active_features'],
+            weights=artifact['weights'],
+            intercept=manifest['intercept'],
+            connectivity=manifest['connectivity'],
+            fisher_z=manifest['fisher_z'],
+            roi_voxel_idx=artifact.get('roi_voxel_idx'),
+            label_fdata=artifact.get('label_fdata'),
+            reduction={name: artifact[name] for name in ('pca_mean', 'pca_components', 'ridge_coef') if name in artifact.array_names},
+            n_workers=n_workers
+        )
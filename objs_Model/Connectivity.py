@@ -0,0 +1,80 @@
+'''
+Functional connectivity (region x region correlation) features, many participants at a time
+'''
+
+import numpy as np
+
+CONNECTIVITY_KINDS: tuple[str, ...] = ('correlation', 'partial correlation')
+# participants per batched matrix multiply
+BATCH_SIZE: int = 64
+# ridge added to the correlation matrix before inverting it for partial correlations
+PARTIAL_CORRELATION_SHRINKAGE: float = 1e-3
+# correlations are clipped this far from +-1 before the fisher z transform
+FISHER_Z_EPS: float = 1e-7
+
+def standardize(time_series: np.ndarray) -> np.ndarray:
+    '''zero mean, unit variance over time (last axis), in place. flat series stay 0'''
+    time_series -= time_series.mean(axis=-1, keepdims=True)
+    std = np.sqrt(np.mean(time_series ** 2, axis=-1, keepdims=True))
+    np.divide(time_series, std, out=time_series, where=std > 0)
+    return time_series
+
+def upper_triangle(matrices: np.ndarray) -> np.ndarray:
+    '''(..., n, n) -> (..., n * (n - 1) / 2) entries above the diagonal, row by row'''
+    rows, cols = np.triu_indices(matrices.shape[-1], k=1)
+    return matrices[..., rows, cols]
+
+class ConnectivityExtractor:
+    '''
+    Turns (n_participants, n_regions, nt) time series into (n_participants, n_pairs) connectivity rows.
+    Each batch of participants is standardized in place and correlated with one batched matmul
+    (Z Z^T / nt), partial correlations come from one batched inverse of those
+    '''
+    def __init__(self, kind: str = 'correlation', fisher_z: bool = True, batch_size: int = BATCH_SIZE):
+        if kind not in CONNECTIVITY_KINDS:
+            raise ValueError(f'Unrecognized connectivity: {kind}. Expected one of {CONNECTIVITY_KINDS}')
+
+        self._kind = kind
+        self._fisher_z = fisher_z
+        self._batch_size = batch_size
+
+    @property
+    def kind(self) -> str:
+        return self._kind
+
+    @property
+    def fisher_z(self) -> bool:
+        return self._fisher_z
+
+    def get_matrices(self, time_series: np.ndarray) -> np.ndarray:
+        '''(batch, n_regions, n_regions) connectivity of (batch, n_regions, nt) time series'''
+        # one float64 copy of the batch, standardized in place
+        standardized = standardize(np.array(time_series, dtype=np.float64))
+        nt = standardized.shape[-1]
+        correlation = np.matmul(standardized, np.swapaxes(standardized, -1, -2)) / nt
+
+        if self._kind == 'correlation':
+            return correlation
+
+        n_regions = correlation.shape[-1]
+        precision = np.linalg.inv(correlation + PARTIAL_CORRELATION_SHRINKAGE * np.eye(n_regions))
+        diagonal = np.sqrt(np.diagonal(precision, axis1=-2, axis2=-1))
+        partial = -precision / (diagonal[..., :, np.newaxis] * diagonal[..., np.newaxis, :])
+        partial[..., np.arange(n_regions), np.arange(n_regions)] = 1.0
+        return partial
+
+    def transform(self, time_series: np.ndarray, dtype: np.dtype = np.float32) -> np.ndarray:
+        '''(n_participants, n_pairs) feature rows, one batch of participants at a time'''
+        n_participants, n_regions = time_series.shape[:2]
+        n_pairs = n_regions * (n_regions - 1) // 2
+
+        features = np.empty((n_participants, n_pairs), dtype=dtype)
+        for start in range(0, n_participants, self._batch_size):
+            pairs = upper_triangle(self.get_matrices(time_series[start:start + self._batch_size]))
+            if self._fisher_z:
+                # closer to normal than r, better behaved for the linear models
+                pairs = np.arctanh(np.clip(pairs, -1 + FISHER_Z_EPS, 1 - FISHER_Z_EPS))
+
+            features[start:start + self._batch_size] = pairs
+
+        return features
@@ -0,0 +1,172 @@
+'''
+k-fold (repeated / grouped) cross validation of the ridge path over one shared feature matrix
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+from objs_Model.RidgeSolver import ALPHAS, gram, kernel_ridge_path, path_scores
+
+N_SPLITS: int = 5
+
+class Fold(NamedTuple):
+    '''row indices of one train / test split'''
+    train: np.ndarray
+    test: np.ndarray
+    repeat: int
+
+class CrossValidationResult(NamedTuple):
+    '''scores of every penalty on every fold'''
+    alphas: np.ndarray
+    # (n_folds, n_alphas)
+    fold_mae: np.ndarray
+    fold_r2: np.ndarray
+    # (n_alphas,) averaged over folds
+    mae: np.ndarray
+    r2: np.ndarray
+    best_alpha: float
+    best_mae: float
+    best_r2: float
+    folds: list[Fold]
+
+def make_folds(
+        n_rows: int,
+        n_splits: int = N_SPLITS,
+        n_repeats: int = 1,
+        groups: np.ndarray | None = None,
+        shuffle: bool = True,
+        random_state: int = 42
+    ) -> list[Fold]:
+    """Train / test splits where every row is tested once per repeat
+
+    Args:
+        n_rows (int): number of rows
+        n_splits (int, optional): folds per repeat. Defaults to N_SPLITS.
+        n_repeats (int, optional): repeats, each with a different shuffle. Defaults to 1.
+        groups (np.ndarray, optional): (n_rows,) group labels, a group is never split between train and test.
+        shuffle (bool, optional): shuffle rows (or groups) before splitting. Defaults to True.
+        random_state (int, optional): seed. Defaults to 42.
+
+    Returns:
+        list[Fold]: n_splits * n_repeats folds
+    """
+    if n_repeats > 1 and not shuffle:
+        raise ValueError('Repeated folds need shuffle=True, otherwise every repeat is the same')
+
+    folds = []
+    for repeat in range(n_repeats):
+        rng = np.random.default_rng((random_state, repeat))
+        if groups is None:
+            order = rng.permutation(n_rows) if shuffle else np.arange(n_rows)
+            fold_of_row = np.empty(n_rows, dtype=np.intp)
+            # sizes differ by at most one
+            fold_of_row[order] = np.arange(n_rows) % n_splits
+        else:
+            fold_of_row = _group_fold_of_row(np.asarray(groups), n_splits, rng if shuffle else None)
+
+        if n_splits < 2 or n_splits > fold_of_row.max(initial=-1) + 1:
+            raise ValueError(f'Cannot make {n_splits} folds out of {n_rows} rows')
+
+        for fold in range(n_splits):
+            folds.append(Fold(
+                train=np.flatnonzero(fold_of_row != fold),
+                test=np.flatnonzero(fold_of_row == fold),
+                repeat=repeat
+            ))
+
+    return folds
+
+def _group_fold_of_row(groups: np.ndarray, n_splits: int, rng: np.random.Generator | None) -> np.ndarray:
+    '''assign whole groups to folds, biggest first into the smallest fold (balanced like GroupKFold)'''
+    labels, group_of_row, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+    if len(labels) < n_splits:
+        raise ValueError(f'Cannot make {n_splits} folds out of {len(labels)} groups')
+
+    # shuffling first breaks ties between equal sized groups differently each repeat
+    order = rng.permutation(len(labels)) if rng is not None else np.arange(len(labels))
+    order = order[np.argsort(-sizes[order], kind='stable')]
+
+    fold_sizes = np.zeros(n_splits, dtype=np.intp)
+    fold_of_group = np.empty(len(labels), dtype=np.intp)
+    for group in order:
+        fold = int(np.argmin(fold_sizes))
+        fold_of_group[group] = fold
+        fold_sizes[fold] += sizes[group]
+
+    return fold_of_group[group_of_row]
+
+class CrossValidator:
+    '''
+    Cross validates the ridge path on every fold in parallel.
+
+    X is read once: a single (n x n) gram matrix of the rows is built, and each fold's centred training
+    kernel and test cross kernel are sub blocks of it re-centred on the fold's training mean.
+    Folds never copy X, they only index the shared gram, and run on threads (the linear algebra releases the GIL).
+    With n_components each fold regresses on the principal components of its own training rows, so a PCA
+    never sees the rows it is tested on
+    '''
+    def __init__(
+            self,
+            n_splits: int = N_SPLITS,
+            n_repeats: int = 1,
+            alphas: tuple[float, ...] = ALPHAS,
+            n_workers: int = 1,
+            shuffle: bool = True,
+            random_state: int = 42,
+            n_components: int | None = None
+        ):
+        self._n_splits = n_splits
+        self._n_repeats = n_repeats
+        self._alphas = np.asarray(alphas, dtype=np.float64)
+        self._n_workers = n_workers
+        self._shuffle = shuffle
+        self._random_state = random_state
+        self._n_components = n_components
+
+    def run(
+            self,
+            X: np.ndarray,
+            y: np.ndarray,
+            groups: np.ndarray | None = None,
+            folds: list[Fold] | None = None
+        ) -> CrossValidationResult:
+        '''scores of every alpha on every fold (made here unless given), the best alpha has the lowest mean mae'''
+        y = np.asarray(y, dtype=np.float64)
+        if folds is None:
+            folds = make_folds(X.shape[0], self._n_splits, self._n_repeats, groups, self._shuffle, self._random_state)
+
+        # centring on the mean of all rows first keeps the inner products small, every fold re-centres exactly
+        inner_products = gram(X)
+
+        def score(fold: Fold) -> tuple[np.ndarray, np.ndarray]:
+            predictions = kernel_ridge_path(
+                inner_products[np.ix_(fold.train, fold.train)],
+                y[fold.train],
+                inner_products[np.ix_(fold.test, fold.train)],
+                self._alphas,
+                self._n_components
+            )
+            return path_scores(predictions, y[fold.test])
+
+        if self._n_workers <= 1:
+            scores = list(map(score, folds))
+        else:
+            with ThreadPoolExecutor(max_workers=self._n_workers) as executor:
+                scores = list(executor.map(score, folds))
+
+        fold_mae = np.stack([mae for mae, _ in scores])
+        fold_r2 = np.stack([r2 for _, r2 in scores])
+        mae, r2 = fold_mae.mean(axis=0), fold_r2.mean(axis=0)
+        best = int(np.argmin(mae))
+
+        return CrossValidationResult(
+            alphas=self._alphas,
+            fold_mae=fold_mae,
+            fold_r2=fold_r2,
+            mae=mae,
+            r2=r2,
+            best_alpha=float(self._alphas[best]),
+            best_mae=float(mae[best]),
+            best_r2=float(r2[best]),
+            folds=folds
+        )
@@ -0,0 +1,178 @@
+'''
+Content addressed on disk cache of preprocessed participant features
+'''
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from Types import ROI
+from objs_MRI.ChunkedArrayProxy import META_FILE_NAME
+
+FEATURE_CACHE_PATH: str = './Data/cache/features'
+# bump whenever the load -> mask -> flatten path changes what it produces
+PIPELINE_VERSION: int = 1
+# evict the least recently used features once the cache is bigger than this
+MAX_CACHE_BYTES: int = 20 * 1024 ** 3
+HASH_CHUNK_BYTES: int = 8 * 1024 ** 2
+
+class FeatureCache:
+    '''
+    Features keyed by (input file content hash, roi, dtype, pipeline version).
+    Writes are atomic (tmp file + rename) so parallel workers can share a cache,
+    and the cache is kept under max_bytes by evicting the least recently used entries.
+    The size of the cache is scanned once and then kept as a running total, the entries are only
+    rescanned (also picking up other workers' writes) when the total goes over max_bytes
+    '''
+    def __init__(self, path: str = FEATURE_CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES):
+        self._path = path
+        self._max_bytes = max_bytes
+        # content hashes of input files, reused while the file's size and mtime dont change.
+        # one small file per input so parallel workers never overwrite each other's hashes
+        self._hash_index_path = os.path.join(path, 'file_hashes')
+        self._size: int = None
+
+    @property
+    def path(self) -> str:
+        '''read only'''
+        return self._path
+
+    def key(self, file_path: str, roi: ROI | str, dtype: np.dtype, regions: tuple[int, ...] = ()) -> str:
+        '''cache key of a file's features, regions are the atlas regions the roi is made of (like MaskCache.key)'''
+        roi_name = roi.name if isinstance(roi, ROI) else str(roi)
+        regions = tuple(sorted(int(r) for r in regions))
+        description = f'{self.file_hash(file_path)}:{roi_name}:{regions}:{np.dtype(dtype).str}:{PIPELINE_VERSION}'
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def file_hash(self, file_path: str) -> str:
+        '''sha256 of a file's content (a chunked store is hashed as the nifti it came from)'''
+        if os.path.isdir(file_path):
+            return self.__store_hash(file_path)
+
+        stat = os.stat(file_path)
+        index_path = self.__hash_index_entry_path(os.path.realpath(file_path))
+
+        known = self.__read_json(index_path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+
+        self.__write_json(index_path, [stat.st_size, stat.st_mtime_ns, digest.hexdigest()])
+        return digest.hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        '''cached features (memory mapped, read only) or None'''
+        entry_path = self.__entry_path(key)
+        try:
+            features = np.load(entry_path, mmap_mode='r', allow_pickle=False)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+        # mark as recently used for eviction
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return features
+
+    def put(self, key: str, features: np.ndarray) -> None:
+        '''atomically store features, then evict old entries if over budget'''
+        entry_path = self.__entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        try:
+            replaced_size = os.path.getsize(entry_path)
+        except OSError:
+            replaced_size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(features), allow_pickle=False)
+                size = f.tell()
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            # the cache is an optimisation, never fail a load because of it
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        if self._size is None:
+            self.evict()
+            return
+
+        self._size += size - replaced_size
+        if self._size > self._max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        '''scan the entries and delete least recently used ones until the cache fits in max_bytes'''
+        entries = []
+        for dir_entry in os.scandir(self._path):
+            if not dir_entry.is_dir():
+                continue
+
+            for entry in os.scandir(dir_entry.path):
+                if entry.name.endswith('.npy'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass # another worker got there first
+
+            total -= size
+
+        self._size = total
+
+    ###### helpers
+    @staticmethod
+    def __store_hash(store_path: str) -> str:
+        try:
+            with open(os.path.join(store_path, META_FILE_NAME), mode='r', encoding='utf-8') as f:
+                source_sha256 = json.loads(f.read()).get('source_sha256')
+        except (FileNotFoundError, ValueError) as e:
+            raise FileNotFoundError(f'Not a chunked store: {store_path}') from e
+
+        if source_sha256 is None:
+            raise ValueError(f'Chunked store has no source hash: {store_path}')
+
+        return source_sha256
+
+    def __entry_path(self, key: str) -> str:
+        # fan out over sub directories so no directory gets huge
+        return os.path.join(self._path, key[:2], f'{key}.npy')
+
+    def __hash_index_entry_path(self, real_path: str) -> str:
+        name = hashlib.sha256(real_path.encode()).hexdigest()
+        return os.path.join(self._hash_index_path, f'{name}.json')
+
+    @staticmethod
+    def __read_json(path: str) -> list | None:
+        try:
+            with open(path, mode='r', encoding='utf-8') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+    def __write_json(self, path: str, obj: list) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode='w', encoding='utf-8') as f:
+                f.write(json.dumps(obj))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,151 @@
+'''
+Long lived brain age inference over a local socket, requests arriving close together are scored as one batch
+'''
+
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from objs_Model.BrainAgeScorer import BrainAgeScorer, ScoreResult
+
+logger = logging.getLogger(__name__)
+
+# scans scored together at most
+MAX_BATCH_SIZE: int = 16
+# how long the first scan of a batch waits for others to join it
+MAX_WAIT_MS: float = 20.0
+DEFAULT_HOST: str = '127.0.0.1'
+DEFAULT_PORT: int = 8765
+
+class InferenceServer:
+    '''
+    Micro-batches score requests for a BrainAgeScorer that was loaded (and warmed up) once.
+
+    Protocol: one json object per line, {"path": "..."} or {"paths": [...]},
+    answered with one line {"results": [{"path": ..., "age": ..., "error": ...}, ...]} in the same order.
+    Batches run on one background thread so the event loop keeps accepting requests while scans are read
+    '''
+    def __init__(self, scorer: BrainAgeScorer, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self._scorer = scorer
+        self._max_batch_size = max(1, int(max_batch_size))
+        self._max_wait_s = max_wait_ms / 1000
+        self._queue: asyncio.Queue = None
+        self._batcher: asyncio.Task = None
+        self._executor: ThreadPoolExecutor = None
+
+    @property
+    def scorer(self) -> BrainAgeScorer:
+        return self._scorer
+
+    async def start(self) -> None:
+        if self._batcher is not None:
+            return
+
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._batcher = asyncio.create_task(self.__run_batches())
+
+    async def stop(self) -> None:
+        if self._batcher is None:
+            return
+
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+
+        self._executor.shutdown(wait=True)
+        self._batcher, self._executor = None, None
+
+    async def __aenter__(self) -> 'InferenceServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.stop()
+
+    async def score(self, path: str) -> ScoreResult:
+        '''predicted age of one scan, batched with whatever else is waiting'''
+        # nothing would ever take the request off the queue
+        if self._batcher is None:
+            raise RuntimeError('server not started')
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((path, future))
+        return await future
+
+    async def score_many(self, paths: list[str]) -> list[ScoreResult]:
+        return list(await asyncio.gather(*(self.score(path) for path in paths)))
+
+    async def __run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait_s
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            paths = [path for path, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._scorer.score, paths)
+            except Exception as e: # keep serving, the callers get the error
+                logger.exception('Batch failed')
+                results = [ScoreResult(path, None, repr(e)) for path in paths]
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    ###### socket endpoint
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    paths = request['paths'] if 'paths' in request else [request['path']]
+                    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                        raise TypeError('paths must be a list of str')
+                    response = {'results': [result._asdict() for result in await self.score_many(paths)]}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {'error': repr(e)}
+
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        '''serve until cancelled'''
+        await self.start()
+        try:
+            server = await asyncio.start_server(self.handle_client, host, port)
+            async with server:
+                logger.info(f'Scoring brain age on {host}:{port}')
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+async def request_scores(paths: list[str], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> list[ScoreResult]:
+    '''client side of InferenceServer.serve'''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps({'paths': paths}) + '\n').encode())
+        await writer.drain()
+        response = json.loads(await reader.readline())
+    finally:
+        writer.close()
+
+    if 'error' in response:
+        raise ValueError(response['error'])
+
+    return [ScoreResult(**result) for result in response['results']]
@@ -0,0 +1,115 @@
+'''
+Versioned on disk format of a fitted model: a manifest plus one .npy per array, memory mapped on load
+'''
+
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+
+MANIFEST_FILE_NAME: str = 'manifest.json'
+ARTIFACT_FORMAT: str = 'brain-age-model'
+# bumped when an existing field changes meaning, readers refuse newer versions
+ARTIFACT_VERSION: int = 1
+
+class ModelArtifact:
+    '''
+    A directory with manifest.json (format, version, scalar settings, and the file / dtype / shape of each array)
+    and uncompressed .npy arrays. Arrays are opened with mmap_mode='r', so loading only reads the manifest
+    and every process scoring with the same artifact shares the page cache instead of holding its own copy
+    '''
+    def __init__(self, path: str, mmap: bool = True):
+        self._path = path
+        self._mmap = mmap
+        with open(os.path.join(path, MANIFEST_FILE_NAME), mode='r', encoding='utf-8') as f:
+            self._manifest: dict = json.loads(f.read())
+
+        if self._manifest.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f'{path} is not a {ARTIFACT_FORMAT} artifact')
+        if self._manifest.get('version', 0) > ARTIFACT_VERSION:
+            raise ValueError(
+                f'{path} is artifact version {self._manifest["version"]}, this code reads up to {ARTIFACT_VERSION}'
+            )
+
+        self._arrays: dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def is_artifact(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, MANIFEST_FILE_NAME))
+
+    @staticmethod
+    def write(path: str, settings: dict, arrays: dict[str, np.ndarray | None]) -> 'ModelArtifact':
+        '''write the artifact (replacing whatever is at path), None arrays are left out'''
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        # build next to the artifact then rename, readers never see half an artifact
+        tmp_path = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+
+        try:
+            array_meta = {}
+            for name, array in arrays.items():
+                if array is None:
+                    continue
+
+                array = np.ascontiguousarray(array)
+                file_name = f'{name}.npy'
+                np.save(os.path.join(tmp_path, file_name), array, allow_pickle=False)
+                array_meta[name] = {'file': file_name, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+            manifest = {
+                'format': ARTIFACT_FORMAT,
+                'version': ARTIFACT_VERSION,
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                **settings,
+                'arrays': array_meta,
+            }
+            with open(os.path.join(tmp_path, MANIFEST_FILE_NAME), mode='w', encoding='utf-8') as f:
+                f.write(json.dumps(manifest, indent=2))
+
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        return ModelArtifact(path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def manifest(self) -> dict:
+        '''read only'''
+        return dict(self._manifest)
+
+    @property
+    def array_names(self) -> list[str]:
+        return list(self._manifest['arrays'])
+
+    def get(self, name: str) -> np.ndarray | None:
+        '''a (read only, memory mapped) array, None if the artifact doesn't have it'''
+        array = self._arrays.get(name)
+        if array is not None:
+            return array
+
+        meta = self._manifest['arrays'].get(name)
+        if meta is None:
+            return None
+
+        array = np.load(os.path.join(self._path, meta['file']), mmap_mode='r' if self._mmap else None, allow_pickle=False)
+        if array.dtype.str != meta['dtype'] or list(array.shape) != meta['shape']:
+            raise ValueError(f'{name} of {self._path} does not match its manifest entry')
+
+        self._arrays[name] = array
+        return array
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        array = self.get(name)
+        if array is None:
+            raise KeyError(name)
+
+        return array
@@ -0,0 +1,229 @@
+'''
+PCA of (n_participants, n_voxels x nt) feature matrices that are far too wide for a full SVD
+'''
+
+import os
+import numpy as np
+
+N_COMPONENTS: int = 200
+PCA_METHODS: tuple[str, ...] = ('incremental', 'randomized')
+# participants per partial fit of the incremental method
+BATCH_SIZE: int = 32
+# feature columns per block for the passes over the data in the randomized method
+COLUMN_BLOCK: int = 2 ** 16
+N_OVERSAMPLES: int = 10
+N_POWER_ITERATIONS: int = 4
+
+class PCAReducer:
+    '''
+    Fits principal components of the rows of X without ever forming a features x features matrix.
+
+    incremental: partial fits over batches of participants (same update as sklearn's IncrementalPCA),
+        only n_components + batch_size rows are held at a time.
+    randomized: randomized range finder (Halko et al.), a few streaming passes over column blocks of X.
+
+    Every SVD is of a short wide matrix so it is done through its (rows x rows) gram matrix
+    '''
+    def __init__(
+            self,
+            n_components: int = N_COMPONENTS,
+            method: str = 'incremental',
+            batch_size: int = BATCH_SIZE,
+            random_state: int = 42
+        ):
+        if method not in PCA_METHODS:
+            raise ValueError(f'Unrecognized PCA method: {method}. Expected one of {PCA_METHODS}')
+
+        self._n_components = n_components
+        self._method = method
+        self._batch_size = batch_size
+        self._random_state = random_state
+
+        self._mean: np.ndarray = None
+        # (n_components, n_features), rows are unit length
+        self._components: np.ndarray = None
+        self._singular_values: np.ndarray = None
+        self._n_samples_seen: int = 0
+
+    @property
+    def n_components(self) -> int:
+        '''number of fitted components (can be less than asked for with few participants)'''
+        return 0 if self._components is None else self._components.shape[0]
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean
+
+    @property
+    def components(self) -> np.ndarray:
+        return self._components
+
+    @property
+    def singular_values(self) -> np.ndarray:
+        return self._singular_values
+
+    @property
+    def explained_variance(self) -> np.ndarray:
+        return self._singular_values ** 2 / max(self._n_samples_seen - 1, 1)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self._components is not None
+
+    def fit(self, X: np.ndarray) -> 'PCAReducer':
+        '''fit on the rows of X (e.g. the training participants' memmap)'''
+        if self._method == 'randomized':
+            self.__fit_randomized(X)
+            return self
+
+        self._mean, self._components, self._singular_values, self._n_samples_seen = None, None, None, 0
+        for start in range(0, X.shape[0], self._batch_size):
+            self.partial_fit(X[start:start + self._batch_size])
+
+        return self
+
+    def partial_fit(self, X_batch: np.ndarray) -> 'PCAReducer':
+        '''update the components with another batch of participants'''
+        batch = np.asarray(X_batch, dtype=np.float32)
+        n_batch = batch.shape[0]
+        if n_batch == 0:
+            return self
+
+        batch_mean = batch.mean(axis=0, dtype=np.float64)
+        n_total = self._n_samples_seen + n_batch
+
+        if self._n_samples_seen == 0:
+            stacked = batch - batch_mean.astype(np.float32)
+            mean = batch_mean
+        else:
+            # previous fit as its scaled components, the new centred batch, and a row for the mean shift
+            mean_correction = np.sqrt(self._n_samples_seen * n_batch / n_total) * (self._mean - batch_mean)
+            stacked = np.vstack((
+                self._singular_values[:, np.newaxis].astype(np.float32) * self._components,
+                batch - batch_mean.astype(np.float32),
+                mean_correction.astype(np.float32)[np.newaxis]
+            ))
+            mean = self._mean + (batch_mean - self._mean) * (n_batch / n_total)
+
+        singular_values, components = _wide_svd(stacked, self._n_components)
+
+        self._mean = mean
+        self._singular_values = singular_values
+        self._components = components
+        self._n_samples_seen = n_total
+        return self
+
+    def transform(self, X: np.ndarray, batch_size: int = BATCH_SIZE) -> np.ndarray:
+        '''(n_rows, n_components) projection of X, batch_size rows at a time'''
+        if not self.is_fitted:
+            raise ValueError('PCAReducer has not been fit')
+
+        mean = self._mean.astype(np.float32)
+        projected = np.empty((X.shape[0], self.n_components), dtype=np.float32)
+        for start in range(0, X.shape[0], batch_size):
+            batch = np.asarray(X[start:start + batch_size], dtype=np.float32)
+            projected[start:start + batch_size] = (batch - mean) @ self._components.T
+
+        return projected
+
+    def fit_transform(self, X: np.ndarray) -> np.ndarray:
+        return self.fit(X).transform(X)
+
+    def inverse_transform(self, projected: np.ndarray) -> np.ndarray:
+        '''features back from their components'''
+        return projected @ self._components + self._mean.astype(np.float32)
+
+    def save(self, path: str) -> None:
+        '''write the fitted components so new participants can be projected without refitting'''
+        if not self.is_fitted:
+            raise ValueError('Cannot save a PCAReducer that has not been fit')
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            path,
+            mean=self._mean,
+            components=self._components,
+            singular_values=self._singular_values,
+            n_samples_seen=self._n_samples_seen,
+            method=self._method
+        )
+
+    @staticmethod
+    def load(path: str) -> 'PCAReducer':
+        '''a fitted reducer saved with save'''
+        with np.load(path, allow_pickle=False) as saved:
+            reducer = PCAReducer(n_components=saved['components'].shape[0], method=str(saved['method']))
+            reducer._mean = saved['mean']
+            reducer._components = saved['components']
+            reducer._singular_values = saved['singular_values']
+            reducer._n_samples_seen = int(saved['n_samples_seen'])
+
+        return reducer
+
+    ###### helpers
+    def __fit_randomized(self, X: np.ndarray) -> None:
+        n_rows, n_features = X.shape
+        n_random = min(self._n_components + N_OVERSAMPLES, n_rows, n_features)
+        blocks = [slice(start, min(start + COLUMN_BLOCK, n_features)) for start in range(0, n_features, COLUMN_BLOCK)]
+
+        # pass 1: column means
+        mean = np.empty(n_features, dtype=np.float64)
+        for block in blocks:
+            mean[block] = np.asarray(X[:, block], dtype=np.float32).mean(axis=0, dtype=np.float64)
+
+        def centred(block: slice) -> np.ndarray:
+            return np.asarray(X[:, block], dtype=np.float32) - mean[block].astype(np.float32)
+
+        # pass 2: sketch of the range of the centred X, the test matrix is regenerated per block, never stored
+        sketch = np.zeros((n_rows, n_random), dtype=np.float64)
+        for i, block in enumerate(blocks):
+            omega = np.random.default_rng((self._random_state, i)).standard_normal((block.stop - block.start, n_random))
+            sketch += centred(block) @ omega.astype(np.float32)
+
+        # power iterations sharpen the spectrum, one pass each (Xc Xc^T Q, block by block)
+        for _ in range(N_POWER_ITERATIONS):
+            basis, _ = np.linalg.qr(sketch)
+            sketch = np.zeros_like(basis)
+            for block in blocks:
+                block_data = centred(block)
+                sketch += block_data @ (block_data.T @ basis.astype(np.float32))
+
+        basis, _ = np.linalg.qr(sketch)
+
+        # last pass: project X onto the basis, (n_random, n_features), then a small svd
+        projected = np.empty((n_random, n_features), dtype=np.float32)
+        for block in blocks:
+            projected[:, block] = basis.T.astype(np.float32) @ centred(block)
+
+        self._singular_values, self._components = _wide_svd(projected, self._n_components)
+        self._mean = mean
+        self._n_samples_seen = n_rows
+
+def _wide_svd(matrix: np.ndarray, n_components: int) -> tuple[np.ndarray, np.ndarray]:
+    '''top singular values and right singular vectors of a (few rows, many columns) matrix through its gram matrix'''
+    # float64 gram, accumulated over column blocks so the matrix is never copied as float64
+    gram = np.zeros((matrix.shape[0], matrix.shape[0]), dtype=np.float64)
+    for start in range(0, matrix.shape[1], COLUMN_BLOCK):
+        block = np.asarray(matrix[:, start:start + COLUMN_BLOCK], dtype=np.float64)
+        gram += block @ block.T
+
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+
+    # descending, and drop directions with no variance (fewer rows than components)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+    tolerance = max(eigenvalues[0], 0.0) * max(gram.shape) * np.finfo(np.float32).eps
+    keep = min(n_components, int(np.sum(eigenvalues > tolerance)))
+
+    singular_values = np.sqrt(eigenvalues[:keep])
+    components = (eigenvectors[:, :keep].T.astype(np.float32) @ matrix) / singular_values[:, np.newaxis].astype(np.float32)
+
+    # sign convention so refits give the same components: largest loading positive
+    signs = np.sign(components[np.arange(keep), np.abs(components).argmax(axis=1)])
+    components *= signs[:, np.newaxis]
+
+    return singular_values, components.astype(np.float32, copy=False)
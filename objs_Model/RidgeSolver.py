@@ -0,0 +1,237 @@
+'''
+Ridge regression for p >> n, one decomposition for a whole path of penalties
+'''
+
+from typing import NamedTuple
+import numpy as np
+
+# ridge penalties evaluated by default
+ALPHAS: tuple[float, ...] = tuple(np.logspace(-2, 6, 17))
+# feature columns per block when streaming over X
+COLUMN_BLOCK: int = 2 ** 16
+
+class RidgePathResult(NamedTuple):
+    '''validation scores of every penalty'''
+    alphas: np.ndarray
+    mae: np.ndarray
+    r2: np.ndarray
+    # penalty with the lowest validation mae
+    best_alpha: float
+    best_mae: float
+    best_r2: float
+
+class RidgeSolver:
+    '''
+    Ridge regression through one eigendecomposition of the centred training data.
+
+    p >= n (dual): K = Xc Xc^T (n x n) = U L U^T and coef(alpha) = Xc^T U (L + alpha)^-1 U^T yc
+    p < n (primal): C = Xc^T Xc (p x p) = V L V^T and coef(alpha) = V (L + alpha)^-1 V^T Xc^T yc
+
+    Either way a prediction is P(Z) (L + alpha)^-1 r for a fixed projection P of the new rows and a fixed
+    vector r, so every penalty on the path costs an (n x n_alphas) product after the single decomposition.
+    The gram matrix is accumulated over column blocks, X (e.g. a memmap) is never copied or centred in memory
+    '''
+    def __init__(self, alphas: tuple[float, ...] = ALPHAS):
+        self._alphas = np.asarray(alphas, dtype=np.float64)
+        self._alpha: float = None
+
+        self._X: np.ndarray = None
+        self._x_mean: np.ndarray = None
+        self._y_mean: float = None
+        self._is_dual: bool = None
+        self._eigenvalues: np.ndarray = None
+        self._eigenvectors: np.ndarray = None
+        self._rhs: np.ndarray = None
+        self._coef: np.ndarray = None
+
+    @property
+    def alphas(self) -> np.ndarray:
+        return self._alphas
+
+    @property
+    def alpha(self) -> float | None:
+        '''penalty used by predict and coef (set by evaluate, or the middle of the path)'''
+        return self._alpha
+
+    @property
+    def intercept(self) -> float:
+        return float(self._y_mean - self._x_mean @ self.coef)
+
+    @property
+    def coef(self) -> np.ndarray:
+        '''(n_features,) weights at the selected alpha'''
+        if self._coef is None:
+            self._coef = self.get_coef(self._alpha)
+
+        return self._coef
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'RidgeSolver':
+        '''decompose the centred training data once, every alpha on the path is then cheap'''
+        X_mean = _column_mean(X)
+        y = np.asarray(y, dtype=np.float64)
+        y_mean = y.mean()
+        y_centred = y - y_mean
+
+        n_rows, n_features = X.shape
+        self._is_dual = n_features >= n_rows
+        if self._is_dual:
+            eigenvalues, eigenvectors = np.linalg.eigh(gram(X, X_mean))
+            rhs = eigenvectors.T @ y_centred
+        else:
+            covariance = _covariance(X, X_mean)
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            rhs = eigenvectors.T @ _transpose_dot(X, X_mean, y_centred)
+
+        self._X, self._x_mean, self._y_mean = X, X_mean, y_mean
+        # the centred gram is only rank n - 1, float noise can take its last eigenvalue below 0
+        self._eigenvalues = np.maximum(eigenvalues, 0.0)
+        self._eigenvectors = eigenvectors
+        self._rhs = rhs
+        self._alpha = float(self._alphas[len(self._alphas) // 2])
+        self._coef = None
+        return self
+
+    def get_coef(self, alpha: float) -> np.ndarray:
+        '''(n_features,) weights for a penalty'''
+        shrunk = self._rhs / (self._eigenvalues + alpha)
+        if self._is_dual:
+            # dual coefficients mapped back to features, Xc^T (U shrunk)
+            return _transpose_dot(self._X, self._x_mean, self._eigenvectors @ shrunk)
+
+        return self._eigenvectors @ shrunk
+
+    def predict(self, X: np.ndarray, alpha: float | None = None) -> np.ndarray:
+        '''(n_rows,) predictions at alpha (defaults to the selected alpha)'''
+        if alpha is None or alpha == self._alpha:
+            coef, intercept = self.coef, self.intercept
+        else:
+            coef = self.get_coef(alpha)
+            intercept = float(self._y_mean - self._x_mean @ coef)
+
+        return _dot(X, coef) + intercept
+
+    def predict_path(self, X: np.ndarray) -> np.ndarray:
+        '''(n_rows, n_alphas) predictions for every alpha on the path, one pass over X'''
+        projection = self.__project(X) * self._rhs
+        return projection @ (1.0 / (self._eigenvalues[:, np.newaxis] + self._alphas)) + self._y_mean
+
+    def evaluate(self, X_validation: np.ndarray, y_validation: np.ndarray) -> RidgePathResult:
+        '''mae and r2 of every alpha on the validation rows, selects the alpha with the lowest mae'''
+        y_validation = np.asarray(y_validation, dtype=np.float64)
+        predictions = self.predict_path(X_validation)
+
+        mae, r2 = path_scores(predictions, y_validation)
+
+        best = int(np.argmin(mae))
+        self._alpha = float(self._alphas[best])
+        self._coef = None
+
+        return RidgePathResult(self._alphas, mae, r2, self._alpha, float(mae[best]), float(r2[best]))
+
+    ###### helpers
+    def __project(self, X: np.ndarray) -> np.ndarray:
+        '''P(Z) of the centred rows of X, (n_rows, n_train) for the dual or (n_rows, n_features) for the primal'''
+        if self._is_dual:
+            # cross kernel with the training rows, then onto the eigenvectors
+            cross = np.zeros((X.shape[0], self._X.shape[0]), dtype=np.float64)
+            for block in _column_blocks(X.shape[1]):
+                cross += _centred_block(X, self._x_mean, block) @ _centred_block(self._X, self._x_mean, block).T
+
+            return cross @ self._eigenvectors
+
+        return _dot(X, self._eigenvectors, self._x_mean)
+
+def kernel_ridge_path(
+        train_gram: np.ndarray,
+        y_train: np.ndarray,
+        cross_gram: np.ndarray,
+        alphas: np.ndarray,
+        n_components: int | None = None
+    ) -> np.ndarray:
+    """Dual ridge predictions for a whole alpha path from (uncentred) inner products only
+
+    Args:
+        train_gram (np.ndarray): (m, m) inner products of the training rows
+        y_train (np.ndarray): (m,) targets
+        cross_gram (np.ndarray): (n_test, m) inner products of the test rows with the training rows
+        alphas (np.ndarray): ridge penalties
+        n_components (int, optional): regress on the training rows' top principal components only,
+            same as fitting PCA on the training rows first. Defaults to None (all features).
+
+    Returns:
+        np.ndarray: (n_test, n_alphas) predictions, same as fitting with the training rows' mean removed
+    """
+    # centre on the training mean without going back to X:
+    # (a - mu).(b - mu) = a.b - a.mu - mu.b + mu.mu, and a.mu is the row mean of a's inner products
+    row_means = train_gram.mean(axis=1)
+    grand_mean = row_means.mean()
+    centred_gram = train_gram - row_means[:, np.newaxis] - row_means[np.newaxis, :] + grand_mean
+    centred_cross = cross_gram - cross_gram.mean(axis=1)[:, np.newaxis] - row_means[np.newaxis, :] + grand_mean
+
+    eigenvalues, eigenvectors = np.linalg.eigh(centred_gram)
+    eigenvalues = np.maximum(eigenvalues, 0.0)
+    if n_components is not None:
+        # the eigenvectors of the centred gram are the principal component scores of the training rows,
+        # dropping the small ones is ridge on the training PCA projection (eigh sorts ascending)
+        eigenvalues, eigenvectors = eigenvalues[-n_components:], eigenvectors[:, -n_components:]
+
+    y_train = np.asarray(y_train, dtype=np.float64)
+    y_mean = y_train.mean()
+    rhs = eigenvectors.T @ (y_train - y_mean)
+
+    projection = (centred_cross @ eigenvectors) * rhs
+    return projection @ (1.0 / (eigenvalues[:, np.newaxis] + np.asarray(alphas))) + y_mean
+
+def path_scores(predictions: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''(n_alphas,) mae and r2 of (n_rows, n_alphas) predictions'''
+    errors = predictions - y[:, np.newaxis]
+    total = np.sum((y - y.mean()) ** 2)
+    r2 = 1 - np.sum(errors ** 2, axis=0) / total if total > 0 else np.full(predictions.shape[1], np.nan)
+    return np.abs(errors).mean(axis=0), r2
+
+def _column_blocks(n_features: int) -> list[slice]:
+    return [slice(start, min(start + COLUMN_BLOCK, n_features)) for start in range(0, n_features, COLUMN_BLOCK)]
+
+def _centred_block(X: np.ndarray, X_mean: np.ndarray, block: slice) -> np.ndarray:
+    return np.asarray(X[:, block], dtype=np.float64) - X_mean[block]
+
+def _column_mean(X: np.ndarray) -> np.ndarray:
+    X_mean = np.empty(X.shape[1], dtype=np.float64)
+    for block in _column_blocks(X.shape[1]):
+        X_mean[block] = np.asarray(X[:, block], dtype=np.float64).mean(axis=0)
+
+    return X_mean
+
+def gram(X: np.ndarray, X_mean: np.ndarray | None = None) -> np.ndarray:
+    '''(n, n) Xc Xc^T, one pass over column blocks of X'''
+    X_mean = _column_mean(X) if X_mean is None else X_mean
+    inner_products = np.zeros((X.shape[0], X.shape[0]), dtype=np.float64)
+    for block in _column_blocks(X.shape[1]):
+        centred = _centred_block(X, X_mean, block)
+        inner_products += centred @ centred.T
+
+    return inner_products
+
+def _covariance(X: np.ndarray, X_mean: np.ndarray) -> np.ndarray:
+    '''(p, p) Xc^T Xc, only used when p < n'''
+    centred = np.asarray(X, dtype=np.float64) - X_mean
+    return centred.T @ centred
+
+def _transpose_dot(X: np.ndarray, X_mean: np.ndarray, v: np.ndarray) -> np.ndarray:
+    '''Xc^T v'''
+    out = np.empty(X.shape[1], dtype=np.float64)
+    for block in _column_blocks(X.shape[1]):
+        out[block] = _centred_block(X, X_mean, block).T @ v
+
+    return out
+
+def _dot(X: np.ndarray, W: np.ndarray, X_mean: np.ndarray | None = None) -> np.ndarray:
+    '''X W (or Xc W with a mean), streamed over column blocks'''
+    out = np.zeros((X.shape[0],) + W.shape[1:], dtype=np.float64)
+    for block in _column_blocks(X.shape[1]):
+        X_block = np.asarray(X[:, block], dtype=np.float64)
+        if X_mean is not None:
+            X_block = X_block - X_mean[block]
+        out += X_block @ W[block]
+
+    return out
@@ -0,0 +1,68 @@
+'''
+Datasets of the same participants for several rois from one decode of each participant's fMRI
+'''
+
+import shutil
+import tempfile
+import weakref
+from typing import Iterable
+import pandas as pd
+
+from objs_Model.abstract.ModelDataset import ModelDataset, LoadFailure
+from objs_Model.BrainAgePredictor import BrainAgePredictorDataset
+from objs_Model.FeatureCache import FEATURE_CACHE_PATH
+from Types import ROI
+
+class RoiSweep:
+    '''
+    One dataset per roi. The first access decodes every participant once, writing the voxels of all the rois
+    to the feature cache (a block per roi and participant), each roi's dataset then builds its X from the cache.
+    Without a feature cache path a tmp cache is used, it lives as long as the sweep
+    '''
+    def __init__(
+            self,
+            participants_df: pd.DataFrame,
+            rois: Iterable[ROI],
+            dataset_cls: type[ModelDataset] = BrainAgePredictorDataset,
+            feature_cache_path: str | None = FEATURE_CACHE_PATH,
+            **dataset_kwargs
+        ):
+        self._rois = tuple(dict.fromkeys(rois))
+        if not self._rois:
+            raise ValueError('A roi sweep needs at least one roi')
+
+        if feature_cache_path is None:
+            feature_cache_path = tempfile.mkdtemp(prefix='roi_sweep_')
+            weakref.finalize(self, shutil.rmtree, feature_cache_path, True)
+
+        self._datasets = {
+            roi: dataset_cls(participants_df, roi, feature_cache_path=feature_cache_path, **dataset_kwargs)
+            for roi in self._rois
+        }
+        self._failures: list[LoadFailure] = None
+
+    @property
+    def rois(self) -> tuple[ROI, ...]:
+        '''read only'''
+        return self._rois
+
+    @property
+    def datasets(self) -> dict[ROI, ModelDataset]:
+        '''dataset of every roi, the participants are decoded on first access'''
+        if self._failures is None:
+            self._failures = self.prefetch()
+
+        return self._datasets
+
+    @property
+    def failures(self) -> list[LoadFailure]:
+        '''participants that could not be decoded'''
+        _ = self.datasets
+        return self._failures
+
+    def prefetch(self) -> list[LoadFailure]:
+        '''the single decode pass, any dataset can run it since they share participants and cache'''
+        return self._datasets[self._rois[0]].prefetch_rois(self._rois)
+
+    def __getitem__(self, roi: ROI) -> ModelDataset:
+        return self.datasets[roi]
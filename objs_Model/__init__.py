@@ -1,2 +1,10 @@
+from objs_Model.FeatureCache import FeatureCache
+from objs_Model.PCAReducer import PCAReducer
+from objs_Model.Connectivity import ConnectivityExtractor
+from objs_Model.RidgeSolver import RidgeSolver, RidgePathResult
+from objs_Model.CrossValidator import CrossValidator, CrossValidationResult, Fold, make_folds
 from objs_Model.abstract import *
-from objs_Model.BrainAgePredictor import BrainAgePredictor, BrainAgePredictorDataset
\ No newline at end of file
+from objs_Model.BrainAgePredictor import BrainAgePredictor, BrainAgePredictorDataset
+from objs_Model.BrainAgeScorer import BrainAgeScorer, ScoreResult
+from objs_Model.InferenceServer import InferenceServer, request_scores
+from objs_Model.RoiSweep import RoiSweep
\ No newline at end of file
@@ -1,8 +1,8 @@
 from abc import ABC
-from objs_Model import Model
+from objs_Model.abstract.Model import Model
 
 class LinearRegressionModel(Model):
 
-    def __init__(self, participants_df):
-        super().__init__(participants_df)
+    def __init__(self, participants_df, **kwargs):
+        super().__init__(participants_df, **kwargs)
 
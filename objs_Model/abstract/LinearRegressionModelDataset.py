@@ -1,14 +1,92 @@
-from objs_Model import ModelDataset
-from Types import ROI
+import os
+import numpy as np
+from objs_Model.abstract.ModelDataset import ModelDataset
+from objs_Model.PCAReducer import PCAReducer, N_COMPONENTS
+from objs_Model.Connectivity import ConnectivityExtractor
+from objs_Profiler import stage
+from Types import ROI, Feature
 
 class LinearRegressionModelDataset(ModelDataset):
-    def __init__(self, participants_df, roi = ROI.PFC):
-        super().__init__(participants_df, roi)
+    def __init__(
+            self,
+            participants_df,
+            roi = ROI.PFC,
+            n_components: int | None = N_COMPONENTS,
+            pca_method: str = 'incremental',
+            components_path: str | None = None,
+            connectivity: str = 'correlation',
+            **kwargs
+        ):
+        """
+        Args:
+            n_components (int, optional): principal components kept, None to skip PCA. Defaults to N_COMPONENTS.
+            pca_method (str, optional): 'incremental' or 'randomized'. Defaults to 'incremental'.
+            components_path (str, optional): .npz of a fitted PCAReducer. Loaded (no refit) if it exists,
+                otherwise the fit on the training rows is saved there. Defaults to None.
+            connectivity (str, optional): 'correlation' or 'partial correlation' rows when
+                feature=Feature.CONNECTIVITY. Defaults to 'correlation'.
+        """
+        super().__init__(participants_df, roi, **kwargs)
+        self._n_components = n_components
+        self._pca_method = pca_method
+        self._components_path = components_path
+        self._reducer: PCAReducer = None
+        self._unreduced_X: np.ndarray = None
+        self._connectivity = ConnectivityExtractor(connectivity)
 
+    @property
+    def connectivity(self) -> ConnectivityExtractor:
+        '''turns parcel time series into rows when feature=Feature.CONNECTIVITY'''
+        return self._connectivity
+
+    @property
+    def n_components(self) -> int | None:
+        '''principal components kept, None when PCA is skipped'''
+        return self._n_components
+
+    @property
+    def unreduced_X(self) -> np.ndarray:
+        '''rows before PCA (X itself when PCA is skipped)'''
+        _ = self.X
+        return self._X if self._unreduced_X is None else self._unreduced_X
+
+    @property
+    def reducer(self) -> PCAReducer | None:
+        '''fitted PCA (after get_data)'''
+        return self._reducer
 
     #override
-    def get_data(self):
+    def get_data(self) -> np.ndarray:
         data = super().get_data()
-        # TODO PCA the data
-        return data
+        if self.feature is Feature.CONNECTIVITY:
+            # (n_participants, n_regions, nt) view of the parcel time series -> upper triangles
+            with stage('connectivity'):
+                data = self._connectivity.transform(data.reshape((data.shape[0],) + self.feature_shape))
+
+        if self._n_components is None:
+            return data
+
+        # kept for cross validation, which has to fit its own PCA in every fold
+        self._unreduced_X = data
+
+        # fit on the training participants only, validation is projected with the same components
+        with stage('pca fit'):
+            self._reducer = self.__get_reducer(data[:self.split_idx])
+        with stage('pca transform'):
+            return self._reducer.transform(data)
+
+    def __get_reducer(self, training_data: np.ndarray) -> PCAReducer:
+        if self._components_path is not None and os.path.exists(self._components_path):
+            reducer = PCAReducer.load(self._components_path)
+            if reducer.mean.shape[0] != training_data.shape[1]:
+                raise ValueError(
+                    f'Components at {self._components_path} were fit on {reducer.mean.shape[0]} features, '
+                    f'the data has {training_data.shape[1]}'
+                )
+            return reducer
+
+        reducer = PCAReducer(self._n_components, self._pca_method).fit(training_data)
+        if self._components_path is not None:
+            reducer.save(self._components_path)
 
+        return reducer
@@ -1,16 +1,18 @@
 from abc import ABC, abstractmethod
 import pandas as pd
 
-from objs_Model import ModelDataset
+from objs_Model.abstract.ModelDataset import ModelDataset
 
 PFC_ROI_STR: str = 'Prefrontal Cortex'
 MIN_PROCESSOR_CORES: int = 4
 
 class Model(ABC):
     '''abstract model for all the different ML models i decide to make or use'''
-    def __init__(self, participants_df: pd.DataFrame):
+    def __init__(self, participants_df: pd.DataFrame, n_workers: int = MIN_PROCESSOR_CORES):
         self._particpants_df = participants_df
         self._dataset: ModelDataset = None
+        # processes used to load the dataset
+        self._n_workers = n_workers
 
     @property
     def dataset(self) -> ModelDataset:
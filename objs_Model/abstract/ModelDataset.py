@@ -1,49 +1,79 @@
+import os
+import uuid
 import logging
+import tempfile
+import threading
+import weakref
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, NamedTuple
 import pandas as pd
 import numpy as np
-import nibabel as nib
-
-from Types import ROI, Dimension
-from objs_MRI import MRIFunc
-from helper_funcs import nifti_to_MRIFunc
-
-########### Create and configure logger ##############
-logging.basicConfig(filename="newfile.log",
-                    format='%(asctime)s %(message)s',
-                    filemode='w')
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-logger.info("Just an information")
-
-######### split idx helper ###########
-__split_idx: int = None
-
-def calculate_split_idx(df: pd.DataFrame) -> None:
-    '''calculates the split index of a df'''
-    __split_idx = len(df) * 2 // 3
-
-@lambda _: _()
-def split_idx():
-    '''get the stored split idx'''
-    if __split_idx is None:
-        raise ValueError('Calculate split idx first!')
-    return __split_idx
+from nibabel.filebasedimages import ImageFileError
+
+from Types import ROI, Dimension, Feature
+from objs_MRI import Atlas, MRIFunc, VoxelMask
+from helper_funcs import nifti_to_MRIFunc, chunked_path
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy
+from objs_Model.FeatureCache import FeatureCache, FEATURE_CACHE_PATH
+from objs_Model.CrossValidator import Fold, make_folds, N_SPLITS
+from objs_Profiler import StageRecord, profiler, stage
+
+# handlers / levels are up to the application (e.g. logging.basicConfig in a script)
+logger = logging.getLogger(__name__)
+
+# where the fMRI nifti files of each participant live
+FUNC_DATA_PATH: str = os.path.join('..', '..', 'Data', 'func')
+# dtype of the on disk feature matrix
+FEATURE_DTYPE: np.dtype = np.float32
+# fraction of the (loaded) participants used for training
+TRAINING_FRACTION: tuple[int, int] = (2, 3)
 
 ####### Helper functions #########
 def shuffle(df: pd.DataFrame) -> pd.DataFrame:
     '''shuffle the given df with a set seed'''
     return df.sample(frac=1, random_state=42)
 
-load_roi_expected_errors = (FileNotFoundError, FileExistsError, ValueError, TypeError, KeyError)
-def load_roi_fdata(path: str, roi: ROI) -> tuple[np.ndarray | None, Exception | None]:
-    '''try to load fMRI as MRIFunc from given path'''
+def _remove_store(path: str) -> None:
+    '''delete a tmp feature store'''
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def roi_regions(roi: ROI | VoxelMask | str) -> tuple[int, ...]:
+    '''atlas regions an roi is made of, part of its feature cache key (a VoxelMask's name already hashes its voxels)'''
+    return () if isinstance(roi, VoxelMask) else Atlas.instance().get_roi_regions(roi)
+
+# OSError / EOFError / ImageFileError: a corrupt or truncated file, only that participant fails
+load_roi_expected_errors = (OSError, EOFError, ImageFileError, ValueError, TypeError, KeyError)
+def _load_cached_fdata(
+        path: str,
+        cache_name: ROI | VoxelMask | str,
+        extract: Callable[[MRIFunc], np.ndarray],
+        feature_cache: FeatureCache | None,
+        roi: ROI | VoxelMask | None = None
+    ) -> tuple[np.ndarray | None, Exception | None]:
+    '''features of the fMRI at path from the cache, or extracted (and cached). features of an roi are keyed by its regions too'''
     fMRI: MRIFunc = None
     error: Exception = None
     fdata: np.ndarray = None
 
+    key: str = None
+    if feature_cache is not None:
+        try:
+            regions = () if roi is None else roi_regions(roi)
+            key = feature_cache.key(path, cache_name, FEATURE_DTYPE, regions)
+        except load_roi_expected_errors as e:
+            return fdata, e
+
+        fdata = feature_cache.get(key)
+        if fdata is not None:
+            return fdata, error
+
     try:
-        fMRI = nifti_to_MRIFunc(nib.load(path))
+        # chunked stores are opened lazily, niftis are decompressed
+        fMRI = nifti_to_MRIFunc(path)
     except load_roi_expected_errors as e:
         error = e
 
@@ -51,20 +81,215 @@ def load_roi_fdata(path: str, roi: ROI) -> tuple[np.ndarray | None, Exception |
         return fdata, error
 
     try:
-        fdata = fMRI.get_roi_fdata(roi)
+        fdata = extract(fMRI)
     except load_roi_expected_errors as e:
         error = e
 
+    if fdata is not None and key is not None:
+        feature_cache.put(key, fdata)
+
     return fdata, error
 
+def extract_fdata(fMRI: MRIFunc, roi: ROI | VoxelMask, feature: Feature, n_regions: int | None = None) -> np.ndarray:
+    '''features of an opened fMRI, before they are flattened into a row (n_regions: see MRI.get_parcel_fdata)'''
+    match feature:
+        case Feature.VOXELS:
+            # only the roi voxels x time, not the full (mostly zero) volume
+            roi_matrix, _ = fMRI.get_roi_matrix(roi, dtype=FEATURE_DTYPE)
+            return roi_matrix
+        case Feature.PARCELS | Feature.CONNECTIVITY:
+            # (n_regions, nt) mean time series of every atlas region
+            return fMRI.get_parcel_fdata(dtype=FEATURE_DTYPE, n_regions=n_regions).mean
+        case _:
+            raise ValueError(f'Unrecognized feature: {feature}')
+
+def load_roi_fdata(
+        path: str,
+        roi: ROI | VoxelMask,
+        feature_cache: FeatureCache | None = None
+    ) -> tuple[np.ndarray | None, Exception | None]:
+    '''try to load fMRI as MRIFunc from given path (or its features from the cache)'''
+    def extract(fMRI: MRIFunc) -> np.ndarray:
+        return extract_fdata(fMRI, roi, Feature.VOXELS)
+
+    return _load_cached_fdata(path, roi, extract, feature_cache, roi)
+
+def load_parcel_fdata(
+        path: str,
+        feature_cache: FeatureCache | None = None
+    ) -> tuple[np.ndarray | None, Exception | None]:
+    '''try to load the (n_regions, nt) mean time series of every atlas region (or them from the cache)'''
+    def extract(fMRI: MRIFunc) -> np.ndarray:
+        return extract_fdata(fMRI, ROI.NONE, Feature.PARCELS)
+
+    return _load_cached_fdata(path, Feature.PARCELS.name, extract, feature_cache)
+
+def load_multi_roi_fdata(
+        path: str,
+        rois: tuple[ROI | VoxelMask, ...],
+        feature_cache: FeatureCache | None = None
+    ) -> tuple[dict[ROI | VoxelMask, np.ndarray] | None, Exception | None]:
+    '''voxels of several rois of the fMRI at path, decoded at most once for all of them (cached rois are skipped)'''
+    fdata: dict[ROI | VoxelMask, np.ndarray] = {}
+    keys: dict[ROI | VoxelMask, str] = {}
+    if feature_cache is not None:
+        try:
+            keys = {roi: feature_cache.key(path, roi, FEATURE_DTYPE, roi_regions(roi)) for roi in rois}
+        except load_roi_expected_errors as e:
+            return None, e
+
+        for roi, key in keys.items():
+            cached = feature_cache.get(key)
+            if cached is not None:
+                fdata[roi] = cached
+
+    missing = tuple(roi for roi in rois if roi not in fdata)
+    if not missing:
+        return fdata, None
+
+    try:
+        fMRI = nifti_to_MRIFunc(path)
+        # one read of the box holding every missing roi
+        matrices = fMRI.get_roi_matrices(missing, dtype=FEATURE_DTYPE)
+    except load_roi_expected_errors as e:
+        return None, e
+
+    for roi, (roi_matrix, _) in matrices.items():
+        fdata[roi] = roi_matrix
+        if roi in keys:
+            feature_cache.put(keys[roi], roi_matrix)
+
+    return fdata, None
+
+def load_fdata(
+        path: str,
+        roi: ROI | VoxelMask,
+        feature: Feature,
+        feature_cache: FeatureCache | None = None
+    ) -> tuple[np.ndarray | None, Exception | None]:
+    '''load the kind of features the dataset is built from'''
+    match feature:
+        case Feature.VOXELS:
+            return load_roi_fdata(path, roi, feature_cache)
+        case Feature.PARCELS | Feature.CONNECTIVITY:
+            # connectivity is computed from the parcel time series of the whole cohort at once
+            return load_parcel_fdata(path, feature_cache)
+        case _:
+            return None, ValueError(f'Unrecognized feature: {feature}')
+
+class LoadCancelled(Exception):
+    '''get_data was cancelled through the dataset's cancel event'''
+
+class LoadFailure(NamedTuple):
+    '''a participant that could not be loaded into the dataset'''
+    participant_id: str
+    path: str
+    error: str
+
+class _RowResult(NamedTuple):
+    '''what a worker sends back after writing (or failing to write) a row of the store'''
+    row: int
+    error: str | None
+    # np.packbits(features != 0), 32x smaller than sending the row itself
+    packed_activity: np.ndarray | None
+    # profiled stages of a worker process, merged into the main process' profiler
+    stages: list[StageRecord] | None = None
+
+def _load_row(
+        store_path: str,
+        shape: tuple[int, int],
+        row: int,
+        pid: str,
+        path: str,
+        roi: ROI | VoxelMask,
+        feature: Feature,
+        feature_cache: FeatureCache | None
+    ) -> _RowResult:
+    '''load a participant's features and write them to its row of the store (runs in a worker process)'''
+    with stage('participant', subject=pid):
+        fdata, error = load_fdata(path, roi, feature, feature_cache)
+        if fdata is None:
+            return _RowResult(row, repr(error), None)
+
+        with stage('flatten'):
+            features = fdata.reshape(-1)
+            if features.size != shape[1]:
+                return _RowResult(row, f'expected {shape[1]} features, got {features.size}', None)
+
+            store = np.memmap(store_path, dtype=FEATURE_DTYPE, mode='r+', shape=shape)
+            store[row] = features
+            store.flush()
+            packed_activity = np.packbits(features != 0)
+
+    return _RowResult(row, None, packed_activity)
+
+def _prefetch_row(
+        row: int,
+        pid: str,
+        path: str,
+        rois: tuple[ROI | VoxelMask, ...],
+        feature_cache: FeatureCache
+    ) -> _RowResult:
+    '''decode a participant once and put the voxels of every roi in the feature cache (runs in a worker process)'''
+    with stage('participant', subject=pid, n_rois=len(rois)):
+        fdata, error = load_multi_roi_fdata(path, rois, feature_cache)
+
+    return _RowResult(row, None if fdata is not None else repr(error), None)
+
+def _load_row_in_worker(profile: bool, load: Callable[..., _RowResult], *task) -> _RowResult:
+    '''a row task (_load_row, _prefetch_row) in a pool process, sends its stages back when the main process is profiling'''
+    if not profile:
+        return load(*task)
+
+    # forked workers start with a copy of the main process' records
+    profiler.enable()
+    profiler.clear()
+    result = load(*task)
+    stages = profiler.records
+    profiler.clear()
+
+    return result._replace(stages=stages)
+
 class ModelDataset(ABC):
     '''manages the model dataset'''
-    def __init__(self, participants_df: pd.DataFrame, roi: ROI = ROI.PFC):
+    def __init__(
+            self,
+            participants_df: pd.DataFrame,
+            roi: ROI | VoxelMask = ROI.PFC,
+            feature: Feature = Feature.VOXELS,
+            memmap_dir: str | None = None,
+            n_workers: int = 1,
+            func_data_path: str = FUNC_DATA_PATH,
+            feature_cache_path: str | None = FEATURE_CACHE_PATH,
+            progress: Callable[[int, int], None] | None = None,
+            cancel_event: threading.Event | None = None
+        ):
         self._participants_df = shuffle(participants_df)
-        calculate_split_idx(participants_df)
+        # an atlas roi, or any VoxelMask on the participants' grid (e.g. a union of rois)
         self._roi = roi
+        # voxels of the roi, or every atlas region's mean time series (roi is ignored)
+        self._feature = feature
         self._X: np.ndarray = None
         self._y: np.ndarray = None
+        # rows of the (shuffled) participants df that made it into X
+        self._loaded_rows: np.ndarray = None
+        # shape of one participant's features before they are flattened into a row
+        self._feature_shape: tuple[int, ...] = None
+        # flat features of a participant that survived as columns of X
+        self._active_features: np.ndarray = None
+        # feature matrix lives in a memmap so it never has to fit in RAM
+        self._memmap_dir = memmap_dir
+        self._store_path: str = None
+        # participants are loaded by a pool of n_workers processes
+        self._n_workers = max(1, int(n_workers))
+        self._func_data_path = func_data_path
+        self._failures: list[LoadFailure] = []
+        # preprocessed features survive between runs, None turns the cache off
+        self._feature_cache = None if feature_cache_path is None else FeatureCache(feature_cache_path)
+        # called with (participants done, participants total) while loading, e.g. to drive a progress bar
+        self._progress = progress
+        # set from another thread to stop get_data between participants (raises LoadCancelled)
+        self._cancel_event = cancel_event
 
     ### lazy loading ###
     @property
@@ -73,22 +298,68 @@ class ModelDataset(ABC):
         if self._X is None:
             self._X = self.get_data()
 
-        return self.X
+        return self._X
 
-    def get_data(self) -> np.ndarray:
-        data = []
-        for pid in self._participants_df.participant_id:
-            fdata, error = load_roi_fdata(rf'..\..\Data\func\{pid}.nii.gz', self.roi)
+    def get_participant_path(self, pid: str) -> str:
+        '''path to a participant's fMRI, its chunked store if it was transcoded'''
+        path = os.path.join(self._func_data_path, f'{pid}.nii.gz')
+        store_path = chunked_path(path)
+        return store_path if ChunkedArrayProxy.is_store(store_path) else path
 
+    def get_data(self) -> np.ndarray:
+        '''
+        Builds the dataset directly into an on disk memmap, one participant (row) per task, using n_workers processes.
+        Returns a view of the memmap with only the loaded rows (in shuffled participant order)
+        and the features with brain activity
+        '''
+        pids = list(self._participants_df.participant_id)
+        paths = [self.get_participant_path(pid) for pid in pids]
+        self._failures = []
+
+        # load participants in the main process until one works, it decides the number of features
+        store: np.memmap = None
+        first_row = 0
+        while store is None and first_row < len(pids):
+            self.__check_cancelled()
+            with stage('participant', subject=pids[first_row]):
+                fdata, error = load_fdata(paths[first_row], self.roi, self._feature, self._feature_cache)
+            self.__report_progress(first_row + 1, len(pids))
             if fdata is None:
-                logger.info(f'Could not load pid {pid} roi fdata: {error}')
+                self.__add_failure(pids[first_row], paths[first_row], repr(error))
+                first_row += 1
+                continue
+
+            store = self._create_store(len(pids), fdata.size)
+
+        if store is None:
+            raise ValueError(f'Could not load {self._feature.name.lower()} fdata for any participant ({self.roi})')
+
+        self._feature_shape = tuple(fdata.shape)
+        features = fdata.reshape(-1)
+        store[first_row] = features
+        store.flush()
+        # features that are non zero for at least one participant
+        has_activity = features != 0
+        loaded_rows = [first_row]
+
+        # every other participant writes its own row of the store, the order of X never depends on the workers
+        tasks = [
+            (self._store_path, store.shape, row, pids[row], paths[row], self.roi, self._feature, self._feature_cache)
+            for row in range(first_row + 1, len(pids))
+        ]
+        for n_done, result in enumerate(self.__run_tasks(tasks), start=first_row + 2):
+            profiler.extend(result.stages)
+            self.__report_progress(n_done, len(pids))
+            self.__check_cancelled()
+            if result.error is not None:
+                self.__add_failure(pids[result.row], paths[result.row], result.error)
                 continue
 
-            data.append(fdata.flatten())
+            has_activity |= np.unpackbits(result.packed_activity, count=store.shape[1]).view(np.bool_)
+            loaded_rows.append(result.row)
 
         # our data should be an array of flattened fMRI fdata
-        data = np.stack(data)
-        dimension_value = len(data.shape)
+        dimension_value = len(store.shape)
 
         try:
             dimension = Dimension(dimension_value)
@@ -98,15 +369,149 @@ class ModelDataset(ABC):
         if dimension is not Dimension.TWO_D:
             raise ValueError(f'Unexpected dataset dimensionality: {dimension.value}')
 
-        # drop features with no brain activity
-        data = data[:, np.any(data != 0, axis=0)]
-        return data
+        # pack the loaded rows at the top of the store and drop features with no brain activity
+        # done in place (row by row) so X stays a view of the store instead of another full copy.
+        # safe since a row is only ever moved up (loaded_rows[i] >= i)
+        loaded_rows.sort()
+        # only flattened voxels can lose columns, parcel rows have to keep their (n_regions, nt) shape
+        active_features = np.flatnonzero(has_activity) if self._feature is Feature.VOXELS else np.arange(store.shape[1])
+        n_features = active_features.size
+        n_rows = len(loaded_rows)
+        with stage('column filter', n_rows=n_rows, n_features=n_features):
+            if n_features < store.shape[1] or n_rows < store.shape[0]:
+                for i, row in enumerate(loaded_rows):
+                    store[i, :n_features] = store[row, active_features]
+
+            store.flush()
+        self._loaded_rows = np.asarray(loaded_rows, dtype=np.intp)
+        self._active_features = active_features
+
+        return store[:n_rows, :n_features]
+
+    @property
+    def failures(self) -> list[LoadFailure]:
+        '''participants that could not be loaded by the last get_data'''
+        return list(self._failures)
+
+    @property
+    def n_workers(self) -> int:
+        '''number of processes used to load participants'''
+        return self._n_workers
+
+    def __run_tasks(self, tasks: list[tuple], load: Callable[..., _RowResult] = _load_row):
+        '''yields the _RowResult of each task, in task order'''
+        if self._n_workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield load(*task)
+            return
+
+        profile = [profiler.enabled] * len(tasks)
+        executor = ProcessPoolExecutor(max_workers=min(self._n_workers, len(tasks)))
+        try:
+            yield from executor.map(_load_row_in_worker, profile, [load] * len(tasks), *zip(*tasks))
+        finally:
+            # when the caller stops early (cancelled) the queued participants are dropped, not loaded
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def prefetch_rois(self, rois: Iterable[ROI | VoxelMask]) -> list[LoadFailure]:
+        '''
+        Decode every participant's fMRI once and write the voxels of each roi to the feature cache (a block per roi).
+        Datasets of any of those rois sharing the cache then build X without decoding again.
+        Returns the participants that could not be loaded
+        '''
+        if self._feature is not Feature.VOXELS:
+            raise ValueError(f'Only voxel features are per roi, not {self._feature.name.lower()}')
+        if self._feature_cache is None:
+            raise ValueError('Prefetching rois needs a feature cache')
+
+        rois = tuple(dict.fromkeys(rois))
+        pids = list(self._participants_df.participant_id)
+        paths = [self.get_participant_path(pid) for pid in pids]
+        tasks = [(row, pids[row], paths[row], rois, self._feature_cache) for row in range(len(pids))]
+
+        failures = []
+        with stage('prefetch rois', n_rois=len(rois)):
+            for n_done, result in enumerate(self.__run_tasks(tasks, _prefetch_row), start=1):
+                profiler.extend(result.stages)
+                self.__report_progress(n_done, len(pids))
+                self.__check_cancelled()
+                if result.error is not None:
+                    failures.append(LoadFailure(pids[result.row], paths[result.row], result.error))
+
+        return failures
+
+    def __check_cancelled(self) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise LoadCancelled(f'Loading the {type(self).__name__} was cancelled')
+
+    def __report_progress(self, n_done: int, n_total: int) -> None:
+        if self._progress is not None:
+            self._progress(n_done, n_total)
+
+    def __add_failure(self, pid: str, path: str, error: str) -> None:
+        logger.info(f'Could not load pid {pid} roi fdata: {error}')
+        self._failures.append(LoadFailure(pid, path, error))
+
+    def _create_store(self, n_rows: int, n_features: int) -> np.memmap:
+        '''preallocate the on disk feature matrix'''
+        memmap_dir = tempfile.gettempdir() if self._memmap_dir is None else self._memmap_dir
+        os.makedirs(memmap_dir, exist_ok=True)
+
+        # a VoxelMask's str is its content hash
+        roi_name = self.roi.name if isinstance(self.roi, ROI) else str(self.roi)
+        self._store_path = os.path.join(
+            memmap_dir,
+            f'{type(self).__name__}_{roi_name}_{uuid.uuid4().hex}.dat'
+        )
+
+        store = np.memmap(self._store_path, dtype=FEATURE_DTYPE, mode='w+', shape=(n_rows, n_features))
+
+        if self._memmap_dir is None:
+            # tmp store, clean up once the dataset is gone (open views keep the mapping alive on posix)
+            weakref.finalize(self, _remove_store, self._store_path)
+
+        return store
+
+    @property
+    def feature_shape(self) -> tuple[int, ...]:
+        '''shape of one participant's features before flattening (before dropping inactive voxel columns)'''
+        if self._feature_shape is None:
+            _ = self.X
+
+        return self._feature_shape
+
+    @property
+    def active_features(self) -> np.ndarray:
+        '''indices of a participant's flattened features that are columns of X (new scans get the same columns)'''
+        if self._active_features is None:
+            _ = self.X
+
+        return self._active_features
+
+    @property
+    def participant_ids(self) -> list[str]:
+        '''ids of the participants loaded into X (same order as X)'''
+        return list(self._participants_df.participant_id.values[self.loaded_rows])
+
+    @property
+    def store_path(self) -> str | None:
+        '''path of the memmap backing X'''
+        return self._store_path
+
+    @property
+    def loaded_rows(self) -> np.ndarray:
+        '''rows of the participants df that were loaded into X (same order as X)'''
+        if self._loaded_rows is None:
+            _ = self.X
+
+        return self._loaded_rows
 
     @property
     def y(self) -> np.array:
         '''data predictions'''
         if self._y is None:
-            self._y = self.get_prediction()
+            # only the participants that made it into X
+            self._y = self.get_prediction()[self.loaded_rows]
 
         return self._y
 
@@ -116,10 +521,29 @@ class ModelDataset(ABC):
 
     #### non-lazy loading ###
     @property
-    def roi(self) -> ROI:
+    def roi(self) -> ROI | VoxelMask:
         '''read only'''
         return self._roi
 
+    @property
+    def feature(self) -> Feature:
+        '''read only'''
+        return self._feature
+
+    @property
+    def split_idx(self) -> int:
+        '''index of the first validating row'''
+        numerator, denominator = TRAINING_FRACTION
+        return len(self.loaded_rows) * numerator // denominator
+
+    def get_folds(self, n_splits: int = N_SPLITS, n_repeats: int = 1, groups_column: str | None = None) -> list[Fold]:
+        '''cross validation folds of the loaded rows (indices into X and y), optionally keeping groups together'''
+        groups = None
+        if groups_column is not None:
+            groups = self._participants_df[groups_column].values[self.loaded_rows]
+
+        return make_folds(len(self.loaded_rows), n_splits, n_repeats, groups)
+
     @property
     def Xtr(self) -> np.ndarray:
         '''Training data of model dataset'''
@@ -127,7 +551,7 @@ class ModelDataset(ABC):
 
     def get_data_training(self) -> np.ndarray:
         '''Get training data of model dataset'''
-        return self.X[:split_idx, :]
+        return self.X[:self.split_idx, :]
 
     @property
     def Xv(self) -> np.ndarray:
@@ -136,7 +560,7 @@ class ModelDataset(ABC):
 
     def get_data_validating(self) -> np.ndarray:
         '''get the validating data of model dataset'''
-        return self.X[split_idx:, :]
+        return self.X[self.split_idx:, :]
 
     @property
     def ytr(self) -> np.ndarray:
@@ -144,13 +568,11 @@ class ModelDataset(ABC):
 
     def get_prediction_training(self) -> np.ndarray:
         '''Get the prediction of model training data'''
-        return self.y[:split_idx, :]
+        return self.y[:self.split_idx]
 
     @property
     def yv(self) -> np.ndarray:
         return self.get_prediction_validating()
 
     def get_prediction_validating(self) -> np.ndarray:
-        return self.y[split_idx:, :]
-
-
+        return self.y[self.split_idx:]
@@ -1,4 +1,4 @@
-from objs_Model.abstract.Model import Model
-from objs_Model.abstract.LinearRegressionModel import LinearRegressionModel
 from objs_Model.abstract.ModelDataset import ModelDataset
-from objs_Model.abstract.LinearRegressionModelDataset import LinearRegressionModelDataset
\ No newline at end of file
+from objs_Model.abstract.LinearRegressionModelDataset import LinearRegressionModelDataset
+from objs_Model.abstract.Model import Model
+from objs_Model.abstract.LinearRegressionModel import LinearRegressionModel
\ No newline at end of file
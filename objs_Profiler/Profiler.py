@@ -0,0 +1,219 @@
+'''
+Per stage wall / cpu time, memory and bytes read of the extraction and modeling pipeline.
+Off by default, a disabled stage is a shared no-op context manager
+'''
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# per process counters of the kernel, missing outside of linux
+PROC_IO_PATH: str = '/proc/self/io'
+PROC_STATUS_PATH: str = '/proc/self/status'
+# returned by every stage while profiling is off (nullcontext is reusable)
+_DISABLED_STAGE = nullcontext()
+
+class StageRecord(NamedTuple):
+    '''one timed stage'''
+    name: str
+    # participant the stage ran for (inherited from the enclosing stage)
+    subject: str | None
+    # enclosing stage, None at the top
+    parent: str | None
+    # time.time() at the start, so records of different processes line up
+    start: float
+    wall_s: float
+    cpu_s: float
+    # rss at the end and its growth over the stage
+    rss_mb: float | None
+    rss_delta_mb: float | None
+    # high water mark of the process (ru_maxrss) at the end of the stage, None where resource is missing (windows)
+    peak_rss_mb: float | None
+    # bytes the process read (rchar, includes the page cache) during the stage
+    bytes_read: int | None
+    pid: int
+    tid: int
+    attrs: dict
+
+def _read_bytes() -> int | None:
+    try:
+        with open(PROC_IO_PATH, mode='rb') as f:
+            for line in f:
+                if line.startswith(b'rchar:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def _rss_mb() -> float | None:
+    try:
+        with open(PROC_STATUS_PATH, mode='rb') as f:
+            for line in f:
+                if line.startswith(b'VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource # unix only
+    except ImportError:
+        return None
+
+    # kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Profiler:
+    '''
+    Collects StageRecords of nested stages:
+
+        with profiler.stage('load', subject=pid):
+            with profiler.stage('mask'):
+                ...
+
+    Thread safe, records of worker processes are merged back with extend
+    '''
+    def __init__(self, enabled: bool = False):
+        self._enabled = enabled
+        self._records: list[StageRecord] = []
+        self._lock = threading.Lock()
+        # (name, subject) of the open stages of each thread
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self) -> None:
+        self._enabled = True
+
+    def disable(self) -> None:
+        self._enabled = False
+
+    @property
+    def records(self) -> list[StageRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records = []
+
+    def extend(self, records: list[StageRecord] | None) -> None:
+        '''add records made elsewhere (e.g. by a worker process)'''
+        if records:
+            with self._lock:
+                self._records.extend(StageRecord(*record) for record in records)
+
+    def stage(self, name: str, subject: str | None = None, **attrs):
+        '''context manager timing the stage, does nothing while disabled'''
+        if not self._enabled:
+            return _DISABLED_STAGE
+
+        return self.__stage(name, subject, attrs)
+
+    @contextmanager
+    def __stage(self, name: str, subject: str | None, attrs: dict) -> Iterator[None]:
+        stack = self.__stack()
+        parent, parent_subject = stack[-1] if stack else (None, None)
+        subject = parent_subject if subject is None else subject
+        stack.append((name, subject))
+
+        start = time.time()
+        rss, read = _rss_mb(), _read_bytes()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            # io first so reading /proc/self/status isn't counted
+            end_read, end_rss = _read_bytes(), _rss_mb()
+            stack.pop()
+
+            record = StageRecord(
+                name=name,
+                subject=subject,
+                parent=parent,
+                start=start,
+                wall_s=wall,
+                cpu_s=cpu,
+                rss_mb=end_rss,
+                rss_delta_mb=None if rss is None or end_rss is None else end_rss - rss,
+                peak_rss_mb=_peak_rss_mb(),
+                bytes_read=None if read is None or end_read is None else end_read - read,
+                pid=os.getpid(),
+                tid=threading.get_ident(),
+                attrs=attrs
+            )
+            with self._lock:
+                self._records.append(record)
+
+            logger.debug(f'{name} ({subject}): {wall:.3f}s wall {cpu:.3f}s cpu')
+
+    def __stack(self) -> list[tuple[str, str | None]]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        return stack
+
+    ###### export
+    def summary(self) -> dict[str, dict[str, float]]:
+        '''totals of each stage name over every record'''
+        totals: dict[str, dict[str, float]] = {}
+        for record in self.records:
+            total = totals.setdefault(record.name, {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'bytes_read': 0})
+            total['count'] += 1
+            total['wall_s'] += record.wall_s
+            total['cpu_s'] += record.cpu_s
+            total['bytes_read'] += record.bytes_read or 0
+
+        return totals
+
+    def to_jsonl(self, path: str) -> None:
+        '''one json object per record'''
+        with open(path, mode='w', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record._asdict(), default=str) + '\n')
+
+    def to_chrome_trace(self, path: str) -> None:
+        '''chrome://tracing / perfetto trace, one complete event per record'''
+        events = []
+        for record in self.records:
+            events.append({
+                'name': record.name,
+                'cat': record.parent or 'pipeline',
+                'ph': 'X',
+                'ts': record.start * 1e6,
+                'dur': record.wall_s * 1e6,
+                'pid': record.pid,
+                'tid': record.tid,
+                'args': {
+                    'subject': record.subject,
+                    'cpu_s': record.cpu_s,
+                    'rss_mb': record.rss_mb,
+                    'rss_delta_mb': record.rss_delta_mb,
+                    'peak_rss_mb': record.peak_rss_mb,
+                    'bytes_read': record.bytes_read,
+                    **record.attrs
+                }
+            })
+
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str))
+
+# the process wide profiler everything records to
+profiler: Profiler = Profiler(enabled=os.environ.get('PROFILE_PIPELINE', '') not in ('', '0'))
+
+def stage(name: str, subject: str | None = None, **attrs):
+    '''profiler.stage of the process wide profiler'''
+    return profiler.stage(name, subject, **attrs)
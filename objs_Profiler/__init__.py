@@ -0,0 +1 @@
+from objs_Profiler.Profiler import Profiler, StageRecord, profiler, stage
@@ -0,0 +1,108 @@
+'''
+Runs Reports off the GUI thread: progress, cancellation and a cache of finished runs
+'''
+
+import queue
+import threading
+from typing import Callable, NamedTuple
+import pandas as pd
+
+from objs_Model import Model
+from objs_Model.abstract.ModelDataset import LoadCancelled
+from objs_Report.Report import Report
+from Types import Predictor, ROI
+
+class RunMessage(NamedTuple):
+    '''what the worker tells the GUI, kind is one of 'progress', 'done', 'error', 'cancelled' '''
+    kind: str
+    key: tuple[Predictor, ROI]
+    n_done: int = 0
+    n_total: int = 0
+    model: Model | None = None
+    error: str | None = None
+    # the model came from the cache, nothing was run
+    cached: bool = False
+
+class PredictionRunner:
+    '''
+    One Report at a time on a daemon thread, messages come back through a queue the GUI drains with poll()
+    (tkinter widgets must only be touched from the main thread).
+    A thread rather than a process: loading already fans out to worker processes and the numpy work releases
+    the GIL, while the fitted model stays usable here without pickling it back.
+    Finished models are cached per (predictor, roi) so asking again returns at once
+    '''
+    def __init__(
+            self,
+            participants_df: pd.DataFrame | None = None,
+            report_factory: Callable[[Predictor, ROI], Report] | None = None
+        ):
+        self._participants_df = participants_df
+        self._report_factory = self.__make_report if report_factory is None else report_factory
+        self._messages: queue.Queue[RunMessage] = queue.Queue()
+        self._results: dict[tuple[Predictor, ROI], Model] = {}
+        self._thread: threading.Thread = None
+        self._cancel_event: threading.Event = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_result(self, predictor: Predictor, roi: ROI) -> Model | None:
+        return self._results.get((predictor, roi))
+
+    def clear_results(self) -> None:
+        self._results.clear()
+
+    def submit(self, predictor: Predictor, roi: ROI) -> bool:
+        '''start a run (or answer from the cache), False if another run is still going'''
+        key = (predictor, roi)
+        model = self._results.get(key)
+        if model is not None:
+            self._messages.put(RunMessage('done', key, model=model, cached=True))
+            return True
+
+        if self.is_running:
+            return False
+
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self.__run, args=(key, self._cancel_event), daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self) -> None:
+        '''stop the current run after the participant being loaded'''
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+
+    def poll(self) -> list[RunMessage]:
+        '''every message since the last poll, never blocks'''
+        messages = []
+        while True:
+            try:
+                messages.append(self._messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    ###### helpers
+    def __make_report(self, predictor: Predictor, roi: ROI) -> Report:
+        return Report(predictor, self._participants_df, roi)
+
+    def __run(self, key: tuple[Predictor, ROI], cancel_event: threading.Event) -> None:
+        def progress(n_done: int, n_total: int) -> None:
+            self._messages.put(RunMessage('progress', key, n_done, n_total))
+
+        try:
+            model = self._report_factory(*key).run(progress, cancel_event)
+        except LoadCancelled:
+            self._messages.put(RunMessage('cancelled', key))
+            return
+        except Exception as e: # anything the run raises is shown, the thread must not die silently
+            self._messages.put(RunMessage('error', key, error=f'{type(e).__name__}: {e}'))
+            return
+
+        self._results[key] = model
+        self._messages.put(RunMessage('done', key, model=model))
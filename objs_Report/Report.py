@@ -1,33 +1,55 @@
 import os
+import threading
+from typing import Callable
 import pandas as pd
 from objs_Model import BrainAgePredictor, Model
-from Types import Predictor
+from Types import Predictor, ROI
 
-try:
-    cwd = os.getcwd()
-    participants_data_path = f'{cwd}../Data/participants.tsv'
+PARTICIPANTS_DATA_PATH: str = os.path.join('..', 'Data', 'participants.tsv')
 
-    df_participants = pd.read_csv(participants_data_path, sep='\t')
-except (OSError, FileNotFoundError, PermissionError, IOError) as e:
-    raise OSError('Error while retrieving participants df') from e
+def load_participants_df(path: str = PARTICIPANTS_DATA_PATH) -> pd.DataFrame:
+    '''read the participants table, only when a report needs it (not at import)'''
+    try:
+        return pd.read_csv(path, sep='\t')
+    except (OSError, FileNotFoundError, PermissionError, IOError) as e:
+        raise OSError('Error while retrieving participants df') from e
 
 class Report:
     """
     Run model and generate a report
     """
-    def __init__(self, predictor: Predictor):
+    def __init__(self, predictor: Predictor, participants_df: pd.DataFrame | None = None, roi: ROI = ROI.PFC):
         self._predictor = predictor
+        self._roi = roi
+        # read from PARTICIPANTS_DATA_PATH on first use if not given
+        self._participants_df = participants_df
 
-    def get_model(self) -> Model:
+    @property
+    def participants_df(self) -> pd.DataFrame:
+        if self._participants_df is None:
+            self._participants_df = load_participants_df()
+
+        return self._participants_df
+
+    @property
+    def roi(self) -> ROI:
+        return self._roi
+
+    def get_model(self, dataset_kwargs: dict | None = None) -> Model:
         """Based on the prediction type, return the corresponding model"""
         match self._predictor:
             case Predictor.BRAIN_AGE:
-                return BrainAgePredictor(df_participants)
+                return BrainAgePredictor(self.participants_df, roi=self._roi, dataset_kwargs=dataset_kwargs)
             case _:
                 raise ValueError(f'Unrecognized predictor: {self._predictor.name}')
 
-    def run(self):
-        """run report"""
-        model = self.get_model()
+    def run(
+            self,
+            progress: Callable[[int, int], None] | None = None,
+            cancel_event: threading.Event | None = None
+        ) -> Model:
+        """run report, progress gets (participants loaded, total) and setting cancel_event stops the load"""
+        model = self.get_model({'progress': progress, 'cancel_event': cancel_event})
         model.run()
-        return model
\ No newline at end of file
+        return model
+
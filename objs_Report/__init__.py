@@ -1 +1,2 @@
-from objs_Report.Report import Report
\ No newline at end of file
+from objs_Report.Report import Report
+from objs_Report.PredictionRunner import PredictionRunner, RunMessage
\ No newline at end of file
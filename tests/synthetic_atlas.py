@@ -0,0 +1,45 @@
+'''
+Coarse (6mm) synthetic atlas shared by the tests, so nothing is downloaded
+'''
+
+import unittest
+import numpy as np
+from benchmarks.synthetic_cohort import make_atlas_data
+from objs_MRI import Atlas, MaskCache
+
+ATLAS_SHAPE: tuple[int, int, int] = (31, 37, 31)
+ATLAS_AFFINE: np.ndarray = np.array([
+    [-6., 0., 0., 90.],
+    [0., 6., 0., -126.],
+    [0., 0., 6., -72.],
+    [0., 0., 0., 1.],
+])
+
+def make_synthetic_atlas(atlas_data=None) -> Atlas:
+    '''memory only atlas of atlas_data (defaults to make_atlas_data on ATLAS_SHAPE / ATLAS_AFFINE)'''
+    if atlas_data is None:
+        atlas_data = make_atlas_data(ATLAS_SHAPE, ATLAS_AFFINE)
+
+    return Atlas(MaskCache(path=None), atlas_data)
+
+class SyntheticAtlasTestCase(unittest.TestCase):
+    '''
+    The synthetic atlas is the process wide atlas while the class's tests run (cls.atlas, on the grid cls.affine).
+    Override make_atlas_data to change it
+    '''
+
+    @classmethod
+    def make_atlas_data(cls):
+        return make_atlas_data(ATLAS_SHAPE, ATLAS_AFFINE)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.affine = ATLAS_AFFINE.copy()
+        cls.atlas = make_synthetic_atlas(cls.make_atlas_data())
+        Atlas.set_instance(cls.atlas)
+
+    @classmethod
+    def tearDownClass(cls):
+        Atlas.set_instance(None)
+        super().tearDownClass()
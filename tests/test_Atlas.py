@@ -0,0 +1,102 @@
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic_cohort import make_atlas_data
+from objs_MRI import Atlas, MaskCache
+from synthetic_atlas import SyntheticAtlasTestCase
+from Types import ROI
+
+class TestAtlas(SyntheticAtlasTestCase):
+
+    def test_roi_mask_is_union_of_regions(self):
+        prob = np.asanyarray(self.atlas.img.dataobj)
+        idxs = self.atlas.roi_to_idxs_dict[ROI.PFC.value]
+
+        expected = np.any(prob[..., idxs] >= 50, axis=-1)
+        mask = self.atlas.get_roi_mask_fdata(ROI.PFC, threshold=50)
+        self.assertTrue(expected.any())
+        np.testing.assert_array_equal(mask.astype(bool), expected)
+
+    def test_labels_are_max_probability(self):
+        prob = np.asanyarray(self.atlas.img.dataobj)
+        labels = self.atlas.get_label_fdata(threshold=25)
+
+        brain = prob.max(axis=-1) >= 25
+        np.testing.assert_array_equal(labels[~brain], 0)
+        np.testing.assert_array_equal(labels[brain], prob.argmax(axis=-1)[brain] + 1)
+        self.assertEqual(self.atlas.n_regions, len(self.atlas.region_names))
+
+    def test_membership_bits(self):
+        prob = np.asanyarray(self.atlas.img.dataobj)
+        membership = self.atlas.get_membership(threshold=50)
+        self.assertEqual(membership.dtype, np.uint64)
+
+        region_bits = (membership[..., np.newaxis] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+        np.testing.assert_array_equal(region_bits[..., 0, :self.atlas.n_regions].astype(bool), prob >= 50)
+
+    def test_custom_roi(self):
+        regions = ['Frontal Pole', 'Temporal Pole', 'Precentral Gyrus']
+        self.atlas.define_roi('custom', regions)
+        idxs = [self.atlas.region_names.index(region) for region in regions]
+
+        mask = self.atlas.get_roi_voxel_mask('custom', threshold=50)
+        prob = np.asanyarray(self.atlas.img.dataobj)
+        np.testing.assert_array_equal(mask.to_dense(), np.any(prob[..., idxs] >= 50, axis=-1))
+
+        with self.assertRaises(ValueError):
+            self.atlas.define_roi('custom', regions[:1])
+
+    def test_unknown_region(self):
+        for region in ('Not A Gyrus', self.atlas.n_regions, -1):
+            with self.assertRaisesRegex(KeyError, 'Unrecognized region'):
+                self.atlas.get_region_bits([region])
+            with self.assertRaisesRegex(KeyError, 'Unrecognized region'):
+                self.atlas.define_roi('unknown', ['Frontal Pole', region])
+
+        self.assertNotIn('unknown', self.atlas.roi_to_idxs_dict)
+
+    def test_membership_and_labels_cached_on_disk(self):
+        data = make_atlas_data(self.atlas.img.shape[:3], self.atlas.img.affine)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            atlas = Atlas(MaskCache(tmp_dir), data)
+            membership = atlas.get_membership()
+            labels = atlas.get_label_fdata()
+
+            # a new process only reads the cache, never the probabilities
+            cached = Atlas(MaskCache(tmp_dir), data)
+            np.testing.assert_array_equal(cached.get_membership(), membership)
+            np.testing.assert_array_equal(cached.get_label_fdata(), labels)
+            np.testing.assert_array_equal(cached.get_roi_mask_fdata(ROI.PFC), atlas.get_roi_mask_fdata(ROI.PFC))
+            self.assertIsNone(cached._Atlas__prob_data)
+
+    def test_redefined_roi_misses_disk_cache(self):
+        data = make_atlas_data(self.atlas.img.shape[:3], self.atlas.img.affine)
+        shape, affine = self.atlas.img.shape[:3], self.atlas.img.affine
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first_run = Atlas(MaskCache(tmp_dir), data)
+            first_run.define_roi('my roi', ['Frontal Pole'])
+            first_mask = first_run.get_resampled_roi_voxel_mask('my roi', shape, affine)
+
+            # a later run with the same name but other regions
+            second_run = Atlas(MaskCache(tmp_dir), data)
+            second_run.define_roi('my roi', ['Temporal Pole'])
+            second_mask = second_run.get_resampled_roi_voxel_mask('my roi', shape, affine)
+
+            self.assertNotEqual(first_mask, second_mask)
+            self.assertEqual(second_mask, second_run.get_regions_voxel_mask(['Temporal Pole']))
+
+    def test_set_instance(self):
+        self.assertIs(Atlas.instance(), self.atlas)
+        Atlas.set_instance(None)
+        try:
+            # back to the real atlas (only fetched on first use)
+            self.assertIsNot(Atlas.instance(), self.atlas)
+        finally:
+            Atlas.set_instance(self.atlas)
+
+    def test_unknown_roi(self):
+        with self.assertRaises(KeyError):
+            self.atlas.get_roi_mask_fdata('not a region')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from benchmarks.synthetic_cohort import make_cohort
+from objs_MRI import Atlas, MaskCache
+from synthetic_atlas import SyntheticAtlasTestCase
+from objs_Model import BrainAgePredictor, BrainAgeScorer, InferenceServer
+from Types import Feature
+
+class TestBrainAgeScorer(SyntheticAtlasTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.func_path = os.path.join(cls.tmp_dir.name, 'func')
+        cls.participants_df = make_cohort(cls.func_path, 'small')
+        cls.paths = [os.path.join(cls.func_path, f'{pid}.nii.gz') for pid in cls.participants_df.participant_id]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+        super().tearDownClass()
+
+    def fit(self, **dataset_kwargs) -> BrainAgePredictor:
+        predictor = BrainAgePredictor(
+            self.participants_df,
+            n_workers=1,
+            dataset_kwargs={'func_data_path': self.func_path, 'feature_cache_path': None, **dataset_kwargs}
+        )
+        predictor.run()
+        return predictor
+
+    def assert_same_as_predictor(self, predictor: BrainAgePredictor, scorer: BrainAgeScorer):
+        dataset = predictor.dataset
+        expected = dict(zip(dataset.participant_ids, predictor.solver.predict(dataset.X)))
+
+        results = scorer.score(self.paths)
+        for pid, result in zip(self.participants_df.participant_id, results):
+            self.assertIsNone(result.error)
+            self.assertAlmostEqual(result.age, expected[pid], delta=1e-3 * max(1, abs(expected[pid])))
+
+    def test_voxels(self):
+        predictor = self.fit(n_components=None)
+        self.assert_same_as_predictor(predictor, BrainAgeScorer.from_predictor(predictor).warm_up())
+
+    def test_pca_folded_into_weights_and_saved(self):
+        predictor = self.fit(n_components=2)
+        scorer = BrainAgeScorer.from_predictor(predictor)
+
+        model_path = os.path.join(self.tmp_dir.name, 'model')
+        scorer.save(model_path)
+        loaded = BrainAgeScorer.load(model_path)
+        # memory mapped (read only), not copied into the process
+        self.assertFalse(loaded.weights.flags.writeable)
+        self.assertEqual(set(loaded.reduction), {'pca_mean', 'pca_components', 'ridge_coef'})
+        self.assert_same_as_predictor(predictor, loaded)
+
+    def test_artifact_masks_replace_the_atlas(self):
+        predictor = self.fit(n_components=None)
+        model_path = os.path.join(self.tmp_dir.name, 'voxel_model')
+        BrainAgeScorer.from_predictor(predictor).save(model_path)
+
+        atlas = Atlas.instance()
+        # an atlas without any data, scoring has to get by with the artifact's roi mask
+        Atlas.set_instance(Atlas(MaskCache(path=None), SimpleNamespace()))
+        try:
+            self.assert_same_as_predictor(predictor, BrainAgeScorer.load(model_path).warm_up())
+        finally:
+            Atlas.set_instance(atlas)
+
+    def test_parcels_never_fetch_the_atlas(self):
+        predictor = self.fit(feature=Feature.PARCELS, n_components=None)
+        model_path = os.path.join(self.tmp_dir.name, 'parcel_model')
+        BrainAgeScorer.from_predictor(predictor).save(model_path)
+
+        atlas = Atlas.instance()
+        # the real (not yet fetched) atlas, any access to its img would fetch it
+        Atlas.set_instance(Atlas(MaskCache(path=None)))
+        try:
+            with mock.patch('nilearn.datasets.fetch_atlas_harvard_oxford', side_effect=AssertionError('fetched')):
+                self.assert_same_as_predictor(predictor, BrainAgeScorer.load(model_path).warm_up())
+        finally:
+            Atlas.set_instance(atlas)
+
+    def test_connectivity(self):
+        predictor = self.fit(feature=Feature.CONNECTIVITY, n_components=None)
+        self.assert_same_as_predictor(predictor, BrainAgeScorer.from_predictor(predictor))
+
+    def test_bad_scan(self):
+        predictor = self.fit(n_components=None)
+        scorer = BrainAgeScorer.from_predictor(predictor)
+        results = scorer.score([self.paths[0], os.path.join(self.tmp_dir.name, 'missing.nii.gz')])
+        self.assertIsNotNone(results[0].age)
+        self.assertIsNone(results[1].age)
+        self.assertIn('FileNotFoundError', results[1].error)
+
+    def test_server_batches_requests(self):
+        predictor = self.fit(n_components=None)
+        scorer = BrainAgeScorer.from_predictor(predictor)
+        batch_sizes = []
+        score = scorer.score
+        scorer.score = lambda paths: batch_sizes.append(len(paths)) or score(paths)
+
+        async def run():
+            async with InferenceServer(scorer, max_batch_size=8, max_wait_ms=50) as server:
+                return await server.score_many(self.paths)
+
+        results = asyncio.run(run())
+        self.assertEqual([result.path for result in results], self.paths)
+        self.assertEqual(batch_sizes, [len(self.paths)])
+        self.assertEqual([result.age for result in results], [result.age for result in score(self.paths)])
+
+    def test_server_not_started(self):
+        server = InferenceServer(BrainAgeScorer.from_predictor(self.fit(n_components=None)))
+        with self.assertRaisesRegex(RuntimeError, 'not started'):
+            asyncio.run(server.score(self.paths[0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import nibabel as nib
+from objs_MRI.ChunkedArrayProxy import ChunkedArrayProxy
+from helper_funcs import transcode_nifti
+
+class TestChunkedArrayProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(0, 1000, size=(9, 8, 7, 11)).astype(np.int16)
+        self.affine = np.diag([3., 3., 3.5, 1.])
+        self.proxy = ChunkedArrayProxy.write(
+            self.data,
+            os.path.join(self.tmp_dir.name, 'run.chunks'),
+            self.affine,
+            chunks=(4, 3, 5, 4)
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_slicing(self):
+        slicers = [
+            (...,),
+            (slice(1, 6), slice(2, 8), 3),
+            (2, ..., slice(None, None, 3)),
+            (slice(None, None, -2), -1, slice(1, 6, 2), 0),
+            (slice(5, 5),),
+        ]
+        for slicer in slicers:
+            expected = self.data[slicer]
+            sliced = self.proxy[slicer]
+            self.assertEqual(sliced.shape, expected.shape, slicer)
+            np.testing.assert_array_equal(sliced, expected)
+
+        np.testing.assert_array_equal(np.asarray(self.proxy), self.data)
+        self.assertEqual(self.proxy.dtype, np.int16)
+
+    def test_transcode_nifti(self):
+        path = os.path.join(self.tmp_dir.name, 'sub-01.nii.gz')
+        img = nib.Nifti1Image(self.data, self.affine)
+        img.header.set_slope_inter(2.0, 1.0)
+        nib.save(img, path)
+
+        store_path = transcode_nifti(path)
+        self.assertEqual(store_path, os.path.join(self.tmp_dir.name, 'sub-01.chunks'))
+
+        expected = nib.load(path)
+        chunked = ChunkedArrayProxy(store_path)
+        np.testing.assert_allclose(chunked.affine, expected.affine)
+        np.testing.assert_allclose(np.asarray(chunked), expected.get_fdata())
+        np.testing.assert_allclose(chunked[..., 3], expected.dataobj[..., 3])
+        self.assertEqual(chunked.header_bytes, expected.header.binaryblock)
@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from objs_Model.Connectivity import ConnectivityExtractor, upper_triangle
+
+class TestConnectivity(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.time_series = rng.normal(size=(7, 5, 120)).astype(np.float32)
+        self.time_series[:, 1] += self.time_series[:, 0] # some structure to find
+        self.time_series[3, 4] = 2.0 # flat region
+
+    def test_correlation(self):
+        extractor = ConnectivityExtractor('correlation', fisher_z=False, batch_size=3)
+        features = extractor.transform(self.time_series)
+
+        self.assertEqual(features.shape, (7, 10))
+        for subject in (0, 6):
+            expected = upper_triangle(np.corrcoef(self.time_series[subject].astype(np.float64)))
+            np.testing.assert_allclose(features[subject], expected, atol=1e-6)
+
+        # flat regions are uncorrelated with everything instead of nan
+        self.assertFalse(np.isnan(features).any())
+
+    def test_partial_correlation(self):
+        extractor = ConnectivityExtractor('partial correlation', fisher_z=False)
+        matrices = extractor.get_matrices(self.time_series[:2])
+
+        precision = np.linalg.inv(np.corrcoef(self.time_series[0].astype(np.float64)))
+        expected = -precision / np.sqrt(np.outer(np.diag(precision), np.diag(precision)))
+        np.fill_diagonal(expected, 1)
+        np.testing.assert_allclose(matrices[0], expected, atol=1e-2)
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from objs_Model.CrossValidator import CrossValidator, make_folds
+from objs_Model.RidgeSolver import RidgeSolver
+
+class TestCrossValidator(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(size=(60, 500)) + 5
+        self.y = self.X[:, :3] @ np.array([2., -1., 3.]) + rng.normal(size=60)
+
+    def test_folds(self):
+        folds = make_folds(23, n_splits=5, n_repeats=2)
+        self.assertEqual(len(folds), 10)
+        for repeat in (0, 1):
+            tested = np.concatenate([fold.test for fold in folds if fold.repeat == repeat])
+            np.testing.assert_array_equal(np.sort(tested), np.arange(23))
+
+        groups = np.repeat(np.arange(12), 3)
+        for fold in make_folds(36, n_splits=4, groups=groups):
+            self.assertFalse(set(groups[fold.train]) & set(groups[fold.test]))
+
+    def test_matches_refitting_each_fold(self):
+        alphas = (1., 100.)
+        validator = CrossValidator(n_splits=4, alphas=alphas, n_workers=2)
+        result = validator.run(self.X, self.y)
+
+        for i, fold in enumerate(result.folds):
+            solver = RidgeSolver(alphas).fit(self.X[fold.train], self.y[fold.train])
+            scores = solver.evaluate(self.X[fold.test], self.y[fold.test])
+            np.testing.assert_allclose(result.fold_mae[i], scores.mae, rtol=1e-6)
+            np.testing.assert_allclose(result.fold_r2[i], scores.r2, rtol=1e-6)
+
+        self.assertEqual(result.best_alpha, alphas[int(np.argmin(result.mae))])
+
+    def test_pca_fit_inside_each_fold(self):
+        alphas = (1., 100.)
+        result = CrossValidator(n_splits=4, alphas=alphas, n_components=5).run(self.X, self.y)
+
+        for i, fold in enumerate(result.folds):
+            train, test = self.X[fold.train], self.X[fold.test]
+            mean = train.mean(axis=0)
+            components = np.linalg.svd(train - mean, full_matrices=False)[2][:5]
+            solver = RidgeSolver(alphas).fit((train - mean) @ components.T, self.y[fold.train])
+            scores = solver.evaluate((test - mean) @ components.T, self.y[fold.test])
+            np.testing.assert_allclose(result.fold_mae[i], scores.mae, rtol=1e-6)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from objs_Model.FeatureCache import FeatureCache
+from Types import ROI
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_path = os.path.join(self.tmp_dir.name, 'cache')
+        self.file_path = os.path.join(self.tmp_dir.name, 'sub-01.nii.gz')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'participant one')
+
+    def test_hit_after_put(self):
+        cache = FeatureCache(self.cache_path)
+        key = cache.key(self.file_path, ROI.PFC, np.float32)
+        self.assertIsNone(cache.get(key))
+
+        features = np.arange(12, dtype=np.float32).reshape(3, 4)
+        cache.put(key, features)
+        # a fresh cache (another worker) finds it too
+        cached = FeatureCache(self.cache_path).get(key)
+        np.testing.assert_array_equal(cached, features)
+        self.assertFalse(cached.flags.writeable)
+
+        self.assertNotEqual(cache.key(self.file_path, ROI.TEMPORAL_LOBE, np.float32), key)
+        self.assertNotEqual(cache.key(self.file_path, ROI.PFC, np.float64), key)
+
+    def test_miss_after_source_changes(self):
+        cache = FeatureCache(self.cache_path)
+        key = cache.key(self.file_path, ROI.PFC, np.float32)
+        cache.put(key, np.zeros(3, dtype=np.float32))
+
+        # touched only: same content, same key
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(FeatureCache(self.cache_path).key(self.file_path, ROI.PFC, np.float32), key)
+
+        # rewritten: the stale hash in the index is not reused
+        with open(self.file_path, 'wb') as f:
+            f.write(b'participant two')
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        new_key = FeatureCache(self.cache_path).key(self.file_path, ROI.PFC, np.float32)
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(cache.get(new_key))
+
+    def test_evicts_oldest_first(self):
+        entry = np.zeros(100, dtype=np.float64)
+        probe = FeatureCache(os.path.join(self.tmp_dir.name, 'probe'))
+        probe.put('00', entry)
+        entry_bytes = os.path.getsize(os.path.join(probe.path, '00', '00.npy'))
+
+        cache = FeatureCache(self.cache_path, max_bytes=3 * entry_bytes)
+        keys = [f'{i:02d}' * 32 for i in range(5)]
+        for i, key in enumerate(keys[:3]):
+            cache.put(key, entry)
+            # distinct modification times, oldest first
+            os.utime(os.path.join(self.cache_path, key[:2], f'{key}.npy'), (i + 1, i + 1))
+
+        # using the first entry makes the second the oldest
+        self.assertIsNotNone(cache.get(keys[0]))
+        for key in keys[3:]:
+            cache.put(key, entry)
+
+        self.assertEqual([cache.get(key) is not None for key in keys], [True, False, False, True, True])
+        sizes = [
+            entry.stat().st_size for sub_dir in os.scandir(self.cache_path) if sub_dir.is_dir()
+            for entry in os.scandir(sub_dir.path) if entry.name.endswith('.npy')
+        ]
+        self.assertLessEqual(sum(sizes), 3 * entry_bytes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from objs_MRI import Atlas, MRIFunc, VoxelMask
+from synthetic_atlas import SyntheticAtlasTestCase, ATLAS_SHAPE as SHAPE
+from Types import ROI
+
+class TestMRI(SyntheticAtlasTestCase):
+
+    # a region with no voxels
+    empty_region = 3
+
+    @classmethod
+    def make_atlas_data(cls):
+        atlas_data = super().make_atlas_data()
+        prob = np.asanyarray(atlas_data.maps.dataobj).copy()
+        prob[..., cls.empty_region] = 0
+        atlas_data.maps = type(atlas_data.maps)(prob, atlas_data.maps.affine)
+        return atlas_data
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.data = np.random.default_rng(0).normal(100, 10, size=SHAPE + (6,)).astype(np.float32)
+
+    def test_parcel_fdata_matches_loop(self):
+        atlas = Atlas.instance()
+        threshold = 25
+        parcels = MRIFunc(self.data, self.affine).get_parcel_fdata(threshold, with_var=True)
+        labels = atlas.get_label_fdata(threshold)
+
+        self.assertFalse((labels == self.empty_region + 1).any())
+        for k in range(1, atlas.n_regions + 1):
+            voxels = self.data[labels == k].astype(np.float64)
+            self.assertEqual(parcels.n_voxels[k - 1], len(voxels))
+            if len(voxels) == 0:
+                np.testing.assert_array_equal(parcels.mean[k - 1], 0)
+                np.testing.assert_array_equal(parcels.var[k - 1], 0)
+                continue
+
+            np.testing.assert_allclose(parcels.mean[k - 1], voxels.mean(0), rtol=1e-5)
+            np.testing.assert_allclose(parcels.var[k - 1], voxels.var(0), rtol=1e-4)
+
+    def test_roi_matrix_matches_dense_mask(self):
+        # a mask touching every face of the volume, and an atlas roi
+        edge = np.zeros(SHAPE, dtype=bool)
+        edge[0, :3, 5] = edge[-1, -1, -1] = edge[4, 0, 0] = edge[10, 20, -1] = True
+        fMRI = MRIFunc(self.data, self.affine)
+
+        for roi in (VoxelMask.from_dense(edge, self.affine), ROI.PFC):
+            mask = fMRI.get_roi_voxel_mask(roi).to_dense()
+            roi_matrix, voxel_idx = fMRI.get_roi_matrix(roi)
+            np.testing.assert_array_equal(roi_matrix, fMRI.get_fdata()[mask])
+            np.testing.assert_array_equal(voxel_idx, np.flatnonzero(mask))
+
+if __name__ == '__main__':
+    unittest.main()
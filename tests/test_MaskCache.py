@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+import numpy as np
+from objs_MRI import MaskCache
+from Types import ROI
+
+SHAPE = (10, 12, 8)
+
+class TestMaskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.affine = np.diag([-2., 2., 2., 1.])
+        self.affine[:3, 3] = [90, -126, -72]
+        self.mask = np.random.default_rng(0).random(SHAPE) > 0.5
+
+    def test_put_get_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            key = MaskCache.key(ROI.PFC, SHAPE, self.affine, 25)
+            stored = MaskCache(tmp_dir).put(key, self.mask)
+            self.assertFalse(stored.flags.writeable)
+
+            # a new cache reads it back from disk
+            loaded = MaskCache(tmp_dir).get(key)
+            np.testing.assert_array_equal(loaded, self.mask)
+            self.assertEqual(loaded.dtype, np.bool_)
+            self.assertIsNone(MaskCache(tmp_dir).get(MaskCache.key(ROI.TEMPORAL_LOBE, SHAPE, self.affine, 25)))
+
+            calls = []
+            cache = MaskCache(tmp_dir)
+            created = cache.get_or_create(key, lambda: calls.append(1))
+            np.testing.assert_array_equal(created, self.mask)
+            self.assertEqual(calls, [])
+
+    def test_key_ignores_float_noise(self):
+        noisy = self.affine + np.random.default_rng(1).normal(scale=1e-10, size=(4, 4))
+        self.assertEqual(
+            MaskCache.key(ROI.PFC, SHAPE, self.affine, 25),
+            MaskCache.key(ROI.PFC, SHAPE + (200,), noisy.astype(np.float64), 25.0)
+        )
+
+    def test_key_changes_with_threshold_and_grid(self):
+        key = MaskCache.key(ROI.PFC, SHAPE, self.affine, 25)
+        shifted = self.affine.copy()
+        shifted[0, 3] += 2
+
+        self.assertNotEqual(MaskCache.key(ROI.PFC, SHAPE, self.affine, 50), key)
+        self.assertNotEqual(MaskCache.key(ROI.PFC, (10, 12, 9), self.affine, 25), key)
+        self.assertNotEqual(MaskCache.key(ROI.PFC, SHAPE, shifted, 25), key)
+        self.assertNotEqual(MaskCache.key(ROI.PFC, SHAPE, self.affine * [[1], [1], [1.5], [1]], 25), key)
+        self.assertNotEqual(MaskCache.key(ROI.PFC, SHAPE, self.affine, 25, regions=(1, 2)), key)
+
+if __name__ == '__main__':
+    unittest.main()
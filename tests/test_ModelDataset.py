@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.synthetic_cohort import make_cohort
+from synthetic_atlas import SyntheticAtlasTestCase
+from objs_Model import BrainAgePredictorDataset
+from objs_Model.abstract.ModelDataset import shuffle
+
+class TestModelDataset(SyntheticAtlasTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.func_path = os.path.join(self.tmp_dir.name, 'func')
+        self.participants_df = make_cohort(self.func_path, 'small')
+
+    def make_dataset(self, name: str, n_workers: int) -> BrainAgePredictorDataset:
+        return BrainAgePredictorDataset(
+            self.participants_df,
+            func_data_path=self.func_path,
+            feature_cache_path=None,
+            memmap_dir=os.path.join(self.tmp_dir.name, name),
+            n_components=None,
+            n_workers=n_workers
+        )
+
+    def test_same_rows_for_any_number_of_workers(self):
+        serial = self.make_dataset('serial', n_workers=1)
+        parallel = self.make_dataset('parallel', n_workers=2)
+
+        np.testing.assert_array_equal(serial.X, parallel.X)
+        np.testing.assert_array_equal(serial.y, parallel.y)
+        self.assertEqual(serial.participant_ids, parallel.participant_ids)
+        np.testing.assert_array_equal(serial.loaded_rows, np.arange(len(self.participants_df)))
+
+    def test_failed_participant_is_dropped(self):
+        clean = self.make_dataset('clean', n_workers=1)
+        X_clean = np.array(clean.X)
+
+        # a participant after the first, so it fails in a worker and the rows below it move up
+        bad_pid = shuffle(self.participants_df).participant_id.iloc[1]
+        with open(os.path.join(self.func_path, f'{bad_pid}.nii.gz'), 'wb') as f:
+            f.write(b'not a nifti')
+
+        for n_workers in (1, 2):
+            dataset = self.make_dataset(f'corrupt_{n_workers}', n_workers)
+            X = dataset.X
+
+            self.assertEqual([failure.participant_id for failure in dataset.failures], [bad_pid])
+            self.assertNotIn(bad_pid, dataset.participant_ids)
+            np.testing.assert_array_equal(dataset.loaded_rows, [0, 2, 3])
+
+            kept = [clean.participant_ids.index(pid) for pid in dataset.participant_ids]
+            # compare on the raw flattened features both datasets kept
+            columns = np.intersect1d(clean.active_features, dataset.active_features)
+            np.testing.assert_array_equal(
+                X[:, np.searchsorted(dataset.active_features, columns)],
+                X_clean[np.ix_(kept, np.searchsorted(clean.active_features, columns))]
+            )
+            np.testing.assert_array_equal(dataset.y, clean.y[kept])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from scipy.ndimage import affine_transform, gaussian_filter
+from objs_MRI.MotionCorrector import MotionCorrector, rigid_matrix, rigid_params
+
+class TestMotionCorrector(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.shape = (40, 40, 30)
+        self.affine = np.diag([3., 3., 3.5, 1.])
+        # textured ellipsoid 'head' on a dark background
+        grid = np.indices(self.shape, dtype=np.float64)
+        centre = (np.asarray(self.shape) - 1)[:, np.newaxis, np.newaxis, np.newaxis] / 2
+        radii = np.array([16, 17, 11])[:, np.newaxis, np.newaxis, np.newaxis]
+        head = np.sqrt((((grid - centre) / radii) ** 2).sum(axis=0)) < 1
+        reference = gaussian_filter(head * (1000 + gaussian_filter(rng.random(self.shape), 2) * 3000), 1)
+
+        # move the reference by known params, volume t sampled at R p + t gives the reference back
+        self.params = np.array([
+            [0, 0, 0, 0, 0, 0],
+            [0.5, 0, 0, 0, 0, 0],
+            [0.3, -0.8, 0.4, 0.01, 0, 0],
+            [-0.6, 0.2, 0.9, 0.005, -0.01, 0.015],
+        ])
+        centre = self.affine @ np.append((np.asarray(self.shape) - 1) / 2, 1)
+        centred_affine = self.affine.copy()
+        centred_affine[:3, 3] -= centre[:3]
+
+        self.data = np.zeros(self.shape + (len(self.params),), dtype=np.float32)
+        for t, params in enumerate(self.params):
+            voxel_map = np.linalg.inv(centred_affine) @ np.linalg.inv(rigid_matrix(params)) @ centred_affine
+            self.data[..., t] = affine_transform(reference, voxel_map[:3, :3], offset=voxel_map[:3, 3], order=3)
+
+    def test_rigid_params_round_trip(self):
+        for params in self.params:
+            np.testing.assert_allclose(rigid_params(rigid_matrix(params)), params, atol=1e-12)
+
+    def test_estimate(self):
+        estimate = MotionCorrector().estimate(self.data, self.affine)
+        np.testing.assert_allclose(estimate[:, :3], self.params[:, :3], atol=0.05)
+        np.testing.assert_allclose(estimate[:, 3:], self.params[:, 3:], atol=np.radians(0.1))
+
+    def test_realign(self):
+        result = MotionCorrector().realign(self.data, self.affine)
+        self.assertEqual(result.data.shape, self.data.shape)
+        self.assertEqual(result.params.shape, (self.data.shape[-1], 6))
+
+        # away from the edges every corrected volume should look like the reference
+        inner = (slice(6, -6),) * 3
+        moved_error = np.abs(self.data[inner][..., 1:] - self.data[inner][..., :1]).mean()
+        corrected_error = np.abs(result.data[inner][..., 1:] - result.data[inner][..., :1]).mean()
+        self.assertLess(corrected_error, moved_error / 4)
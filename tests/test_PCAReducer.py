@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from objs_Model.PCAReducer import PCAReducer
+
+class TestPCAReducer(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        latent = rng.normal(size=(90, 6)) * np.array([40, 25, 15, 8, 4, 2])
+        self.X = (latent @ rng.normal(size=(6, 3000)) + rng.normal(size=(90, 3000)) * 0.1 + 3).astype(np.float32)
+
+        centred = self.X.astype(np.float64) - self.X.mean(axis=0)
+        _, self.singular_values, self.components = np.linalg.svd(centred, full_matrices=False)
+
+    def assert_matches_svd(self, reducer: PCAReducer):
+        np.testing.assert_allclose(reducer.singular_values, self.singular_values[:6], rtol=1e-4)
+        # same directions up to sign
+        overlap = np.abs(np.sum(reducer.components * self.components[:6], axis=1))
+        np.testing.assert_allclose(overlap, 1, atol=1e-4)
+
+    def test_incremental(self):
+        self.assert_matches_svd(PCAReducer(6, 'incremental', batch_size=16).fit(self.X))
+
+    def test_randomized(self):
+        self.assert_matches_svd(PCAReducer(6, 'randomized').fit(self.X))
+
+    def test_save_load(self):
+        reducer = PCAReducer(6).fit(self.X[:60])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'components.npz')
+            reducer.save(path)
+            loaded = PCAReducer.load(path)
+
+        np.testing.assert_array_equal(loaded.transform(self.X[60:]), reducer.transform(self.X[60:]))
+        self.assertEqual(loaded.transform(self.X).shape, (90, 6))
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import unittest
+from benchmarks.synthetic_cohort import make_cohort
+from synthetic_atlas import SyntheticAtlasTestCase
+from objs_Model.abstract.ModelDataset import LoadCancelled
+from objs_Model import BrainAgePredictorDataset
+from objs_Report import PredictionRunner
+from Types import Predictor, ROI
+
+class FakeReport:
+    '''loads n participants, waiting on release between each one'''
+    def __init__(self, n: int, release: threading.Event, fail: bool = False):
+        self.n, self.release, self.fail = n, release, fail
+
+    def run(self, progress, cancel_event):
+        for i in range(self.n):
+            self.release.wait(5)
+            if cancel_event.is_set():
+                raise LoadCancelled()
+            progress(i + 1, self.n)
+
+        if self.fail:
+            raise ValueError('bad fit')
+        return 'model'
+
+class TestPredictionRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.n_reports = 0
+
+    def factory(self, fail: bool = False):
+        def make_report(predictor, roi):
+            self.n_reports += 1
+            return FakeReport(3, self.release, fail)
+        return make_report
+
+    def test_progress_and_cache(self):
+        runner = PredictionRunner(report_factory=self.factory())
+        self.assertTrue(runner.submit(Predictor.BRAIN_AGE, ROI.PFC))
+        # busy until the current run is done
+        self.assertFalse(runner.submit(Predictor.BRAIN_AGE, ROI.TEMPORAL_LOBE))
+
+        self.release.set()
+        runner.join(5)
+        messages = runner.poll()
+        self.assertEqual([m.kind for m in messages], ['progress'] * 3 + ['done'])
+        self.assertEqual([m.n_done for m in messages[:3]], [1, 2, 3])
+        self.assertEqual(messages[-1].model, 'model')
+
+        # same selection again: answered from the cache, nothing is run
+        self.assertTrue(runner.submit(Predictor.BRAIN_AGE, ROI.PFC))
+        cached, = runner.poll()
+        self.assertTrue(cached.cached)
+        self.assertEqual(self.n_reports, 1)
+
+    def test_cancel(self):
+        runner = PredictionRunner(report_factory=self.factory())
+        runner.submit(Predictor.BRAIN_AGE, ROI.PFC)
+        runner.cancel()
+        self.release.set()
+        runner.join(5)
+
+        self.assertEqual(runner.poll()[-1].kind, 'cancelled')
+        self.assertIsNone(runner.get_result(Predictor.BRAIN_AGE, ROI.PFC))
+
+    def test_error(self):
+        runner = PredictionRunner(report_factory=self.factory(fail=True))
+        self.release.set()
+        runner.submit(Predictor.BRAIN_AGE, ROI.PFC)
+        runner.join(5)
+
+        message = runner.poll()[-1]
+        self.assertEqual(message.kind, 'error')
+        self.assertIn('bad fit', message.error)
+
+class TestDatasetCancel(SyntheticAtlasTestCase):
+
+    def test_cancel_between_participants(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            participants_df = make_cohort(tmp_dir, 'small')
+            cancel_event = threading.Event()
+            progress = []
+
+            def on_progress(n_done, n_total):
+                progress.append((n_done, n_total))
+                if n_done == 2:
+                    cancel_event.set()
+
+            dataset = BrainAgePredictorDataset(
+                participants_df,
+                func_data_path=tmp_dir,
+                feature_cache_path=None,
+                memmap_dir=os.path.join(tmp_dir, 'store'),
+                n_components=None,
+                progress=on_progress,
+                cancel_event=cancel_event
+            )
+            with self.assertRaises(LoadCancelled):
+                dataset.get_data()
+            self.assertEqual(progress, [(1, 4), (2, 4)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import json
+import tempfile
+import unittest
+from objs_Profiler import Profiler
+
+class TestProfiler(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        profiler = Profiler()
+        with profiler.stage('load', subject='sub-001'):
+            pass
+
+        self.assertEqual(profiler.records, [])
+
+    def test_nested_stages(self):
+        profiler = Profiler(enabled=True)
+        with profiler.stage('participant', subject='sub-001'):
+            with profiler.stage('read', n_bytes=10):
+                sum(range(10000))
+
+        read, participant = profiler.records
+        self.assertEqual(read.name, 'read')
+        self.assertEqual(read.parent, 'participant')
+        # subject is inherited from the enclosing stage
+        self.assertEqual(read.subject, 'sub-001')
+        self.assertEqual(read.attrs, {'n_bytes': 10})
+        self.assertIsNone(participant.parent)
+        self.assertGreaterEqual(participant.wall_s, read.wall_s)
+        self.assertEqual(profiler.summary()['read']['count'], 1)
+
+    def test_records_on_error(self):
+        profiler = Profiler(enabled=True)
+        with self.assertRaises(ValueError):
+            with profiler.stage('fit'):
+                raise ValueError
+
+        self.assertEqual([record.name for record in profiler.records], ['fit'])
+
+    def test_exports(self):
+        profiler = Profiler(enabled=True)
+        for subject in ('sub-001', 'sub-002'):
+            with profiler.stage('load', subject=subject):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jsonl_path = os.path.join(tmp_dir, 'stages.jsonl')
+            profiler.to_jsonl(jsonl_path)
+            with open(jsonl_path, encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual([row['subject'] for row in rows], ['sub-001', 'sub-002'])
+
+            trace_path = os.path.join(tmp_dir, 'trace.json')
+            profiler.to_chrome_trace(trace_path)
+            with open(trace_path, encoding='utf-8') as f:
+                events = json.load(f)['traceEvents']
+            self.assertEqual(len(events), 2)
+            self.assertEqual(events[0]['ph'], 'X')
+            self.assertEqual(events[1]['args']['subject'], 'sub-002')
+
+if __name__ == '__main__':
+    unittest.main()
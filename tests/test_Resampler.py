@@ -0,0 +1,55 @@
+import unittest
+import warnings
+import numpy as np
+from nibabel import Nifti1Image
+from nilearn.image import resample_to_img
+from objs_MRI.Resampler import Resampler
+
+class TestResampler(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.random((9, 8, 7, 5)).astype(np.float32) * 100
+        self.affine = np.diag([3., 3., 3.5, 1.])
+        self.affine[:3, 3] = [-12, -10, -8]
+
+    def assert_same_as_nilearn(self, target_affine, target_shape, interpolation):
+        target = Nifti1Image(np.zeros(target_shape, dtype=np.float32), target_affine)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected = np.stack([
+                resample_to_img(
+                    Nifti1Image(self.data[..., t], self.affine),
+                    target,
+                    interpolation=interpolation
+                ).get_fdata()
+                for t in range(self.data.shape[-1])
+            ], axis=-1)
+
+        resampler = Resampler(self.data.shape, self.affine, target_shape, target_affine, interpolation)
+        resampled = resampler.resample(self.data, dtype=np.float64)
+
+        self.assertEqual(resampled.shape, target_shape + (self.data.shape[-1],))
+        np.testing.assert_allclose(resampled, expected, atol=1e-3)
+
+    def test_axis_aligned(self):
+        target_affine = np.diag([2., 2., 2., 1.])
+        target_affine[:3, 3] = [-13, -9, -7]
+        for interpolation in ('continuous', 'linear', 'nearest'):
+            self.assert_same_as_nilearn(target_affine, (14, 12, 12), interpolation)
+
+    def test_oblique(self):
+        target_affine = np.array([
+            [2., 0.2, 0., -13.3],
+            [-0.1, 2., 0.3, -9.25],
+            [0., -0.2, 2.5, -7.1],
+            [0., 0., 0., 1.]
+        ])
+        for interpolation in ('continuous', 'linear', 'nearest'):
+            self.assert_same_as_nilearn(target_affine, (13, 11, 10), interpolation)
+
+    def test_dtype(self):
+        resampler = Resampler(self.data.shape, self.affine, self.data.shape, self.affine)
+        resampled = resampler.resample(self.data.astype(np.int16), dtype=np.float32)
+        self.assertEqual(resampled.dtype, np.float32)
+        np.testing.assert_allclose(resampled, self.data.astype(np.int16), atol=1e-3)
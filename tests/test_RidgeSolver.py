@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from objs_Model.RidgeSolver import RidgeSolver
+
+def ridge_closed_form(X: np.ndarray, y: np.ndarray, alpha: float) -> tuple[np.ndarray, float]:
+    X_mean, y_mean = X.mean(axis=0), y.mean()
+    centred = X - X_mean
+    coef = np.linalg.solve(centred.T @ centred + alpha * np.eye(X.shape[1]), centred.T @ (y - y_mean))
+    return coef, y_mean - X_mean @ coef
+
+class TestRidgeSolver(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def make_data(self, n_rows: int, n_features: int):
+        X = self.rng.normal(size=(n_rows, n_features)) + 2
+        y = X[:, :5] @ np.array([3., -2., 1., 0.5, 4.]) + 30 + self.rng.normal(size=n_rows)
+        return X, y
+
+    def assert_path_matches(self, n_rows: int, n_features: int):
+        X, y = self.make_data(n_rows, n_features)
+        Xv, yv = self.make_data(20, n_features)
+        solver = RidgeSolver(alphas=(0.1, 10., 1000.)).fit(X, y)
+
+        predictions = solver.predict_path(Xv)
+        for i, alpha in enumerate(solver.alphas):
+            coef, intercept = ridge_closed_form(X, y, alpha)
+            np.testing.assert_allclose(solver.get_coef(alpha), coef, atol=1e-8)
+            np.testing.assert_allclose(predictions[:, i], Xv @ coef + intercept, atol=1e-8)
+
+        result = solver.evaluate(Xv, yv)
+        self.assertEqual(result.best_alpha, solver.alpha)
+        np.testing.assert_allclose(solver.predict(Xv), predictions[:, int(np.argmin(result.mae))], atol=1e-8)
+
+    def test_dual(self):
+        self.assert_path_matches(40, 300)
+
+    def test_primal(self):
+        self.assert_path_matches(200, 30)
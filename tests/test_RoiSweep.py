@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from benchmarks.synthetic_cohort import make_cohort
+from synthetic_atlas import SyntheticAtlasTestCase
+from objs_Model import BrainAgePredictorDataset, RoiSweep
+from helper_funcs import nifti_to_MRIFunc
+from Types import ROI
+
+ROIS = (ROI.PFC, ROI.TEMPORAL_LOBE)
+
+class TestRoiSweep(SyntheticAtlasTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.func_path = os.path.join(cls.tmp_dir.name, 'func')
+        cls.participants_df = make_cohort(cls.func_path, 'small')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+        super().tearDownClass()
+
+    def test_roi_matrices_match_single_roi(self):
+        path = os.path.join(self.func_path, f'{self.participants_df.participant_id.iloc[0]}.nii.gz')
+        fMRI = nifti_to_MRIFunc(path)
+        matrices = fMRI.get_roi_matrices(ROIS)
+        for roi in ROIS:
+            roi_matrix, voxel_idx = fMRI.get_roi_matrix(roi)
+            np.testing.assert_array_equal(matrices[roi][0], roi_matrix)
+            np.testing.assert_array_equal(matrices[roi][1], voxel_idx)
+
+    def test_one_decode_per_participant(self):
+        kwargs = {'func_data_path': self.func_path, 'n_components': None}
+        sweep = RoiSweep(self.participants_df, ROIS, feature_cache_path=None, **kwargs)
+
+        with mock.patch.object(sys.modules['objs_Model.abstract.ModelDataset'], 'nifti_to_MRIFunc', wraps=nifti_to_MRIFunc) as decode:
+            datasets = sweep.datasets
+            self.assertEqual(decode.call_count, len(self.participants_df))
+            for roi in ROIS:
+                # one row per participant, the roi's active voxel x time features as columns
+                dataset = datasets[roi]
+                self.assertEqual(dataset.X.shape, (len(self.participants_df), len(dataset.active_features)))
+                self.assertLessEqual(len(dataset.active_features), np.prod(dataset.feature_shape))
+            # every roi was built from the cache
+            self.assertEqual(decode.call_count, len(self.participants_df))
+
+        self.assertEqual(sweep.failures, [])
+        for roi in ROIS:
+            expected = BrainAgePredictorDataset(self.participants_df, roi, feature_cache_path=None, **kwargs)
+            np.testing.assert_array_equal(sweep[roi].X, expected.X)
+            np.testing.assert_array_equal(sweep[roi].active_features, expected.active_features)
+
+if __name__ == '__main__':
+    unittest.main()
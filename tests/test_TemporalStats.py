@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import nibabel as nib
+from objs_MRI.TemporalStats import TemporalStats, cohort_temporal_stats
+
+class TestTemporalStats(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.normal(100, 5, size=(6, 5, 4, 37))
+        self.data += np.linspace(0, 20, 37) # a drift for detrending to remove
+        self.data[0, 0, 0] = 42 # no variance
+
+    def test_matches_numpy(self):
+        result = TemporalStats(volumes_per_chunk=8, detrend=True).compute(self.data)
+
+        std = self.data.std(axis=-1)
+        np.testing.assert_allclose(result.mean, self.data.mean(axis=-1))
+        np.testing.assert_allclose(result.var, self.data.var(axis=-1), atol=1e-9)
+        self.assertEqual(result.tsnr[0, 0, 0], 0)
+        np.testing.assert_allclose(result.tsnr[std > 0], self.data.mean(axis=-1)[std > 0] / std[std > 0])
+
+        time = np.arange(37)
+        flat = self.data.reshape(-1, 37)
+        trend = np.polynomial.polynomial.polyfit(time, flat.T, 1)
+        residual = flat - np.polynomial.polynomial.polyval(time, trend)
+        np.testing.assert_allclose(result.detrended_var.ravel(), residual.var(axis=-1), atol=1e-8)
+
+    def test_mask_and_bbox(self):
+        mask = np.zeros(self.data.shape[:3], dtype=bool)
+        mask[1:4, 2:5, 1:3] = True
+        mask[2, 3, 1] = False
+        bbox = (slice(1, 4), slice(2, 5), slice(1, 3))
+
+        result = TemporalStats(volumes_per_chunk=5).compute(self.data, mask=mask[bbox], bbox=bbox)
+        np.testing.assert_allclose(result.mean, self.data[mask].mean(axis=-1))
+        self.assertIsNone(result.detrended_var)
+
+    def test_compressed_proxy_read_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for ext, n_reads in (('.nii', 5), ('.nii.gz', 1)):
+                path = os.path.join(tmp_dir, 'sub-01' + ext)
+                nib.save(nib.Nifti1Image(self.data, np.eye(4)), path)
+                proxy = nib.load(path).dataobj
+
+                reads = []
+                original = type(proxy).__getitem__
+                def counted(self, slicer):
+                    reads.append(slicer)
+                    return original(self, slicer)
+
+                with mock.patch.object(type(proxy), '__getitem__', counted):
+                    result = TemporalStats(volumes_per_chunk=8).compute(proxy)
+
+                self.assertEqual(len(reads), n_reads)
+                np.testing.assert_allclose(result.mean, self.data.mean(axis=-1))
+
+    def test_cohort(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'sub-01.nii.gz')
+            nib.save(nib.Nifti1Image(self.data.astype(np.float32), np.eye(4)), path)
+
+            summaries = cohort_temporal_stats([path, os.path.join(tmp_dir, 'missing.nii.gz')])
+
+        self.assertIsNone(summaries[0].error)
+        self.assertEqual(summaries[0].nt, 37)
+        self.assertEqual(summaries[0].n_voxels, self.data[..., 0].size)
+        self.assertIsNotNone(summaries[1].error)
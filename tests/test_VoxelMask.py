@@ -0,0 +1,88 @@
+import io
+import tempfile
+import unittest
+import numpy as np
+from objs_MRI import Atlas, MaskCache, MRIFunc, VoxelMask
+from synthetic_atlas import SyntheticAtlasTestCase
+from Types import ROI
+
+SHAPE = (6, 7, 5)
+AFFINE = np.diag([2., 2., 2., 1.])
+
+class TestVoxelMask(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.a = rng.random(SHAPE) > 0.6
+        self.b = rng.random(SHAPE) > 0.5
+        self.mask_a = VoxelMask.from_dense(self.a, AFFINE)
+        self.mask_b = VoxelMask.from_dense(self.b, AFFINE)
+
+    def test_set_operations(self):
+        np.testing.assert_array_equal((self.mask_a | self.mask_b).to_dense(), self.a | self.b)
+        np.testing.assert_array_equal((self.mask_a & self.mask_b).to_dense(), self.a & self.b)
+        np.testing.assert_array_equal((self.mask_a - self.mask_b).to_dense(), self.a & ~self.b)
+        self.assertEqual(VoxelMask.union_all([self.mask_a, self.mask_b]), self.mask_a | self.mask_b)
+
+        with self.assertRaises(ValueError):
+            self.mask_a | VoxelMask(self.mask_b.indices, SHAPE, np.eye(4))
+
+    def test_unsorted_indices(self):
+        mask = VoxelMask([5, 1, 5, 3], SHAPE, AFFINE)
+        np.testing.assert_array_equal(mask.indices, [1, 3, 5])
+        self.assertFalse(mask.indices.flags.writeable)
+        with self.assertRaises(ValueError):
+            VoxelMask([np.prod(SHAPE)], SHAPE, AFFINE)
+
+    def test_gather_scatter(self):
+        series = np.arange(np.prod(SHAPE) * 3, dtype=np.float32).reshape(SHAPE + (3,))
+        for data in (series[..., 0], series):
+            values = self.mask_a.gather(data)
+            np.testing.assert_array_equal(values, data[self.a])
+            np.testing.assert_array_equal(self.mask_a.scatter(values), np.where(
+                self.a.reshape(SHAPE + (1,) * (data.ndim - 3)), data, 0
+            ))
+
+            # gathering from a read of only the bounding box
+            bbox = self.mask_a.bbox
+            np.testing.assert_array_equal(self.mask_a.gather(data[bbox], bbox), values)
+
+        np.testing.assert_array_equal(self.mask_a.to_dense(bbox=self.mask_a.bbox), self.a[self.mask_a.bbox])
+
+    def test_save_load(self):
+        f = io.BytesIO()
+        self.mask_a.save(f)
+        f.seek(0)
+        loaded = VoxelMask.load(f)
+        self.assertEqual(loaded, self.mask_a)
+        self.assertEqual(loaded.name, self.mask_a.name)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            MaskCache(tmp_dir).put_voxel_mask('a', self.mask_a)
+            self.assertEqual(MaskCache(tmp_dir).get_voxel_mask('a'), self.mask_a)
+
+class TestVoxelMaskPipeline(SyntheticAtlasTestCase):
+
+    def test_atlas_roi_is_union_of_regions(self):
+        atlas = Atlas.instance()
+        prob = np.asanyarray(atlas.img.dataobj)
+        idxs = atlas.roi_to_idxs_dict[ROI.TEMPORAL_LOBE.value]
+        mask = atlas.get_roi_voxel_mask(ROI.TEMPORAL_LOBE)
+        np.testing.assert_array_equal(mask.to_dense(), np.any(prob[..., idxs] >= 50, axis=-1))
+
+    def test_custom_mask_as_roi(self):
+        data = np.random.default_rng(1).random((31, 37, 31, 4)).astype(np.float32)
+        fMRI = MRIFunc(data, self.affine)
+        roi = fMRI.get_roi_voxel_mask(ROI.PFC) | fMRI.get_roi_voxel_mask(ROI.TEMPORAL_LOBE)
+
+        roi_matrix, voxel_idx = fMRI.get_roi_matrix(roi)
+        np.testing.assert_array_equal(voxel_idx, roi.indices)
+        np.testing.assert_array_equal(roi_matrix, data[roi.to_dense()])
+        np.testing.assert_array_equal(fMRI.get_roi_fdata(roi), data * roi.to_dense()[..., np.newaxis])
+
+        other_grid = VoxelMask(roi.indices, roi.shape, np.eye(4))
+        with self.assertRaises(ValueError):
+            fMRI.get_roi_matrix(other_grid)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from helper_funcs import download_objects, LocalObjectStore, ObjectInfo
+
+class FlakyObjectStore(LocalObjectStore):
+    '''fails the first download of every key'''
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.downloads: dict[str, int] = {}
+
+    def download(self, key: str, file_path: str) -> None:
+        self.downloads[key] = self.downloads.get(key, 0) + 1
+        if self.downloads[key] == 1:
+            raise ConnectionError('dropped')
+        super().download(key, file_path)
+
+class TestDownloadObjects(unittest.TestCase):
+
+    def setUp(self):
+        self.remote = tempfile.mkdtemp()
+        self.local = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.local, 'manifest.json')
+
+        self.jobs = []
+        for i in range(5):
+            key = f'ds/sub-{i}/func/sub-{i}_bold.nii.gz'
+            os.makedirs(os.path.join(self.remote, 'ds', f'sub-{i}', 'func'))
+            with open(os.path.join(self.remote, *key.split('/')), 'wb') as f:
+                f.write(os.urandom(1000 + i))
+            self.jobs.append((key, os.path.join(self.local, 'func', f'sub-{i}.nii.gz')))
+
+    def download(self, store, jobs=None):
+        return download_objects(
+            store,
+            self.jobs if jobs is None else jobs,
+            self.manifest_path,
+            max_workers=3,
+            backoff_seconds=0,
+            progress=False
+        )
+
+    def test_download_then_skip(self):
+        store = LocalObjectStore(self.remote)
+        self.assertEqual([r.status for r in self.download(store)], ['downloaded'] * 5)
+        for key, file_path in self.jobs:
+            self.assertEqual(store.head(key), ObjectInfo(os.path.getsize(file_path), store.head(key).etag))
+
+        self.assertEqual([r.status for r in self.download(store)], ['skipped'] * 5)
+
+    def test_corrupt_file_is_downloaded_again(self):
+        store = LocalObjectStore(self.remote)
+        self.download(store)
+
+        key, file_path = self.jobs[0]
+        with open(file_path, 'r+b') as f:
+            f.write(b'\x00' * 10)
+
+        results = self.download(store)
+        self.assertEqual(results[0].status, 'downloaded')
+        self.assertEqual(store.head(key).etag, LocalObjectStore(os.path.dirname(file_path)).head(os.path.basename(file_path)).etag)
+
+    def test_retry_and_failure_report(self):
+        store = FlakyObjectStore(self.remote)
+        jobs = self.jobs + [('ds/missing.nii.gz', os.path.join(self.local, 'missing.nii.gz'))]
+        results = self.download(store, jobs)
+
+        self.assertEqual([r.status for r in results[:-1]], ['downloaded'] * 5)
+        self.assertTrue(all(r.attempts == 2 for r in results[:-1]))
+        self.assertEqual(results[-1].status, 'failed')
+        self.assertIn('FileNotFoundError', results[-1].error)
+        self.assertFalse(os.path.exists(jobs[-1][1]))
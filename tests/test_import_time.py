@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cumulative import time (s) of each package in a fresh interpreter, numpy / pandas / nibabel / scipy included
+IMPORT_TIME_BUDGET_S: dict[str, float] = {
+    'Types': 0.1,
+    'objs_MRI': 0.6,
+    'objs_Model': 0.8,
+}
+# only imported when they are used (fetching the atlas, resampling a mask, plotting, downloading)
+LAZY_MODULES: tuple[str, ...] = ('nilearn', 'sklearn', 'matplotlib', 'boto3', 'botocore')
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable, *args, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+class TestImportTime(unittest.TestCase):
+
+    def test_budget(self):
+        for module, budget in IMPORT_TIME_BUDGET_S.items():
+            with self.subTest(module=module):
+                # -X importtime writes "import time: self | cumulative | name" (us) to stderr
+                stderr = _run(f'import {module}', '-X', 'importtime').stderr
+                line = next(line for line in stderr.splitlines() if line.split('|')[-1].strip() == module)
+                seconds = int(line.split('|')[1]) / 1e6
+                self.assertLess(seconds, budget, f'importing {module} took {seconds:.3f}s')
+
+    def test_no_heavy_imports(self):
+        code = (
+            'import sys, Types, objs_MRI, objs_Model, objs_Report\n'
+            f'print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+        )
+        self.assertEqual(_run(code).stdout.strip(), '')
+
+if __name__ == '__main__':
+    unittest.main()